@@ -1,40 +1,108 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash
-from flask_migrate import Migrate
+from flask import Blueprint, Flask, Response, current_app, redirect, request, jsonify, send_file
 from models import db, User, Category, Farmer, Cart, CartItem, Animal
+from pagination import keyset_page, parse_limit, InvalidCursor
+from orders import farmer_order_rows, farmer_orders_page, group_orders
+from passwords import passwords, PoolOverloaded
+from cache import cache
+from compression import compress_response, payloads
+from config import load_config, engine_options, sqlite_pragmas, install_sqlite_pragmas, pool_stats
+from carts import add_item, checkout, CheckoutError, CART_VIEW_OPTIONS
+from auth import CachingJWTManager, role_required
+from sales import farmer_sales, sales_cli
+from events import StreamFull, broker, parse_filters, publish_animals
+from idempotency import idempotent, record_response
+from jobs import jobs
+from ratelimit import limiter, rate_limited
+from replicas import replicas, replica_binds, use_replica
+from images import (IMAGE_URL_PREFIX, MIMETYPES, ORIGINAL_NAME, THUMBNAIL_NAME, InvalidImage, find_original,
+                    original_path, store_image, thumbnail_path, thumbnail_urls)
+from search import search_terms, fts_search, include_object
+from ingest import ingest_animals, parse_upload
+from versions import bump_version, current_version, conditional, versions_cli
+import metrics
+from serializers import ANIMAL_FIELDS, CATEGORY_FIELDS, STREAM_BATCH_SIZE, json_response, wants_stream, stream_rows, encode_line, ndjson_response
 from flask_cors import CORS
-from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 import hmac
-import re
 import os
+import re
 
-secret_key = os.urandom(16)
-print(secret_key.hex())
-
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DATABASE = os.environ.get(
-    "DB_URI", f"sqlite:///{os.path.join(BASE_DIR, 'app.db')}")
-
-
-# from dotenv import load_dotenv
-# load_dotenv()
-
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE
-# app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.json.compact = False
-app.config['SECRET_KEY'] = secret_key
-app.config['JWT_SECRET_KEY'] = secret_key
-CORS(app)
-bcrypt = Bcrypt(app)
-jwt = JWTManager(app)
-
-
-migrate = Migrate(app, db)
-
-db.init_app(app)
-bcrypt.init_app(app)
+api = Blueprint('api', __name__)
+
+
+def create_app(config=None):
+    settings = load_config()
+    settings.update(config or {})
+    database = settings['SQLALCHEMY_DATABASE_URI']
+    settings.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(database))
+    settings.setdefault('SQLITE_PRAGMAS', sqlite_pragmas(database))
+    replica_uris = replica_binds(settings['DB_REPLICA_URI'])
+    settings.setdefault('SQLALCHEMY_BINDS', {key: {'url': uri, **engine_options(uri)} for key, uri in replica_uris.items()})
+
+    app = Flask(__name__)
+    app.config.update(settings)
+    # The next-page cursor travels in a header, which browsers hide from
+    # scripts unless it is exposed.
+    CORS(app, expose_headers=['X-Next-Cursor'])
+    jwt = CachingJWTManager(app)
+
+    db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+        for key, uri in replica_uris.items():
+            pragmas = sqlite_pragmas(uri)
+            if pragmas:
+                pragmas['query_only'] = 'ON'
+            install_sqlite_pragmas(db.engines[key], pragmas)
+    replicas.init_app(app)
+    passwords.init_app(app)
+    limiter.init_app(app)
+    cache.init_app(app)
+    payloads.init_app(app)
+    jobs.init_app(app)
+    if app.config['SALES_SWEEP_INTERVAL']:
+        # Catches checkouts whose record_sales job never ran, e.g. one still
+        # queued in memory when the process stopped.
+        jobs.every(app.config['SALES_SWEEP_INTERVAL'], 'record_missing_sales')
+    broker.init_app(app)
+    if app.config['METRICS_ENABLED']:
+        with app.app_context():
+            metrics.init_app(app, db.engines.values(), collectors=[
+                lambda: {f'farmart_cache_{k}': v for k, v in cache.stats().items()},
+                lambda: {f'farmart_payload_cache_{k}': v for k, v in payloads.stats().items()},
+                lambda: {f'farmart_db_pool_{k}': v for k, v in pool_stats(db.engine).items()},
+                lambda: {f'farmart_db_{key}_pool_{k}': v for key, engine in db.engines.items() if key
+                         for k, v in pool_stats(engine).items()},
+                lambda: {f'farmart_jwt_cache_{k}': v for k, v in jwt.tokens.stats().items()},
+                lambda: {f'farmart_jobs_{k}': v for k, v in jobs.stats().items()},
+                lambda: {f'farmart_stream_{k}': v for k, v in broker.stats().items()},
+                lambda: {f'farmart_db_{k}': v for k, v in replicas.stats().items()},
+                lambda: {f'farmart_auth_rate_limit_{k}': v for k, v in limiter.stats().items()},
+            ])
+    # Registered after metrics so it runs first and the size histogram sees
+    # the bytes actually sent.
+    app.after_request(compress_response)
+    if app.config['ENABLE_MIGRATE']:
+        from flask_migrate import Migrate
+        Migrate(app, db, include_object=include_object)
+
+    app.cli.add_command(sales_cli)
+    app.cli.add_command(versions_cli)
+    app.register_blueprint(api)
+    return app
+
+
+_app = None
+
+def __getattr__(name):
+    # `from app import app` and `gunicorn app:app` keep working, but the default
+    # app is only built on first use, not as a side effect of importing routes.
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Import models after initializing db
 
@@ -52,7 +120,8 @@ def validate_username(username):
 def validate_password(password):
     return len(password) >= 8
 
-@app.route('/register', methods=['POST'])
+@api.route('/register', methods=['POST'])
+@rate_limited
 def register():
     data = request.get_json()
     username = data.get('username')
@@ -77,7 +146,8 @@ def register():
     db.session.commit()
     return jsonify({'message': 'Registration successful'}), 201
 
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
+@rate_limited
 def login():
     data = request.get_json()
     username = data.get('username')
@@ -92,6 +162,10 @@ def login():
     if not user.check_password(password):
         return jsonify({'message': 'Invalid password'}), 401
 
+    if passwords.needs_rehash(user.password_hash):
+        user.set_password(password)
+        db.session.commit()
+
     access_token = create_access_token(identity={'id': user.id, 'role': user.role, 'username': user.username})
     return jsonify({
         'message': 'Login successful',
@@ -102,44 +176,228 @@ def login():
     }), 200
 
 
-@app.route('/farmer/animals', methods=['POST'])
+@api.route('/farmer/animals', methods=['POST'])
 def add_animal():
-    new_animal = Animal(
-        type=request.json['type'],
-        breed=request.json['breed'],
-        price=request.json['price'],
-        description=request.json['description'],
-        farmer_id = request.json['farmer_id'],
-        status='Available'
-    )
-    if 'image_url' in request.json:
-       new_animal.image_url = request.json['image_url']
+    try:
+        new_animal = Animal(
+            type=request.json['type'],
+            breed=request.json['breed'],
+            price=request.json['price'],
+            description=request.json['description'],
+            farmer_id = request.json['farmer_id'],
+            status='Available'
+        )
+        if 'image_url' in request.json:
+           new_animal.image_url = request.json['image_url']
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     db.session.add(new_animal)
+    bump_version('animals')
     db.session.commit()
+    cache.invalidate('animals', 'animal')
+    publish_animals('created', [new_animal.id])
     return jsonify({'message': 'Animal added successfully'}), 201
+
+@api.route('/farmer/animals/bulk', methods=['POST'])
+@role_required('farmer')
+def add_animals_bulk():
+    # Every row belongs to the caller, whatever farmer_id it carries.
+    overrides = {'farmer_id': get_jwt_identity()['id']}
+    try:
+        batch_size = max(1, int(request.args.get('batch_size', current_app.config['BULK_INSERT_BATCH_SIZE'])))
+        inserted, errors = ingest_animals(parse_upload(request), batch_size=batch_size, overrides=overrides)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    if inserted:
+        bump_version('animals')
+    db.session.commit()
+    if inserted:
+        cache.invalidate('animals', 'animal')
+    return jsonify({'inserted': inserted, 'errors': errors}), 201 if inserted else 400
   
-@app.route('/farmer/animals/<int:animal_id>', methods=['PATCH'])
-# @jwt_required()
+@api.route('/farmer/animals/<int:animal_id>', methods=['PATCH'])
+@role_required('farmer')
 def update_animal(animal_id):
-    # claims = get_jwt_identity()
-    animal = Animal.query.filter_by(id=animal_id, farmer_id=['id']).first()
+    animal = Animal.query.filter_by(id=animal_id, farmer_id=get_jwt_identity()['id']).first()
     if animal:
-        animal.type = request.json.get('type', animal.type)
-        animal.breed = request.json.get('breed', animal.breed)
-        animal.price = request.json.get('price', animal.price)
-        animal.description = request.json.get('description', animal.description)
-        animal.image_url = request.json['image_url']
-        animal.status = request.json.get('status', animal.status)
+        try:
+            animal.type = request.json.get('type', animal.type)
+            animal.breed = request.json.get('breed', animal.breed)
+            animal.price = request.json.get('price', animal.price)
+            animal.description = request.json.get('description', animal.description)
+            animal.image_url = request.json.get('image_url', animal.image_url)
+            animal.status = request.json.get('status', animal.status)
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'message': str(e)}), 400
+        bump_version('animals')
         db.session.commit()
+        cache.invalidate('animals', 'animal')
+        publish_animals('updated', [animal_id])
         return jsonify({'message': 'Animal updated successfully'}), 200
     return jsonify({'message': 'Animal not found'}), 404
 
-@app.route('/animals', methods=['GET'])
+@api.route('/farmer/animals/<int:animal_id>/image', methods=['POST'])
+@role_required('farmer')
+def upload_animal_image(animal_id):
+    animal = Animal.query.filter_by(id=animal_id, farmer_id=get_jwt_identity()['id']).first()
+    if not animal:
+        return jsonify({'message': 'Animal not found'}), 404
+    max_bytes = current_app.config['IMAGE_MAX_BYTES']
+    if (request.content_length or 0) > max_bytes + 64 * 1024:
+        return jsonify({'message': 'Image is too large'}), 413
+    upload = request.files.get('image')
+    try:
+        name = store_image(upload.read() if upload else request.get_data(), current_app.config['IMAGE_DIR'], max_bytes,
+                           current_app.config['IMAGE_MAX_PIXELS'])
+    except InvalidImage as e:
+        return jsonify({'message': str(e)}), 400
+    animal.image_url = IMAGE_URL_PREFIX + name
+    bump_version('animals')
+    db.session.commit()
+    cache.invalidate('animals', 'animal')
+    publish_animals('updated', [animal_id])
+    jobs.enqueue('make_thumbnails', name=name)
+    return jsonify({'image_url': animal.image_url, 'thumbnails': thumbnail_urls(animal.image_url)}), 201
+
+def send_image(path, mimetype):
+    # Content-addressed files never change, so clients may keep them forever;
+    # conditional=True adds ETag/Last-Modified and Range (206) support.
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=current_app.config['IMAGE_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@api.route('/images/<name>', methods=['GET'])
+def get_image(name):
+    match = ORIGINAL_NAME.match(name)
+    path = match and original_path(current_app.config['IMAGE_DIR'], *match.groups())
+    if not path or not os.path.exists(path):
+        return jsonify({'message': 'Image not found'}), 404
+    return send_image(path, MIMETYPES[match.group(2)])
+
+@api.route('/images/thumbs/<name>', methods=['GET'])
+def get_thumbnail(name):
+    match = THUMBNAIL_NAME.match(name)
+    if not match:
+        return jsonify({'message': 'Image not found'}), 404
+    root = current_app.config['IMAGE_DIR']
+    digest, size = match.groups()
+    path = thumbnail_path(root, digest, size)
+    if os.path.exists(path):
+        return send_image(path, 'image/jpeg')
+    # Not rendered yet (or no Pillow): point at the original, uncached.
+    original = find_original(root, digest)
+    if not original:
+        return jsonify({'message': 'Image not found'}), 404
+    response = redirect(IMAGE_URL_PREFIX + os.path.basename(original))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+ANIMAL_SORT_KEYS = {
+    'id': ((Animal.id,), False),
+    'price': ((Animal.price, Animal.id), False),
+    '-price': ((Animal.price, Animal.id), True),
+}
+
+def filter_animals(query, args):
+    for field in ('status', 'type', 'breed'):
+        if args.get(field):
+            query = query.filter(getattr(Animal, field) == args[field])
+    for field in ('category_id', 'farmer_id'):
+        if args.get(field):
+            query = query.filter(getattr(Animal, field) == int(args[field]))
+    if args.get('min_price'):
+        query = query.filter(Animal.price >= float(args['min_price']))
+    if args.get('max_price'):
+        query = query.filter(Animal.price <= float(args['max_price']))
+    return query
+
+@api.route('/animals', methods=['GET'])
+@use_replica
+@conditional('animals')
 def list_animals():
-    animals = Animal.query.all()
-    return jsonify([animal.serialize() for animal in animals]), 200
+    sort = request.args.get('sort', 'id')
+    if sort not in ANIMAL_SORT_KEYS:
+        return jsonify({'message': 'Invalid sort key'}), 400
+    columns, descending = ANIMAL_SORT_KEYS[sort]
+    try:
+        if wants_stream(request):
+            query = filter_animals(ANIMAL_FIELDS.query(), request.args)
+            order = [c.desc() for c in columns] if descending else list(columns)
+            return ndjson_response(stream_rows(ANIMAL_FIELDS, query.order_by(*order)))
+        limit = parse_limit(request.args.get('limit'))
+        version = current_version('animals')[0]
+
+        def page():
+            query = filter_animals(ANIMAL_FIELDS.query(), request.args)
+            animals, next_cursor = keyset_page(query, columns, request.args.get('cursor'), limit, descending)
+            return ANIMAL_FIELDS.rows(animals), next_cursor
+
+        def load():
+            animals, next_cursor = cache.get_or_set('animals', request.args, page, version)
+            return animals, {'X-Next-Cursor': next_cursor} if next_cursor else {}
+
+        response = payloads.response('animals', request.args, version, load)
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    except ValueError:
+        return jsonify({'message': 'Invalid filter value'}), 400
+    return response, 200
+
+@api.route('/animals/search', methods=['GET'])
+@use_replica
+def search_animals():
+    terms = search_terms(request.args.get('q', ''))
+    if not terms:
+        return jsonify({'message': 'Search query is required'}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        query = fts_search(filter_animals(ANIMAL_FIELDS.query(), request.args), terms)
+        animals = query.limit(limit).all()
+    except ValueError:
+        return jsonify({'message': 'Invalid filter value'}), 400
+    return json_response(ANIMAL_FIELDS.rows(animals)), 200
+
+@api.route('/animals/stream', methods=['GET'])
+def stream_animals():
+    try:
+        filters = parse_filters(request.args)
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        subscriber = broker.subscribe(filters, int(last_event_id) if last_event_id else None)
+    except ValueError:
+        return jsonify({'message': 'Invalid filter value'}), 400
+    except StreamFull:
+        response = jsonify({'message': 'Server busy, please retry'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    response = Response(broker.stream(subscriber), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@api.route('/animals/<int:animal_id>', methods=['GET'])
+@use_replica
+def get_animal(animal_id):
+    version = current_version('animals')[0]
+
+    def row():
+        animal = ANIMAL_FIELDS.query().filter(Animal.id == animal_id).first()
+        return ANIMAL_FIELDS.row(animal) if animal else None
+
+    def load():
+        animal = cache.get_or_set('animal', {'id': animal_id}, row, version)
+        return (animal, {}) if animal is not None else None
+
+    # One namespace for every animal: a version per animal id would be a
+    # counter per catalog row that is never evicted.
+    response = payloads.response('animal', {'id': animal_id}, version, load)
+    if response is None:
+        return jsonify({'message': 'Animal not found'}), 404
+    return response, 200
 
-@app.route('/animals/categories', methods=['GET'])
+@api.route('/animals/categories', methods=['GET'])
 # def search_animals_by_category(id):
     # category = Category.query.filter(Category.id==id).first()
     # if category:
@@ -148,37 +406,45 @@ def list_animals():
     # else:
     #     return jsonify({'message': 'Category not found'}), 404
 
+@use_replica
+@conditional('categories')
 def list_categories():
-    categories = Category.query.all()
-    return jsonify([category.serialize() for category in categories]), 200
+    version = current_version('categories')[0]
 
-@app.route('/categories', methods=['POST'])
-@jwt_required()
+    def load():
+        categories = cache.get_or_set('categories', {}, lambda: CATEGORY_FIELDS.rows(CATEGORY_FIELDS.query().order_by(Category.id).all()),
+                                      version)
+        return categories, {}
+
+    return payloads.response('categories', {}, version, load), 200
+
+@api.route('/categories', methods=['POST'])
+@role_required('farmer')
 def add_category():
-    claims = get_jwt_identity()
-    if claims['role'] != 'farmer':
-        return jsonify({'message': 'Unauthorized'}), 403
     category_name = request.json['name']
     if Category.query.filter_by(name=category_name).first():
         return jsonify({'message': 'Category already exists'}), 409
     new_category = Category(name=category_name)
     db.session.add(new_category)
+    bump_version('categories')
     db.session.commit()
+    cache.invalidate('categories')
     return jsonify({'message': 'Category added successfully'}), 201
 
 
-@app.route('/cart', methods=['GET'])
+@api.route('/cart', methods=['GET'])
 @jwt_required()
 def get_cart():
     claims = get_jwt_identity()
     user_id = claims['id']
-    cart = Cart.query.filter_by(user_id=user_id, status='Pending').first()
+    cart = Cart.query.options(*CART_VIEW_OPTIONS).filter_by(user_id=user_id, status='Pending').first()
     if not cart:
         return jsonify({'message': 'Cart not found'}), 404
     return jsonify(cart.serialize()), 200
 
-@app.route('/cart', methods=['POST'])
+@api.route('/cart', methods=['POST'])
 @jwt_required()
+@idempotent
 def add_to_cart():
     claims = get_jwt_identity()
     user_id = claims['id']
@@ -186,29 +452,19 @@ def add_to_cart():
     animal_id = data.get('animal_id')
     quantity = data.get('quantity', 1)
 
-    animal = Animal.query.get(animal_id)
-    if not animal:
-        return jsonify({'message': 'Animal not found'}), 404
-
-    cart = Cart.query.filter_by(user_id=user_id, status='Pending').first()
-    if not cart:
-        cart = Cart(user_id=user_id, total_price=0)
-        db.session.add(cart)
-        db.session.commit()
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+        return jsonify({'message': 'Quantity must be a positive integer'}), 400
 
-    cart_item = CartItem.query.filter_by(cart_id=cart.id, animal_id=animal_id).first()
-    if cart_item:
-        cart_item.quantity += quantity
-    else:
-        cart_item = CartItem(cart_id=cart.id, animal_id=animal_id, quantity=quantity, unit_price=animal.price)
-        db.session.add(cart_item)
-
-    cart.total_price += animal.price * quantity
+    if not add_item(user_id, animal_id, quantity):
+        db.session.rollback()
+        return jsonify({'message': 'Animal not found'}), 404
+    response = record_response(jsonify({'message': 'Item added to cart'}), 201)
     db.session.commit()
-    return jsonify({'message': 'Item added to cart'}), 201
+    return response
 
-@app.route('/cart/item/<int:cart_item_id>', methods=['DELETE'])
+@api.route('/cart/item/<int:cart_item_id>', methods=['DELETE'])
 @jwt_required()
+@idempotent
 def remove_from_cart(cart_item_id):
     claims = get_jwt_identity()
     user_id = claims['id']
@@ -223,57 +479,86 @@ def remove_from_cart(cart_item_id):
 
     cart.total_price -= cart_item.unit_price * cart_item.quantity
     db.session.delete(cart_item)
+    response = record_response(jsonify({'message': 'Item removed from cart'}), 200)
     db.session.commit()
-    return jsonify({'message': 'Item removed from cart'}), 200
+    return response
 
-@app.route('/cart/checkout', methods=['POST'])
+@api.route('/cart/checkout', methods=['POST'])
 @jwt_required()
+@idempotent
 def checkout_cart():
     claims = get_jwt_identity()
-    user_id = claims['id']
-    cart = Cart.query.filter_by(user_id=user_id, status='Pending').first()
-    if not cart:
+    try:
+        order = checkout(claims['id'])
+    except CheckoutError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e), **e.details}), e.status
+    if order is None:
+        db.session.rollback()
         return jsonify({'message': 'Cart not found'}), 404
 
-    cart.status = 'Confirmed'
+    response = record_response(jsonify({'message': 'Checkout successful', **order}), 200)
+    db.session.commit()
+    # Outside the checkout transaction, so concurrent checkouts do not queue
+    # on the animals version row.
+    bump_version('animals')
     db.session.commit()
-    return jsonify({'message': 'Checkout successful'}), 200
+    cache.invalidate('animals', 'animal')
+    jobs.enqueue('record_sales', cart_id=order['cart_id'])
+    jobs.enqueue('notify_farmers', cart_id=order['cart_id'])
+    publish_animals('sold', order['animal_ids'])
+    return response
 
 # Farmer Routes to See Orders
 
-@app.route('/farmer/orders', methods=['GET'])
-@jwt_required()
+@api.route('/farmer/orders', methods=['GET'])
+@role_required('farmer')
 def get_farmer_orders():
-    claims = get_jwt_identity()
-    if claims['role'] != 'farmer':
-        return jsonify({'message': 'Unauthorized'}), 403
-
-    farmer_id = claims['id']
-    animals = Animal.query.filter_by(farmer_id=farmer_id).all()
-    animal_ids = [animal.id for animal in animals]
-
-    cart_items = CartItem.query.filter(CartItem.animal_id.in_(animal_ids)).all()
-    orders = {}
-    for item in cart_items:
-        if item.cart_id not in orders:
-            orders[item.cart_id] = []
-        orders[item.cart_id].append(item.serialize())
-
-    return jsonify(orders), 200
+    farmer_id = get_jwt_identity()['id']
+    try:
+        if wants_stream(request):
+            rows = farmer_order_rows(farmer_id, request.args).yield_per(STREAM_BATCH_SIZE)
+            return ndjson_response(encode_line(order) for order in group_orders(rows))
+        limit = parse_limit(request.args.get('limit'))
+        orders, next_cursor = farmer_orders_page(farmer_id, request.args, request.args.get('cursor'), limit)
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    except ValueError:
+        return jsonify({'message': 'Invalid filter value'}), 400
+    response = json_response(orders)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
+@api.route('/farmer/sales', methods=['GET'])
+@role_required('farmer')
+def get_farmer_sales():
+    try:
+        summary = farmer_sales(get_jwt_identity()['id'], request.args)
+    except ValueError:
+        return jsonify({'message': 'Invalid filter value'}), 400
+    return jsonify(summary), 200
 
 # Error handling
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found_error(error):
     print(error)
     return jsonify({'message': 'Resource not found'}), 404
 
-@app.errorhandler(500)
+@api.app_errorhandler(PoolOverloaded)
+def overloaded_error(error):
+    response = jsonify({'message': 'Server busy, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@api.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     print(error)
     return jsonify({'message': 'An internal error occurred'}), 500
 
 if __name__ == '__main__':
+  app = create_app()
   with app.app_context():
     db.create_all()
     app.run(debug=True, host='0.0.0.0')
@@ -0,0 +1,87 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify
+from flask_jwt_extended import JWTManager, get_jwt_identity, jwt_required
+
+DEFAULT_TOKEN_CACHE_SIZE = 1024
+
+
+class TokenCache:
+    # Verified token payloads keyed by a digest of the token, so the raw
+    # bearer token is never kept around. An entry is only served until the
+    # token's own exp; after that the full decode runs and raises as usual.
+    def __init__(self, maxsize=DEFAULT_TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def key(token):
+        return hashlib.blake2b(token.encode('utf-8'), digest_size=16).digest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, payload = entry
+                if expires is None or expires > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, payload):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (payload.get('exp'), payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+class CachingJWTManager(JWTManager):
+    # Every protected request otherwise parses the token twice (unverified, to
+    # pick the key, then verified) and checks the HMAC. Blocklist and user
+    # loader callbacks run after decoding, so they still see every request.
+    # _decode_jwt_from_config is private to flask-jwt-extended, hence the pin
+    # in the Pipfile; tests/test_auth.py fails if an upgrade stops calling it.
+    def __init__(self, app=None, add_context_processor=False):
+        self.tokens = TokenCache()
+        super().__init__(app, add_context_processor)
+
+    def init_app(self, app, add_context_processor=False):
+        self.tokens = TokenCache(app.config.get('JWT_TOKEN_CACHE_SIZE', DEFAULT_TOKEN_CACHE_SIZE))
+        super().init_app(app, add_context_processor)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        key = self.tokens.key(encoded_token)
+        payload = self.tokens.get(key)
+        if payload is None:
+            payload = super()._decode_jwt_from_config(encoded_token)
+            self.tokens.set(key, payload)
+        return payload
+
+
+def role_required(*roles):
+    def decorator(fn):
+        @wraps(fn)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            if get_jwt_identity().get('role') not in roles:
+                return jsonify({'message': 'Unauthorized'}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Set before any benchmark module imports the app, which reads them at import time.
+BENCH_DB = os.path.join(tempfile.gettempdir(), 'farmart_bench.db')
+os.environ.setdefault('DB_URI', f'sqlite:///{BENCH_DB}')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+# The load benchmarks measure bcrypt itself; bench_rate_limit turns the limiter on.
+os.environ.setdefault('AUTH_RATE_LIMIT_ENABLED', '0')
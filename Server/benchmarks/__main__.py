@@ -0,0 +1,47 @@
+import sys
+
+from .accounts import bench_jwt, bench_rate_limit
+from .background import bench_jobs, bench_images
+from .caching import bench_cache, bench_conditional_get, bench_compression
+from .catalog import bench_list_animals, bench_serializers, bench_search, bench_ingest
+from .dashboard import bench_farmer_orders, bench_sales
+from .database import bench_sqlite_journal, bench_replicas
+from .load import bench_load
+from .server import bench_startup, bench_metrics
+from .shopping import bench_cart_concurrency, bench_cart_view, bench_checkout, bench_idempotency
+from .streams import bench_stream
+
+
+BENCHMARKS = {
+    'list_animals': (bench_list_animals, [1000, 10000, 100000, 1000000]),
+    'serialize': (bench_serializers, [100000]),
+    'farmer_orders': (bench_farmer_orders, [100000, 20000]),
+    'cache': (bench_cache, [100000]),
+    'conditional_get': (bench_conditional_get, [100000]),
+    'ingest': (bench_ingest, [100000]),
+    'cart_concurrency': (bench_cart_concurrency, [8, 50]),
+    'cart_view': (bench_cart_view, [200]),
+    'search': (bench_search, [1000000]),
+    'sqlite_journal': (bench_sqlite_journal, [8, 100]),
+    'startup': (bench_startup, [5, 4]),
+    'metrics': (bench_metrics, [100000]),
+    'jwt': (bench_jwt, [5000]),
+    'sales': (bench_sales, [100000, 20000]),
+    'checkout': (bench_checkout, [400, 200, 8]),
+    'jobs': (bench_jobs, [2000]),
+    'images': (bench_images, [50]),
+    'load': (bench_load, [50, 500, 20000, 2000, 500, 4]),
+    'replicas': (bench_replicas, [20000, 1000, 250]),
+    'rate_limit': (bench_rate_limit, [20000, 500, 200]),
+    'compression': (bench_compression, [20000, 2000]),
+    'stream': (bench_stream, [1500, 20]),
+    'idempotency': (bench_idempotency, [500]),
+}
+
+
+# Run from Server/: python -m benchmarks <name> [args...]
+if __name__ == '__main__':
+    name = sys.argv[1] if len(sys.argv) > 1 else 'list_animals'
+    bench, defaults = BENCHMARKS[name]
+    args = [int(arg) for arg in sys.argv[2:]] or defaults
+    bench(*args)
@@ -0,0 +1,111 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_jwt_extended import create_access_token, decode_token
+
+from app import app, create_app
+from ratelimit import Limit, RateLimiter, SQLiteBuckets, limiter
+
+from .common import percentile, reset_db, seed_animals, time_requests, LOAD_PASSWORD, seed_accounts
+
+
+def bench_jwt(rounds=5000, tokens=100):
+    with app.app_context():
+        reset_db()
+        seed_animals(50)
+    print(f"{'token cache':<12} {'decode us':>10} {'GET /cart p50 ms':>17} {'hits':>6}")
+    for name, size in (('off', 0), ('on', 1024)):
+        jwt_app = create_app({'JWT_TOKEN_CACHE_SIZE': size})
+        manager = jwt_app.extensions['flask-jwt-extended']
+        with jwt_app.app_context():
+            encoded = [create_access_token(identity={'id': i, 'role': 'user', 'username': f'user{i}'})
+                       for i in range(1, tokens + 1)]
+            start = time.perf_counter()
+            for i in range(rounds):
+                decode_token(encoded[i % tokens])
+            decode_us = (time.perf_counter() - start) / rounds * 1e6
+        client = jwt_app.test_client()
+        headers = [{'Authorization': f'Bearer {token}'} for token in encoded]
+        samples = []
+        for i in range(rounds // 5):
+            start = time.perf_counter()
+            client.get('/cart', headers=headers[i % tokens])
+            samples.append(time.perf_counter() - start)
+        print(f"{name:<12} {decode_us:>10.1f} {percentile(samples, 50) * 1000:>17.3f} {manager.tokens.hits:>6}")
+
+
+def bench_rate_limit(animals=20000, requests=500, rate=200, flood_threads=8, attackers=4):
+    # Attackers send `rate` logins/sec with wrong passwords while a shopper
+    # browses the catalog and real users log in from their own addresses.
+    # Without the limiter every attempt queues for bcrypt, so real logins are
+    # shed with 503s and the catalog competes for CPU; with it most attempts
+    # are refused before any database or bcrypt work.
+    with app.app_context():
+        reset_db()
+        seed_animals(animals)
+        seed_accounts(1, 200)
+    urls = [f'/animals?category_id={i % 8 + 1}&sort=price&limit=50' for i in range(requests)]
+    print(f"{'limiter':<8} {'flood':<6} {'p50 ms':>8} {'p99 ms':>8} {'attempts':>9} {'bcrypt':>7} {'503':>5} {'429':>6} {'real logins ok':>15}")
+    for enabled in (False, True):
+        client = create_app({'AUTH_RATE_LIMIT_ENABLED': enabled, 'CACHE_MAXSIZE': 0}).test_client()
+        time_requests(client, urls[:50])
+        quiet = time_requests(client, urls)
+        stop = threading.Event()
+        statuses = []
+
+        def flood(n):
+            rng = random.Random(n)
+            ip = f'10.0.0.{n % attackers + 1}'
+            interval = flood_threads / rate
+            next_at = time.perf_counter()
+            while not stop.is_set():
+                response = client.post('/login', json={'username': f'user{rng.randint(1, 100)}', 'password': 'Wrong1234'},
+                                       environ_base={'REMOTE_ADDR': ip})
+                statuses.append(response.status_code)
+                next_at += interval
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+
+        threads = [threading.Thread(target=flood, args=(n,)) for n in range(flood_threads)]
+        for thread in threads:
+            thread.start()
+        try:
+            # Let the flood drain the attackers' initial bursts first.
+            time.sleep(3)
+            flooded = time_requests(client, urls)
+            # Real users (accounts the flood does not target) on their own addresses.
+            real = [client.post('/login', json={'username': f'user{user_id}', 'password': LOAD_PASSWORD},
+                                environ_base={'REMOTE_ADDR': f'192.168.0.{user_id - 100}'}).status_code
+                    for user_id in range(101, 111)]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        name = 'on' if enabled else 'off'
+        print(f"{name:<8} {'none':<6} {percentile(quiet, 50) * 1000:>8.2f} {percentile(quiet, 99) * 1000:>8.2f}")
+        print(f"{name:<8} {'login':<6} {percentile(flooded, 50) * 1000:>8.2f} {percentile(flooded, 99) * 1000:>8.2f} "
+              f"{len(statuses):>9} {statuses.count(401):>7} {statuses.count(503):>5} {statuses.count(429):>6} "
+              f"{real.count(200):>12}/{len(real)}")
+    print(limiter.stats())
+
+    # One account attacked from many addresses is cut off by its own bucket.
+    statuses = [client.post('/login', json={'username': 'user200', 'password': 'Wrong1234'},
+                            environ_base={'REMOTE_ADDR': f'10.1.{n // 250}.{n % 250}'}).status_code for n in range(50)]
+    print(f'spraying one account from 50 addresses: {statuses.count(401)} bcrypt checks, '
+          f'{statuses.count(429)} refused')
+
+    # Two workers sharing a SQLite bucket file enforce one limit between them.
+    path = os.path.join(tempfile.gettempdir(), 'farmart_rate_limit.db')
+    if os.path.exists(path):
+        os.remove(path)
+    workers = [RateLimiter() for _ in range(2)]
+    for worker in workers:
+        worker.configure(buckets=SQLiteBuckets(path), ip=Limit(20, 0.001))
+    results = []
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda n: workers[n % 2].check('10.2.0.1'), range(200)))
+    allowed = sum(1 for wait in results if not wait)
+    print(f'two workers sharing {os.path.basename(path)} allowed {allowed} of 200 attempts (burst 20)')
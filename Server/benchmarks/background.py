@@ -0,0 +1,102 @@
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from app import create_app
+from jobs import jobs, SQLiteBackend
+
+from .common import reset_db, seed_animals, auth_header
+
+
+def bench_jobs(count=2000):
+    # Every tenth job fails twice before succeeding, which exercises retry
+    # with backoff; the SQLite backend must also survive a restart.
+    attempts = {}
+
+    @jobs.task('bench_flaky')
+    def flaky(n):
+        attempts[n] = attempts.get(n, 0) + 1
+        if n % 10 == 0 and attempts[n] < 3:
+            raise RuntimeError('flaky job')
+
+    logging.getLogger('jobs').setLevel(logging.CRITICAL)
+    queue_db = os.path.join(tempfile.gettempdir(), 'farmart_jobs.db')
+    print(f"{'backend':<8} {'jobs/sec':>9} {'wait avg ms':>12} {'retried':>8} {'failed':>7}")
+    for name, url in (('memory', None), ('sqlite', f'sqlite:///{queue_db}')):
+        if os.path.exists(queue_db):
+            os.remove(queue_db)
+        attempts.clear()
+        create_app({'JOB_QUEUE_URL': url, 'JOB_RETRY_DELAY': 0.01})
+        start = time.perf_counter()
+        for n in range(count):
+            jobs.enqueue('bench_flaky', n=n)
+        jobs.join()
+        elapsed = time.perf_counter() - start
+        stats = jobs.stats()
+        assert stats['completed'] == count and stats['retried'] == 2 * len(range(0, count, 10)), stats
+        print(f"{name:<8} {count / elapsed:>9.0f} {stats['wait_avg_ms']:>12.2f} {stats['retried']:>8} {stats['failed']:>7}")
+
+    # Jobs written by a process that died before running them are picked up
+    # by the next one.
+    assert isinstance(jobs.backend, SQLiteBackend)
+    now = time.time()
+    for n in range(1, 100, 10):
+        jobs.backend.push('bench_flaky', {'n': n}, now, now)
+    attempts.clear()
+    create_app({'JOB_QUEUE_URL': f'sqlite:///{queue_db}'})
+    jobs.start()
+    jobs.join()
+    assert len(attempts) == 10, attempts
+    print('jobs persisted before a restart ran after it')
+
+
+def bench_images(animals=50, width=2400, height=1600):
+    # Uploads generated photos, waits for the thumbnail jobs, then compares
+    # what a catalog card downloads before and after.
+    try:
+        from PIL import Image
+    except ImportError:
+        print('Pillow is not installed; thumbnails are disabled')
+        return
+    import io
+    media = tempfile.mkdtemp(prefix='farmart_media_')
+    image_app = create_app({'IMAGE_DIR': media})
+    with image_app.app_context():
+        reset_db()
+        seed_animals(animals, farmers=1)
+    client = image_app.test_client()
+    headers = auth_header(1, 'farmer')
+    rng = random.Random(animals)
+    uploads = []
+    for animal_id in range(1, animals + 1):
+        image = Image.effect_noise((width, height), rng.randint(10, 80)).convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=90)
+        uploads.append(buffer.getvalue())
+    start = time.perf_counter()
+    for animal_id, data in enumerate(uploads, start=1):
+        response = client.post(f'/farmer/animals/{animal_id}/image', data={'image': (io.BytesIO(data), 'photo.jpg')},
+                               headers=headers)
+        assert response.status_code == 201, response.json
+    upload_ms = (time.perf_counter() - start) / animals * 1000
+    start = time.perf_counter()
+    jobs.join(timeout=300)
+    thumbs_ms = (time.perf_counter() - start) * 1000
+
+    # tests/test_images.py covers dedupe, Range and revalidation.
+    listing = client.get(f'/animals?farmer_id=1&limit={animals}').json
+    original = client.get(listing[0]['image_url'])
+    card = client.get(listing[0]['thumbnails']['md'])
+
+    originals = sum(len(client.get(row['image_url']).get_data()) for row in listing)
+    cards = sum(len(client.get(row['thumbnails']['md']).get_data()) for row in listing)
+    smalls = sum(len(client.get(row['thumbnails']['sm']).get_data()) for row in listing)
+    print(f"upload {upload_ms:.1f} ms/image, thumbnails for {animals} images drained in {thumbs_ms:.0f} ms "
+          f"({jobs.stats()['run_avg_ms']:.1f} ms/job)")
+    print(f"catalog page of {animals}: originals {originals / 1024:.0f} KiB, md thumbnails {cards / 1024:.0f} KiB, "
+          f"sm thumbnails {smalls / 1024:.0f} KiB; original {len(original.get_data()) / 1024:.0f} KiB vs card "
+          f"{len(card.get_data()) / 1024:.0f} KiB")
+    shutil.rmtree(media)
@@ -0,0 +1,113 @@
+import time
+
+from app import app, create_app
+from cache import cache, LRUCache, RedisCache
+from compression import payloads
+
+from .common import percentile, reset_db, seed_animals, time_requests
+
+
+class FakeRedis:
+    # Just enough of the redis-py client for RedisCache, to run offline.
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value.encode('utf-8') if isinstance(value, str) else value,
+                          time.monotonic() + ex if ex else None)
+
+    def incr(self, key):
+        value = int(self.get(key) or 0) + 1
+        self.data[key] = (str(value).encode('utf-8'), None)
+        return value
+
+
+def bench_cache(animals=100000, requests=500):
+    with app.app_context():
+        reset_db()
+        seed_animals(animals)
+    client = app.test_client()
+    urls = [f'/animals?category_id={i % 8 + 1}&sort=price&limit=50' for i in range(requests)]
+    backends = {
+        'no cache': LRUCache(maxsize=0),
+        'lru': LRUCache(),
+        'redis (fake)': RedisCache(FakeRedis()),
+    }
+    print(f"{'backend':<14} {'p50 ms':>8} {'p99 ms':>8} {'hits':>6} {'misses':>7}")
+    original, original_payloads = cache.backend, payloads.backend
+    # Finished bodies would be served before any of these backends is asked.
+    payloads.backend = LRUCache(maxsize=0)
+    for name, backend in backends.items():
+        cache.backend = backend
+        samples = time_requests(client, urls)
+        # tests/test_cache.py checks that writes invalidate these entries.
+        stats = cache.stats()
+        print(f"{name:<14} {percentile(samples, 50) * 1000:>8.2f} {percentile(samples, 99) * 1000:>8.2f}"
+              f" {stats['hits']:>6} {stats['misses']:>7}")
+    cache.backend, payloads.backend = original, original_payloads
+
+
+def bench_conditional_get(animals=100000, polls=500):
+    with app.app_context():
+        reset_db()
+        seed_animals(animals)
+    client = app.test_client()
+    url = '/animals?sort=price&limit=200'
+    print(f"{'client':<18} {'p50 ms':>8} {'p99 ms':>8} {'bytes/poll':>11}")
+    for name, revalidate in (('unconditional', False), ('If-None-Match', True)):
+        etag = client.get(url).headers['ETag']
+        headers = {'If-None-Match': etag} if revalidate else {}
+        samples, sent = [], 0
+        for _ in range(polls):
+            start = time.perf_counter()
+            response = client.get(url, headers=headers)
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == (304 if revalidate else 200)
+            sent += len(response.get_data())
+        print(f"{name:<18} {percentile(samples, 50) * 1000:>8.2f} {percentile(samples, 99) * 1000:>8.2f} {sent / polls:>11.0f}")
+
+
+def bench_compression(animals=20000, requests=2000, pages=20):
+    # Bytes on the wire and CPU per catalog request: the old pretty-printed,
+    # uncompressed responses against compact JSON, per-response compression
+    # and precompressed cached bodies.
+    with app.app_context():
+        reset_db()
+        seed_animals(animals)
+    urls = [f'/animals?category_id={i % 8 + 1}&sort=price&limit=50&min_price={i * 1000}' for i in range(pages)]
+    configs = [
+        ('pretty, identity', {'COMPRESS_ENABLED': False, 'PAYLOAD_CACHE_MAXSIZE': 0}, None, True),
+        ('compact, identity', {'COMPRESS_ENABLED': False, 'PAYLOAD_CACHE_MAXSIZE': 0}, None, False),
+        ('compact, gzip', {'PAYLOAD_CACHE_MAXSIZE': 0}, 'gzip', False),
+        ('compact, br', {'PAYLOAD_CACHE_MAXSIZE': 0}, 'br', False),
+        ('cached gzip', {}, 'gzip', False),
+        ('cached br', {}, 'br', False),
+    ]
+    print(f"{'responses':<18} {'bytes/resp':>11} {'cpu us/req':>11} {'p50 ms':>8}")
+    for name, config, encoding, pretty in configs:
+        bench_app = create_app(config)
+        if pretty:
+            bench_app.json.compact = False
+        client = bench_app.test_client()
+        headers = {'Accept-Encoding': encoding} if encoding else {}
+        sizes = [len(client.get(url, headers=headers).data) for url in urls]
+        if encoding:
+            response = client.get(urls[0], headers=headers)
+            if response.headers.get('Content-Encoding') != encoding:
+                print(f'{name:<18} not available')
+                continue
+        cpu = time.process_time()
+        samples = []
+        for i in range(requests):
+            start = time.perf_counter()
+            client.get(urls[i % pages], headers=headers)
+            samples.append(time.perf_counter() - start)
+        cpu = time.process_time() - cpu
+        print(f"{name:<18} {sum(sizes) / len(sizes):>11.0f} {cpu / requests * 1e6:>11.0f} {percentile(samples, 50) * 1000:>8.3f}")
@@ -0,0 +1,104 @@
+import random
+import time
+
+from app import app
+from models import db, Animal
+from search import fts_search, like_search, search_terms
+from serializers import ANIMAL_FIELDS, dumps
+
+from .common import TYPES, percentile, reset_db, seed_animals, time_requests, auth_header
+
+
+def bench_list_animals(*sizes, pages=200):
+    print(f"{'animals':>10} {'p50 ms':>8} {'p99 ms':>8}  query")
+    for size in sizes:
+        with app.app_context():
+            reset_db()
+            seed_animals(size)
+        client = app.test_client()
+        queries = {
+            'first page': ['/animals?limit=50'] * pages,
+            'by price': ['/animals?sort=price&limit=50'] * pages,
+            'filtered': ['/animals?status=Available&category_id=3&sort=price&limit=50'] * pages,
+        }
+        # Walk deep into the catalog by following cursors, the case OFFSET handles worst.
+        deep, url = [], '/animals?sort=price&limit=50'
+        for _ in range(pages):
+            deep.append(url)
+            cursor = client.get(url).headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+            url = f'/animals?sort=price&limit=50&cursor={cursor}'
+        queries['cursor walk'] = deep
+        for name, urls in queries.items():
+            samples = time_requests(client, urls)
+            print(f"{size:>10} {percentile(samples, 50) * 1000:>8.2f} {percentile(samples, 99) * 1000:>8.2f}  {name}")
+
+
+def bench_serializers(count=100000):
+    with app.app_context():
+        reset_db()
+        seed_animals(count)
+        db.session.expunge_all()
+
+        start = time.perf_counter()
+        payload = [animal.serialize() for animal in Animal.query.all()]
+        body = app.json.dumps(payload)
+        orm_elapsed = time.perf_counter() - start
+        db.session.expunge_all()
+
+        start = time.perf_counter()
+        body = dumps(ANIMAL_FIELDS.rows(ANIMAL_FIELDS.query().all()))
+        plan_elapsed = time.perf_counter() - start
+
+    print(f"{'path':<22} {'rows/sec':>12}")
+    print(f"{'Animal.serialize()':<22} {count / orm_elapsed:>12.0f}")
+    print(f"{'FieldPlan + dumps':<22} {count / plan_elapsed:>12.0f}")
+
+
+def bench_search(animals=1000000, rounds=20):
+    with app.app_context():
+        reset_db()
+        seed_animals(animals)
+        # Common terms match a large share of rows (LIKE can stop at the first 50
+        # unranked hits); rare and absent terms force LIKE through the table.
+        queries = ['goat', 'dairy goat', 'vacc', 'hardy highland sheep', 'category-3 organic',
+                   'breed-7 pedigree weaned', 'zebu', 'merino']
+        print(f"{animals} animals")
+        print(f"{'query':<24} {'fts p50 ms':>11} {'like p50 ms':>12}")
+        for q in queries:
+            terms = search_terms(q)
+            timings = []
+            for search in (fts_search, like_search):
+                samples = []
+                for _ in range(rounds):
+                    start = time.perf_counter()
+                    search(ANIMAL_FIELDS.query(), terms).limit(50).all()
+                    samples.append(time.perf_counter() - start)
+                timings.append(percentile(samples, 50) * 1000)
+            print(f"{q:<24} {timings[0]:>11.2f} {timings[1]:>12.2f}")
+
+
+def bench_ingest(animals=100000, per_row=2000):
+    rng = random.Random(animals)
+    payload = [{'type': rng.choice(TYPES), 'breed': f'breed-{rng.randint(1, 50)}',
+                'price': rng.randint(500, 100000), 'description': 'herd', 'farmer_id': 1}
+               for _ in range(animals)]
+    client = app.test_client()
+    with app.app_context():
+        reset_db()
+    start = time.perf_counter()
+    for row in payload[:per_row]:
+        assert client.post('/farmer/animals', json=row).status_code == 201
+    row_rate = per_row / (time.perf_counter() - start)
+
+    with app.app_context():
+        reset_db()
+    start = time.perf_counter()
+    response = client.post('/farmer/animals/bulk', json=payload, headers=auth_header(1, 'farmer'))
+    bulk_elapsed = time.perf_counter() - start
+    assert response.json['inserted'] == animals, response.json
+
+    print(f"{'path':<26} {'animals/sec':>12} {'time for ' + str(animals):>16}")
+    print(f"{'POST /farmer/animals':<26} {row_rate:>12.0f} {animals / row_rate:>15.1f}s (extrapolated)")
+    print(f"{'POST /farmer/animals/bulk':<26} {animals / bulk_elapsed:>12.0f} {bulk_elapsed:>15.1f}s")
@@ -0,0 +1,176 @@
+import os
+import random
+import shutil
+import socket
+import subprocess
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import app
+from models import db, Animal, Category, Cart, CartItem, Farmer, User
+from passwords import passwords
+
+# Server/, where app.py and gunicorn.conf.py live.
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TYPES = ['chicken', 'goat', 'sheep', 'cow', 'camel', 'rabbit', 'fish', 'bee']
+STATUSES = ['Available', 'Available', 'Available', 'Sold Out', 'Pending']
+WORDS = ['healthy', 'young', 'mature', 'vaccinated', 'dairy', 'meat', 'wool', 'egg', 'laying',
+         'breeding', 'stock', 'grass', 'fed', 'hardy', 'docile', 'pedigree', 'heavy', 'fast',
+         'growing', 'coastal', 'highland', 'organic', 'free', 'range', 'weaned', 'registered']
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def reset_db():
+    db.drop_all()
+    db.create_all()
+
+
+def seed_animals(count, farmers=100, batch_size=10000):
+    rng = random.Random(count)
+    db.session.execute(Category.__table__.insert(), [{'name': f'category-{i}'} for i in range(1, 9)])
+    rows = []
+    for i in range(count):
+        rows.append({
+            'type': rng.choice(TYPES),
+            'breed': f'breed-{rng.randint(1, 50)}',
+            'price': round(rng.uniform(500, 1000000), 2),
+            'status': rng.choice(STATUSES),
+            'description': ' '.join(rng.sample(WORDS, 6)),
+            'farmer_id': rng.randint(1, farmers),
+            'category_id': rng.randint(1, 8),
+        })
+        if len(rows) == batch_size:
+            db.session.execute(Animal.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(Animal.__table__.insert(), rows)
+    db.session.commit()
+
+
+def seed_orders(carts, items_per_cart=5, animals=None, users=1000, batch_size=10000):
+    rng = random.Random(carts)
+    animals = animals or db.session.query(db.func.max(Animal.id)).scalar()
+    # At most one pending cart per user, as uq_carts_user_id_pending requires;
+    # confirmed carts are spread over the last 90 days.
+    today = datetime.now().replace(microsecond=0)
+    rows = []
+    for i in range(carts):
+        pending = i < users and rng.random() < 0.5
+        rows.append({'user_id': i % users + 1, 'total_price': 0, 'status': 'Pending' if pending else 'Confirmed',
+                     'order_date': None if pending else today - timedelta(days=rng.randint(0, 89))})
+    db.session.execute(Cart.__table__.insert(), rows)
+    rows = []
+    for cart_id in range(1, carts + 1):
+        for animal_id in rng.sample(range(1, animals + 1), items_per_cart):
+            rows.append({'cart_id': cart_id, 'animal_id': animal_id,
+                         'quantity': rng.randint(1, 3), 'unit_price': 1000.0})
+        if len(rows) >= batch_size:
+            db.session.execute(CartItem.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(CartItem.__table__.insert(), rows)
+    db.session.commit()
+
+
+LOAD_PASSWORD = 'load-test-password'
+
+
+def seed_accounts(farmers, users):
+    # One real hash shared by every account: logins still pay full bcrypt cost,
+    # seeding does not pay it once per row.
+    hashed = passwords.hash(LOAD_PASSWORD)
+    for model, role, count in ((Farmer, 'farmer', farmers), (User, 'user', users)):
+        db.session.execute(model.__table__.insert(), [
+            {'username': f'{role}{i}', 'email': f'{role}{i}@example.com', 'password_hash': hashed, 'role': role}
+            for i in range(1, count + 1)
+        ])
+    db.session.commit()
+
+
+def seed_world(farmers, users, animals, carts, items_per_cart=3):
+    seed_animals(animals, farmers)
+    seed_accounts(farmers, users)
+    seed_orders(carts, items_per_cart, animals, users)
+
+
+def time_requests(client, urls):
+    samples = []
+    for url in urls:
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, (url, response.status_code)
+    return samples
+
+
+def auth_header(user_id, role='user'):
+    with app.app_context():
+        token = create_access_token(identity={'id': user_id, 'role': role, 'username': f'{role}{user_id}'})
+    return {'Authorization': f'Bearer {token}'}
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self.local = threading.local()
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self.on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self.on_execute)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+
+def worker_memory(master_pid):
+    # Pss splits shared pages between the processes mapping them, so it is the
+    # honest per-worker cost; Private_* is what a worker does not share at all.
+    children = subprocess.run(['pgrep', '-P', str(master_pid)], capture_output=True, text=True).stdout.split()
+    usage = []
+    for pid in children:
+        fields = {}
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+        usage.append((fields['Pss'] / 1024, (fields['Private_Clean'] + fields['Private_Dirty']) / 1024))
+    return usage
+
+
+def start_gunicorn(workers, env=None):
+    gunicorn = shutil.which('gunicorn')
+    if not gunicorn:
+        raise SystemExit('gunicorn is not installed')
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    # The worker count goes through the environment, where gunicorn.conf.py
+    # picks it up and passes it on to the app's bcrypt pool sizing.
+    server = subprocess.Popen([gunicorn, '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'],
+                              cwd=SERVER_DIR,
+                              env=dict(os.environ, GUNICORN_PRELOAD='1', GUNICORN_WORKERS=str(workers), **(env or {})),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base_url + '/animals/categories', timeout=1).read()
+            return server, base_url
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit('gunicorn did not start')
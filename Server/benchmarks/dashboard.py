@@ -0,0 +1,81 @@
+import time
+
+from app import app
+from jobs import jobs
+from models import db, Animal, Cart, CartItem
+from orders import farmer_order_rows, farmer_orders_page, group_orders
+from sales import check_summary, rebuild_summary
+
+from .common import percentile, reset_db, seed_animals, auth_header, seed_orders, seed_world
+
+
+def legacy_farmer_orders(farmer_id):
+    animal_ids = [animal.id for animal in Animal.query.filter_by(farmer_id=farmer_id).all()]
+    orders = {}
+    for item in CartItem.query.filter(CartItem.animal_id.in_(animal_ids)).all():
+        orders.setdefault(item.cart_id, []).append(item.serialize())
+    return orders
+
+
+def bench_farmer_orders(animals=100000, carts=20000, rounds=20):
+    # Ten farmers share the catalog, so each owns ~animals/10 rows.
+    with app.app_context():
+        reset_db()
+        seed_animals(animals, farmers=10)
+        seed_orders(carts)
+        owned = Animal.query.filter_by(farmer_id=1).count()
+        paths = {
+            'legacy IN-list': lambda: legacy_farmer_orders(1),
+            'joined, one page': lambda: farmer_orders_page(1, {}, None, 50),
+            'joined, all orders': lambda: list(group_orders(farmer_order_rows(1, {}).yield_per(1000))),
+        }
+        print(f"farmer owns {owned} animals, {carts} carts")
+        print(f"{'path':<20} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, run in paths.items():
+            samples = []
+            for _ in range(rounds):
+                db.session.expunge_all()
+                start = time.perf_counter()
+                run()
+                samples.append(time.perf_counter() - start)
+            print(f"{name:<20} {percentile(samples, 50) * 1000:>8.2f} {percentile(samples, 99) * 1000:>8.2f}")
+
+
+def bench_sales(animals=100000, carts=20000, farmers=100):
+    with app.app_context():
+        reset_db()
+        seed_world(farmers, 1000, animals, carts, items_per_cart=5)
+        db.session.execute(Animal.__table__.update().values(status='Available'))
+        start = time.perf_counter()
+        rebuild_summary()
+        db.session.commit()
+        backfill = time.perf_counter() - start
+        pending = [user_id for (user_id,) in db.session.query(Cart.user_id).filter(Cart.status == 'Pending')]
+    print(f"backfill of {carts} carts: {backfill * 1000:.0f} ms")
+
+    client = app.test_client()
+    start = time.perf_counter()
+    # Pending carts overlap, so later checkouts of an already sold animal get a 409.
+    statuses = [client.post('/cart/checkout', headers=auth_header(user_id)).status_code for user_id in pending]
+    assert set(statuses) <= {200, 409}, sorted(set(statuses))
+    print(f"{len(pending)} checkouts ({statuses.count(200)} confirmed): "
+          f"{len(pending) / (time.perf_counter() - start):.0f}/sec, summary refreshed in the background")
+    jobs.join()
+    with app.app_context():
+        mismatches = check_summary()
+    assert not mismatches, mismatches[:5]
+    print('summary matches a full recomputation')
+
+    print(f"{'dashboard source':<28} {'p50 ms':>8} {'p99 ms':>8}")
+    headers = [auth_header(farmer_id, 'farmer') for farmer_id in range(1, farmers + 1)]
+    for name, url in (('/farmer/orders (all, raw)', '/farmer/orders?stream=1'),
+                      ('/farmer/sales (by day)', '/farmer/sales'),
+                      ('/farmer/sales (by category)', '/farmer/sales?group=category')):
+        samples = []
+        for farmer_headers in headers:
+            start = time.perf_counter()
+            response = client.get(url, headers=farmer_headers)
+            response.get_data()
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200
+        print(f"{name:<28} {percentile(samples, 50) * 1000:>8.2f} {percentile(samples, 99) * 1000:>8.2f}")
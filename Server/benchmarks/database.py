@@ -0,0 +1,113 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app, create_app
+from models import db
+from replicas import replicas
+
+from . import BENCH_DB
+from .common import percentile, reset_db, seed_animals, time_requests, auth_header
+
+
+def bench_sqlite_journal(threads=8, ops_per_thread=100):
+    # Write-heavy cart traffic (each thread is a different shopper adding and
+    # re-reading their cart) under SQLite's defaults and under WAL.
+    pragmas = app.config['SQLITE_PRAGMAS']
+    if not pragmas:
+        print('journal benchmark needs a SQLite DB_URI')
+        return
+    headers = {user_id: auth_header(user_id) for user_id in range(1, threads + 1)}
+    print(f"{'journal':<22} {'ops/sec':>8} {'p99 ms':>8} {'errors':>7}")
+    for label, journal_mode, synchronous in (('DELETE, sync FULL', 'DELETE', 'FULL'),
+                                             ('WAL, sync NORMAL', 'WAL', 'NORMAL')):
+        pragmas.update(journal_mode=journal_mode, synchronous=synchronous)
+        with app.app_context():
+            db.engine.dispose()
+            reset_db()
+            seed_animals(50)
+        samples, errors = [], []
+
+        def worker(user_id):
+            rng = random.Random(user_id)
+            client = app.test_client()
+            for i in range(ops_per_thread):
+                start = time.perf_counter()
+                if i % 4 == 3:
+                    response = client.get('/cart', headers=headers[user_id])
+                else:
+                    response = client.post('/cart', json={'animal_id': rng.randint(1, 50)}, headers=headers[user_id])
+                samples.append(time.perf_counter() - start)
+                if response.status_code >= 500:
+                    errors.append(response.status_code)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, headers))
+        elapsed = time.perf_counter() - start
+        print(f"{label:<22} {len(samples) / elapsed:>8.0f} {percentile(samples, 99) * 1000:>8.2f} {len(errors):>7}")
+
+
+def replicate(source, targets):
+    # Stands in for replication: copies the primary's pages over each replica.
+    with sqlite3.connect(source) as primary:
+        for target in targets:
+            replica = sqlite3.connect(target)
+            try:
+                primary.backup(replica)
+            finally:
+                replica.close()
+
+
+def bench_replicas(animals=20000, requests=1000, lag_ms=250, replica_count=2):
+    # Catalog reads go to replica files that trail the primary by up to lag_ms;
+    # writes stay on the primary. tests/test_replicas.py covers the routing.
+    targets = [os.path.join(tempfile.gettempdir(), f'farmart_replica_{i}.db') for i in range(replica_count)]
+    with app.app_context():
+        reset_db()
+        seed_animals(animals)
+    # Earlier benchmarks leave free pages behind; every copy would ship them.
+    primary = sqlite3.connect(BENCH_DB, isolation_level=None)
+    primary.execute('VACUUM')
+    primary.close()
+    replicate(BENCH_DB, targets)
+    replica_app = create_app({'DB_REPLICA_URI': ','.join(f'sqlite:///{target}' for target in targets),
+                              'CACHE_MAXSIZE': 0})
+    client = replica_app.test_client()
+    stop = threading.Event()
+
+    def replicator():
+        while not stop.wait(lag_ms / 1000):
+            replicate(BENCH_DB, targets)
+
+    thread = threading.Thread(target=replicator, daemon=True)
+    thread.start()
+    try:
+        new_animal = {'type': 'goat', 'breed': 'breed-1', 'price': 100.0, 'description': 'replica bench', 'farmer_id': 1}
+        before = dict(replicas.queries)
+        samples = time_requests(client, [f'/animals?category_id={i % 8 + 1}&sort=price&limit=50' for i in range(requests)]
+                                + ['/animals/categories'] * (requests // 10))
+        for _ in range(requests // 10):
+            assert client.post('/farmer/animals', json=new_animal).status_code == 201
+        print(f"{requests + requests // 10} catalog GETs (p50 {percentile(samples, 50) * 1000:.2f} ms) "
+              f"and {requests // 10} writes; statements per bind:")
+        for name, count in replicas.queries.items():
+            print(f"  {name:<10} {count - before[name]:>7}")
+
+        # A committed write is invisible to replica reads until the next copy.
+        assert client.post('/farmer/animals', json={**new_animal, 'breed': 'replica-probe'}).status_code == 201
+        written = time.perf_counter()
+        stale = 0
+        while not client.get('/animals?breed=replica-probe').get_json():
+            stale += 1
+            time.sleep(0.005)
+        print(f"new animal visible on replicas after {(time.perf_counter() - written) * 1000:.0f} ms "
+              f"({stale} stale reads, lag bound {lag_ms} ms)")
+
+    finally:
+        stop.set()
+        thread.join()
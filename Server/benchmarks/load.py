@@ -0,0 +1,171 @@
+import json
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+from models import db, Cart, CartItem
+
+from .common import TYPES, WORDS, percentile, reset_db, auth_header, LOAD_PASSWORD, seed_world, start_gunicorn
+
+
+def load_plan(farmers, users, animals, requests, seed=0):
+    # Each workload builds its request list when it runs, so later phases can
+    # target rows earlier ones created (cart lines to delete, carts to check out).
+    rng = random.Random(seed)
+    user_headers = {user_id: auth_header(user_id) for user_id in range(1, users + 1)}
+    farmer_headers = {farmer_id: auth_header(farmer_id, 'farmer') for farmer_id in range(1, farmers + 1)}
+    bcrypt_requests = max(1, requests // 10)
+
+    def pending_lines():
+        with app.app_context():
+            return db.session.query(CartItem.id, Cart.user_id).join(Cart, Cart.id == CartItem.cart_id) \
+                .filter(Cart.status == 'Pending').order_by(CartItem.id).limit(requests).all()
+
+    def pending_users():
+        with app.app_context():
+            return [user_id for (user_id,) in db.session.query(Cart.user_id).filter(Cart.status == 'Pending').limit(requests)]
+
+    return [
+        ('POST /register', lambda: [
+            ('POST', '/register', {'username': f'newuser{i}', 'email': f'newuser{i}@example.com',
+                                   'password': LOAD_PASSWORD, 'role': 'user'}, {})
+            for i in range(bcrypt_requests)]),
+        ('POST /login', lambda: [
+            ('POST', '/login', {'username': f'user{rng.randint(1, users)}', 'password': LOAD_PASSWORD}, {})
+            for _ in range(bcrypt_requests)]),
+        ('GET /animals', lambda: [
+            ('GET', rng.choice(['/animals?limit=50', '/animals?sort=price&limit=50',
+                                f'/animals?status=Available&category_id={rng.randint(1, 8)}&sort=price&limit=50',
+                                f'/animals?type={rng.choice(TYPES)}&max_price=50000&limit=50']), None, {})
+            for _ in range(requests)]),
+        ('GET /animals/<id>', lambda: [
+            ('GET', f'/animals/{rng.randint(1, animals)}', None, {}) for _ in range(requests)]),
+        ('GET /animals/search', lambda: [
+            ('GET', f'/animals/search?q={rng.choice(TYPES)}+{rng.choice(WORDS)}', None, {}) for _ in range(requests)]),
+        ('GET /animals/categories', lambda: [
+            ('GET', '/animals/categories', None, {}) for _ in range(requests)]),
+        ('POST /cart', lambda: [
+            ('POST', '/cart', {'animal_id': rng.randint(1, animals), 'quantity': rng.randint(1, 3)},
+             user_headers[rng.randint(1, users)])
+            for _ in range(requests)]),
+        ('GET /cart', lambda: [
+            ('GET', '/cart', None, user_headers[user_id]) for user_id in pending_users()]),
+        ('DELETE /cart/item/<id>', lambda: [
+            ('DELETE', f'/cart/item/{item_id}', None, user_headers[user_id])
+            for item_id, user_id in pending_lines()[::2]]),
+        # Seeded carts may hold animals that are already sold: 409 is a valid answer.
+        ('POST /cart/checkout', lambda: [
+            ('POST', '/cart/checkout', None, user_headers[user_id]) for user_id in pending_users()], {409}),
+        ('GET /farmer/orders', lambda: [
+            ('GET', '/farmer/orders?limit=50', None, farmer_headers[rng.randint(1, farmers)])
+            for _ in range(requests)]),
+    ]
+
+
+def test_client_sender():
+    client = app.test_client()
+
+    def send(method, url, body, headers):
+        return client.open(url, method=method, json=body, headers=headers).status_code
+    return send
+
+
+def http_sender(base_url):
+    def make():
+        def send(method, url, body, headers):
+            data = json.dumps(body).encode() if body is not None else None
+            request = urllib.request.Request(base_url + url, data=data, method=method, headers=dict(
+                headers, **({'Content-Type': 'application/json'} if data is not None else {})))
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+        return send
+    return make
+
+
+def run_workload(make_sender, requests, concurrency, expected=()):
+    samples, errors = [], []
+
+    def worker(chunk):
+        send = make_sender()
+        for method, url, body, headers in chunk:
+            start = time.perf_counter()
+            status = send(method, url, body, headers)
+            samples.append(time.perf_counter() - start)
+            if status >= 400 and status not in expected:
+                errors.append(status)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, [requests[i::concurrency] for i in range(concurrency)]))
+    elapsed = time.perf_counter() - start
+    if not samples:
+        return {'requests': 0}
+    return {
+        'requests': len(samples),
+        'errors': len(errors),
+        'rps': round(len(samples) / elapsed, 1),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def bench_load(farmers=50, users=500, animals=20000, carts=2000, requests=500, concurrency=4):
+    # Whole-API load run. LOAD_TARGET=gunicorn drives a real server over HTTP
+    # instead of the test client; BENCH_OUTPUT writes the JSON report to a file
+    # and BENCH_BASELINE compares p95s against an earlier report.
+    target = os.environ.get('LOAD_TARGET', 'test_client')
+    with app.app_context():
+        reset_db()
+        seed_world(farmers, users, animals, carts)
+    plan = load_plan(farmers, users, animals, requests)
+    server = None
+    if target == 'gunicorn':
+        server, base_url = start_gunicorn(concurrency)
+        make_sender = http_sender(base_url)
+    else:
+        make_sender = test_client_sender
+    results = {}
+    try:
+        for name, build, *expected in plan:
+            results[name] = run_workload(make_sender, build(), concurrency, *expected)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        'target': target,
+        'database': app.config['SQLALCHEMY_DATABASE_URI'],
+        'seed': {'farmers': farmers, 'users': users, 'animals': animals, 'carts': carts},
+        'concurrency': concurrency,
+        'routes': results,
+    }
+    baseline = {}
+    if os.environ.get('BENCH_BASELINE'):
+        with open(os.environ['BENCH_BASELINE']) as f:
+            baseline = json.load(f)['routes']
+    print(f"{'route':<26} {'reqs':>6} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          + (f" {'p95 vs base':>12}" if baseline else ''))
+    for name, stats in results.items():
+        if not stats['requests']:
+            print(f"{name:<26} {0:>6}")
+            continue
+        line = (f"{name:<26} {stats['requests']:>6} {stats['errors']:>4} {stats['rps']:>8.1f} "
+                f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+        base = baseline.get(name, {}).get('p95_ms')
+        if base:
+            line += f" {stats['p95_ms'] / base:>11.2f}x"
+        print(line)
+    if os.environ.get('BENCH_OUTPUT'):
+        with open(os.environ['BENCH_OUTPUT'], 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
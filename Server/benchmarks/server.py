@@ -0,0 +1,67 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from app import app, create_app
+
+from .common import SERVER_DIR, percentile, reset_db, seed_animals, time_requests, worker_memory
+
+
+STARTUP_SNIPPET = '''
+import resource, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+built = time.perf_counter()
+print((imported - start) * 1000, (built - imported) * 1000, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+'''
+
+
+def bench_startup(runs=5, workers=4):
+    env = dict(os.environ, SECRET_KEY='benchmark')
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-c', STARTUP_SNIPPET], cwd=SERVER_DIR,
+                             env=env, capture_output=True, text=True, check=True).stdout.split()
+        samples.append([float(value) for value in out])
+    print(f"import app: {percentile([s[0] for s in samples], 50):.0f} ms, create_app(): "
+          f"{percentile([s[1] for s in samples], 50):.0f} ms, max RSS {percentile([s[2] for s in samples], 50):.0f} MB")
+
+    gunicorn = shutil.which('gunicorn')
+    if not gunicorn or not os.path.exists('/proc/self/smaps_rollup'):
+        print('gunicorn or /proc not available; skipping per-worker memory')
+        return
+    for preload in (False, True):
+        args = [gunicorn, '-c', 'gunicorn.conf.py', '--workers', str(workers), '--bind', '127.0.0.1:0']
+        server = subprocess.Popen(args, cwd=SERVER_DIR, env=dict(env, GUNICORN_PRELOAD=str(int(preload))),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            time.sleep(8)
+            usage = worker_memory(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+        if usage:
+            print(f"{'preload' if preload else 'no preload':<11} {len(usage)} workers: "
+                  f"Pss {sum(u[0] for u in usage) / len(usage):.1f} MB, private {sum(u[1] for u in usage) / len(usage):.1f} MB per worker")
+
+
+def bench_metrics(animals=100000, requests=2000):
+    with app.app_context():
+        reset_db()
+        seed_animals(animals)
+    urls = [f'/animals?category_id={i % 8 + 1}&sort=price&limit=50' for i in range(requests)]
+    print(f"{'metrics':<10} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, enabled in (('disabled', False), ('enabled', True)):
+        client = create_app({'METRICS_ENABLED': enabled, 'CACHE_MAXSIZE': 0}).test_client()
+        time_requests(client, urls[:100])
+        samples = time_requests(client, urls)
+        print(f"{name:<10} {percentile(samples, 50) * 1000:>8.3f} {percentile(samples, 99) * 1000:>8.3f}")
+    scrape = client.get('/metrics').get_data(as_text=True)
+    for line in scrape.splitlines():
+        if line.startswith(('farmart_request_duration_seconds_count', 'farmart_request_sql_statements_sum',
+                            'farmart_request_sql_seconds_sum', 'farmart_request_serialize_seconds_sum')):
+            print(line)
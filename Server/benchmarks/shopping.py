@@ -0,0 +1,116 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+from carts import add_item
+from jobs import jobs
+from models import db, Animal, Cart, CartItem
+
+from .common import percentile, reset_db, seed_animals, auth_header, StatementCounter
+
+
+def bench_cart_concurrency(threads=8, adds_per_thread=50, users=2):
+    # Add-to-cart throughput with many threads on the same carts; tests/test_carts.py
+    # checks that the totals come out right.
+    with app.app_context():
+        reset_db()
+        seed_animals(20)
+        engine = db.engine
+    headers = {user_id: auth_header(user_id) for user_id in range(1, users + 1)}
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        for _ in range(adds_per_thread):
+            client.post('/cart', json={'animal_id': rng.randint(1, 20), 'quantity': rng.randint(1, 3)},
+                        headers=headers[rng.randint(1, users)])
+
+    with StatementCounter(engine) as counter:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, range(threads)))
+        elapsed = time.perf_counter() - start
+
+    adds = threads * adds_per_thread
+    print(f"{adds} concurrent adds from {threads} threads: {adds / elapsed:.0f} adds/sec, "
+          f"{counter.count / adds:.1f} SQL statements per add")
+
+
+def bench_cart_view(items=200, rounds=200):
+    # GET /cart latency as the cart grows; tests/test_carts.py asserts the query count.
+    with app.app_context():
+        reset_db()
+        seed_animals(items)
+        engine = db.engine
+    client = app.test_client()
+    headers = auth_header(1)
+    for size in (1, 10, items):
+        with app.app_context():
+            db.session.execute(CartItem.__table__.delete())
+            db.session.execute(Cart.__table__.delete())
+            db.session.commit()
+        for animal_id in range(1, size + 1):
+            client.post('/cart', json={'animal_id': animal_id, 'quantity': 2}, headers=headers)
+        samples = []
+        with StatementCounter(engine) as counter:
+            for _ in range(rounds):
+                start = time.perf_counter()
+                client.get('/cart', headers=headers)
+                samples.append(time.perf_counter() - start)
+        print(f"{size:>5} lines: {counter.count / rounds:.0f} queries per view, p50 {percentile(samples, 50) * 1000:.2f} ms")
+
+
+def bench_checkout(users=400, animals=200, threads=8, items_per_cart=3):
+    # Checkout throughput when many shoppers with overlapping carts check out
+    # at once; tests/test_checkout.py checks that nothing is sold twice.
+    with app.app_context():
+        reset_db()
+        seed_animals(animals)
+        db.session.execute(Animal.__table__.update().values(status='Available'))
+        rng = random.Random(users)
+        for user_id in range(1, users + 1):
+            for animal_id in rng.sample(range(1, animals + 1), items_per_cart):
+                add_item(user_id, animal_id, 1)
+        db.session.commit()
+    headers = [auth_header(user_id) for user_id in range(1, users + 1)]
+    statuses = []
+
+    def worker(chunk):
+        client = app.test_client()
+        for user_headers in chunk:
+            statuses.append(client.post('/cart/checkout', headers=user_headers).status_code)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, [headers[i::threads] for i in range(threads)]))
+    elapsed = time.perf_counter() - start
+    jobs.join()
+    print(f"{users} concurrent checkouts on {threads} threads: {users / elapsed:.0f} checkouts/sec, "
+          f"{statuses.count(200)} confirmed, {statuses.count(409)} conflicts")
+
+
+def bench_idempotency(requests=500):
+    # What an Idempotency-Key costs on the write path, and what a replay costs
+    # instead; tests/test_idempotency.py covers the behaviour.
+    with app.app_context():
+        reset_db()
+        seed_animals(50)
+        db.session.execute(Animal.__table__.update().values(status='Available'))
+        db.session.commit()
+        engine = db.engine
+    client = app.test_client()
+    headers = auth_header(1)
+    body = {'animal_id': 1, 'quantity': 1}
+    print(f"{'POST /cart':<22} {'p50 ms':>8} {'p99 ms':>8} {'statements':>11}")
+    for name, make_headers in (('no key', lambda i: headers),
+                               ('new key', lambda i: {**headers, 'Idempotency-Key': f'add-{i}'}),
+                               ('replayed key', lambda i: {**headers, 'Idempotency-Key': 'add-0'})):
+        samples = []
+        with StatementCounter(engine) as counter:
+            for i in range(requests):
+                start = time.perf_counter()
+                client.post('/cart', json=body, headers=make_headers(i))
+                samples.append(time.perf_counter() - start)
+        print(f"{name:<22} {percentile(samples, 50) * 1000:>8.2f} {percentile(samples, 99) * 1000:>8.2f} "
+              f"{counter.count / requests:>11.1f}")
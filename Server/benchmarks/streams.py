@@ -0,0 +1,155 @@
+import json
+import os
+import selectors
+import socket
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from app import app
+from events import EventBroker, SQLiteEventLog
+
+from .common import percentile, reset_db, seed_animals, worker_memory, start_gunicorn
+
+
+def open_stream(port, path, headers=()):
+    sock = socket.create_connection(('127.0.0.1', port))
+    request = f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n'
+    sock.sendall((request + ''.join(f'{k}: {v}\r\n' for k, v in headers) + '\r\n').encode())
+    sock.setblocking(False)
+    return sock
+
+
+def read_streams(socks, until, timeout=30):
+    # Reads every socket until until(data) holds for all of them; returns the
+    # bytes received per socket.
+    received = {sock: b'' for sock in socks}
+    pending = {sock for sock in socks if not until(b'')}
+    selector = selectors.DefaultSelector()
+    for sock in pending:
+        selector.register(sock, selectors.EVENT_READ)
+    deadline = time.time() + timeout
+    while pending and time.time() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            chunk = key.fileobj.recv(65536)
+            received[key.fileobj] += chunk
+            if not chunk or until(received[key.fileobj]):
+                pending.discard(key.fileobj)
+                selector.unregister(key.fileobj)
+    selector.close()
+    assert not pending, f'{len(pending)} streams timed out'
+    return received
+
+
+def scrape_gauge(base_url, name):
+    for line in urllib.request.urlopen(base_url + '/metrics', timeout=10).read().decode().splitlines():
+        if line.startswith(name + ' '):
+            return float(line.split()[1])
+    raise KeyError(name)
+
+
+def bench_stream(clients=1500, events=20):
+    # Connection load test for /animals/stream on a single gthread worker:
+    # hold `clients` idle streams (the configured ceiling), show the next one
+    # is refused with 503 while ordinary requests still get through, then
+    # publish and time the fan-out.
+    with app.app_context():
+        reset_db()
+        seed_animals(100)
+    server, base_url = start_gunicorn(1, env={
+        'STREAM_MAX_CLIENTS': str(clients), 'GUNICORN_THREADS': str(clients + 64),
+        'STREAM_HEARTBEAT': '5', 'CACHE_MAXSIZE': '0', 'JOB_WORKERS': '0', 'METRICS_ENABLED': '1'})
+    port = int(base_url.rsplit(':', 1)[1])
+    socks = []
+    try:
+        start = time.perf_counter()
+        for i in range(clients):
+            socks.append(open_stream(port, '/animals/stream?type=goat' if i % 2 else '/animals/stream'))
+        read_streams(socks, lambda data: b'retry:' in data)
+        connect_elapsed = time.perf_counter() - start
+        pss, private = worker_memory(server.pid)[0]
+        print(f"{clients} idle streams open in {connect_elapsed:.1f}s; worker Pss {pss:.0f} MB "
+              f"({pss * 1024 / clients:.0f} KB per stream)")
+
+        extra = urllib.request.Request(base_url + '/animals/stream')
+        try:
+            urllib.request.urlopen(extra, timeout=10)
+            raise AssertionError('stream above the ceiling was accepted')
+        except urllib.error.HTTPError as e:
+            assert e.code == 503 and e.headers['Retry-After'], e.code
+        samples = []
+        for _ in range(50):
+            begin = time.perf_counter()
+            urllib.request.urlopen(base_url + '/animals?limit=50', timeout=10).read()
+            samples.append(time.perf_counter() - begin)
+        print(f"stream {clients + 1} refused with 503; GET /animals p50 {percentile(samples, 50) * 1000:.1f} ms "
+              f"with {clients} streams open")
+
+        def post(animal_type):
+            body = json.dumps({'type': animal_type, 'breed': 'stream', 'price': 10.0,
+                               'description': 'stream bench', 'farmer_id': 1}).encode()
+            urllib.request.urlopen(urllib.request.Request(
+                base_url + '/farmer/animals', data=body, method='POST',
+                headers={'Content-Type': 'application/json'}), timeout=30).read()
+
+        start = time.perf_counter()
+        for i in range(events):
+            post('goat' if i % 2 else 'cow')
+        received = read_streams(socks, lambda data: data.count(b'event: created') >= events // 2)
+        fanout = time.perf_counter() - start
+        counts = [data.count(b'event: created') for data in received.values()]
+        assert all(count == events // 2 for count in counts[1::2]), 'goat filter leaked or lost events'
+        assert all(count >= events // 2 for count in counts[::2])
+        print(f"{events} animals posted and delivered to all matching streams in {fanout * 1000:.0f} ms "
+              f"({sum(counts)} events sent)")
+
+        # A client that reconnects with Last-Event-ID gets exactly what it missed.
+        # Its old slot is freed when the next heartbeat fails to write.
+        ids = [int(line[4:]) for line in received[socks[0]].decode().splitlines() if line.startswith('id: ')]
+        socks.pop(0).close()
+        start = time.perf_counter()
+        while scrape_gauge(base_url, 'farmart_stream_clients') >= clients:
+            time.sleep(0.1)
+        print(f'closed stream released after {time.perf_counter() - start:.1f}s (heartbeat 5s)')
+        resumed = open_stream(port, '/animals/stream', [('Last-Event-ID', ids[events // 2 - 1])])
+        data = read_streams([resumed], lambda data: data.count(b'event: created') >= events - events // 2)[resumed]
+        assert data.count(b'event: created') == events - events // 2 and b'event: reset' not in data
+        resumed.close()
+        print(f'a stream resumed from Last-Event-ID replayed the {events - events // 2} events it missed')
+        print({name: scrape_gauge(base_url, f'farmart_stream_{name}') for name in ('clients', 'published', 'delivered', 'dropped', 'rejected')})
+    finally:
+        for sock in socks:
+            sock.close()
+        server.terminate()
+        server.wait()
+
+    # A subscriber that stops reading is dropped once its queue fills; the
+    # publisher never blocks on it and other subscribers are unaffected.
+    broker = EventBroker()
+    broker.configure(queue_size=16, buffer_size=100)
+    slow, fast = broker.subscribe({}), broker.subscribe({})
+    for i in range(17):
+        broker.publish('created', {'id': i, 'type': 'goat', 'price': 1.0})
+        assert fast.get(0) is not None
+    assert slow.dropped and broker.stats()['dropped'] == 1 and not fast.dropped
+    stream = broker.stream(slow)
+    assert list(stream)[0].startswith(b'retry:')
+    resumed = broker.subscribe({}, last_event_id=broker.buffer[9].id)
+    assert len(resumed.backlog) == 7
+    stale = broker.subscribe({}, last_event_id=broker.buffer[0].id - 50)
+    assert stale.backlog[0].startswith(b'event: reset')
+    print('a subscriber that stops reading is dropped after 16 queued events; the ring buffer replays on resume')
+
+    # Two workers sharing an event log deliver the same events under the same ids.
+    path = os.path.join(tempfile.gettempdir(), 'farmart_events.db')
+    if os.path.exists(path):
+        os.remove(path)
+    workers = [EventBroker() for _ in range(2)]
+    for worker in workers:
+        worker.configure(log=SQLiteEventLog(path), poll_interval=0.05)
+    subscribers = [worker.subscribe({}) for worker in workers]
+    workers[0].publish('created', {'id': 1, 'type': 'goat', 'price': 1.0})
+    messages = [subscriber.get(5) for subscriber in subscribers]
+    assert messages[0] is not None and messages[0].message == messages[1].message
+    print(f'an event published on one worker reached the other via {os.path.basename(path)} with the same id')
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from werkzeug.datastructures import MultiDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                    self.evictions += 1
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def version(self, namespace):
+        return self._versions.get(namespace, 0)
+
+    def bump(self, namespace):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def stats(self):
+        return {'backend': 'lru', 'size': len(self._data), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class RedisCache:
+    # Works with anything speaking the redis-py client API (get/set/incr/delete),
+    # which is also what lets it run against an in-memory fake locally.
+    def __init__(self, client, ttl=60, prefix='farmart:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value, default=str), ex=self.ttl)
+
+    def version(self, namespace):
+        return int(self.client.get(f'{self.prefix}version:{namespace}') or 0)
+
+    def bump(self, namespace):
+        self.client.incr(f'{self.prefix}version:{namespace}')
+
+    def stats(self):
+        # Redis evicts on its own, so evictions are only visible via INFO there.
+        return {'backend': 'redis', 'hits': self.hits, 'misses': self.misses, 'evictions': None}
+
+
+class QueryCache:
+    # Entries are keyed by namespace, the namespace's write version and the
+    # query parameters. Writers bump the version, so every cached variant of a
+    # listing goes stale at once without enumerating keys.
+    def __init__(self, backend=None):
+        self.backend = backend or LRUCache()
+
+    def init_app(self, app):
+        url = app.config.get('CACHE_URL')
+        ttl = app.config.get('CACHE_TTL', 60)
+        if url:
+            if redis is None:
+                raise RuntimeError('CACHE_URL is set but the redis package is not installed')
+            self.backend = RedisCache(redis.Redis.from_url(url), ttl=ttl)
+        else:
+            self.backend = LRUCache(maxsize=app.config.get('CACHE_MAXSIZE', 1024), ttl=ttl)
+
+    def key(self, namespace, params=(), version=None):
+        items = params.items(multi=True) if isinstance(params, MultiDict) else dict(params).items()
+        query = '&'.join(f'{k}={v}' for k, v in sorted(items))
+        version = self.backend.version(namespace) if version is None else f'{self.backend.version(namespace)}.{version}'
+        return f'{namespace}:{version}:{query}'
+
+    def get_or_set(self, namespace, params, loader, version=None):
+        # An external version (e.g. the table's row in table_versions) makes
+        # entries go stale on writes made by other processes too.
+        key = self.key(namespace, params, version)
+        value = self.backend.get(key)
+        if value is MISSING:
+            value = loader()
+            self.backend.set(key, value)
+        return value
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            self.backend.bump(namespace)
+
+    def stats(self):
+        return self.backend.stats()
+
+
+cache = QueryCache()
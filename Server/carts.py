@@ -0,0 +1,127 @@
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import joinedload
+
+from models import db, Animal, Cart, CartItem
+
+PENDING_CART = text("status = 'Pending'")
+
+# Cart, its lines and the few animal columns the view shows, in one SELECT.
+CART_VIEW_OPTIONS = (
+    joinedload(Cart.items)
+    .joinedload(CartItem.animal)
+    .load_only(Animal.id, Animal.type, Animal.breed, Animal.status, Animal.image_url),
+)
+
+DIALECT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+class CheckoutError(Exception):
+    def __init__(self, message, status=409, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def upsert(table):
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in DIALECT_INSERTS:
+        raise NotImplementedError(f'Upserts are not supported on {dialect}')
+    return DIALECT_INSERTS[dialect](table)
+
+
+def add_item(user_id, animal_id, quantity):
+    # Two statements, one transaction, no read-modify-write in Python:
+    #   1. upsert the user's pending cart, adding price * quantity to its total
+    #      (the unique partial index makes concurrent first adds converge on
+    #      one cart);
+    #   2. insert-select the line from animals, or bump its quantity.
+    # If the animal does not exist statement 2 inserts nothing and the caller
+    # rolls back, so statement 1 never commits a bogus total.
+    line_total = select(Animal.price * quantity).where(Animal.id == animal_id).scalar_subquery()
+    cart_insert = upsert(Cart.__table__).values(user_id=user_id, total_price=line_total, status='Pending')
+    cart_id = db.session.execute(
+        cart_insert.on_conflict_do_update(
+            index_elements=[Cart.user_id],
+            index_where=PENDING_CART,
+            set_={'total_price': Cart.total_price + cart_insert.excluded.total_price},
+        ).returning(Cart.id)
+    ).scalar_one()
+
+    item_insert = upsert(CartItem.__table__).from_select(
+        ['cart_id', 'animal_id', 'quantity', 'unit_price'],
+        select(db.literal(cart_id), Animal.id, db.literal(quantity), Animal.price).where(Animal.id == animal_id),
+    )
+    result = db.session.execute(
+        item_insert.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.animal_id],
+            set_={'quantity': CartItem.quantity + item_insert.excluded.quantity},
+        )
+    )
+    return result.rowcount > 0
+
+
+def lock_for_write():
+    # SQLite has no row locks, so BEGIN IMMEDIATE takes the database write lock
+    # before anything is read; a concurrent checkout waits (busy_timeout)
+    # instead of reading the same 'Available' rows. Must run before the
+    # session's first statement. Postgres uses FOR UPDATE on the rows instead.
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return
+    connection = db.session.connection()
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def checkout(user_id):
+    # One transaction, a fixed number of statements whatever the cart size:
+    # lock the cart and its animals, validate every line in Python, then
+    # re-price, sell and confirm with set-based UPDATEs. Returns None when the
+    # user has no pending cart; raises CheckoutError when it cannot be sold.
+    lock_for_write()
+    cart_id = db.session.execute(
+        select(Cart.id).where(Cart.user_id == user_id, Cart.status == 'Pending').with_for_update()
+    ).scalar()
+    if cart_id is None:
+        return None
+
+    # Locked in id order so two overlapping checkouts cannot deadlock.
+    lines = db.session.execute(
+        select(CartItem.animal_id, CartItem.quantity, CartItem.unit_price, Animal.price, Animal.status)
+        .join(Animal, Animal.id == CartItem.animal_id)
+        .where(CartItem.cart_id == cart_id)
+        .order_by(Animal.id)
+        .with_for_update(of=Animal)
+    ).all()
+    if not lines:
+        raise CheckoutError('Cart is empty', status=400)
+    unavailable = [line.animal_id for line in lines if line.status != 'Available']
+    if unavailable:
+        raise CheckoutError('Some animals are no longer available', unavailable=unavailable)
+
+    repriced = [line.animal_id for line in lines if line.unit_price != line.price]
+    if repriced:
+        db.session.execute(
+            update(CartItem).where(CartItem.cart_id == cart_id)
+            .values(unit_price=select(Animal.price).where(Animal.id == CartItem.animal_id).scalar_subquery())
+            .execution_options(synchronize_session=False)
+        )
+    animal_ids = [line.animal_id for line in lines]
+    sold = db.session.execute(
+        update(Animal).where(Animal.id.in_(animal_ids), Animal.status == 'Available')
+        .values(status='Sold Out')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if sold != len(animal_ids):
+        # Only reachable if something bypassed the lock; never sell twice.
+        raise CheckoutError('Some animals are no longer available')
+    total = sum(line.quantity * line.price for line in lines)
+    db.session.execute(
+        update(Cart).where(Cart.id == cart_id)
+        .values(status='Confirmed', order_date=func.now(), total_price=total)
+        .execution_options(synchronize_session=False)
+    )
+    return {'cart_id': cart_id, 'total_price': total, 'animal_ids': animal_ids, 'repriced': repriced}
@@ -0,0 +1,99 @@
+import gzip
+
+from flask import current_app, request
+
+from cache import LRUCache, MISSING, cache
+from metrics import timed
+from serializers import dumps
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript'}
+DEFAULT_MIN_SIZE = 1024
+# Every cache miss compresses on the request thread, and any catalog write
+# invalidates the cached bodies, so cached entries use the same cheap levels:
+# brotli 11 costs ~250x the CPU of brotli 5 for ~17% fewer bytes.
+LEVELS = {'gzip': 6, 'br': 5}
+
+
+def negotiate():
+    if not current_app.config.get('COMPRESS_ENABLED', True):
+        return None
+    offers = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offers)
+
+
+def compress(body, encoding, level):
+    with timed('compress'):
+        if encoding == 'br':
+            return brotli.compress(body, quality=level)
+        return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def compress_response(response):
+    # after_request hook for everything that did not come out of PayloadCache.
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate()
+    body = response.get_data()
+    if encoding is None or len(body) < current_app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE):
+        return response
+    response.set_data(compress(body, encoding, LEVELS[encoding]))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class PayloadCache:
+    # Finished response bodies, already serialized and compressed, keyed like
+    # QueryCache entries (namespace, write version, query parameters) plus the
+    # negotiated encoding. A repeated catalog request is a dict lookup: no
+    # query, no JSON encoding, no compression. Bytes stay in process memory
+    # even when QueryCache uses Redis, whose values must be JSON.
+    def __init__(self):
+        self.backend = LRUCache(maxsize=0)
+
+    def init_app(self, app):
+        maxsize = app.config.get('PAYLOAD_CACHE_MAXSIZE')
+        self.backend = LRUCache(
+            maxsize=app.config.get('CACHE_MAXSIZE', 1024) if maxsize is None else maxsize,
+            ttl=app.config.get('CACHE_TTL', 60),
+        )
+
+    def response(self, namespace, params, version, load):
+        # load() returns (payload, headers), or None for a miss such as a 404,
+        # in which case this returns None too and nothing is stored.
+        encoding = negotiate()
+        key = f"{cache.key(namespace, params, version)}|{encoding or 'identity'}"
+        caching = self.backend.maxsize > 0
+        entry = self.backend.get(key) if caching else MISSING
+        if entry is MISSING:
+            loaded = load()
+            if loaded is None:
+                return None
+            payload, headers = loaded
+            with timed('serialize'):
+                body = dumps(payload)
+            if encoding is None or len(body) < current_app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE):
+                encoding = None
+            else:
+                body = compress(body, encoding, LEVELS[encoding])
+            entry = (body, encoding, headers)
+            if caching:
+                self.backend.set(key, entry)
+        body, encoding, headers = entry
+        response = current_app.response_class(body, mimetype='application/json', headers=headers)
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    def stats(self):
+        return self.backend.stats()
+
+
+payloads = PayloadCache()
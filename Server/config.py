@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+import warnings
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Per-dialect defaults; every key can be overridden from the environment.
+PRESETS = {
+    'postgresql': {
+        'DB_POOL_SIZE': 10,
+        'DB_MAX_OVERFLOW': 20,
+        'DB_POOL_TIMEOUT': 30,
+        'DB_POOL_RECYCLE': 1800,
+        'DB_POOL_PRE_PING': True,
+        'DB_STATEMENT_TIMEOUT_MS': 15000,
+    },
+    'sqlite': {
+        'DB_POOL_SIZE': 5,
+        'DB_MAX_OVERFLOW': 10,
+        'DB_POOL_TIMEOUT': 30,
+        'DB_POOL_RECYCLE': -1,
+        'DB_POOL_PRE_PING': False,
+        'SQLITE_JOURNAL_MODE': 'WAL',
+        'SQLITE_SYNCHRONOUS': 'NORMAL',
+        'SQLITE_BUSY_TIMEOUT_MS': 5000,
+        'SQLITE_MMAP_SIZE': 268435456,
+    },
+}
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+
+def env_setting(name, default, env=None):
+    env = os.environ if env is None else env
+    if name not in env:
+        return default
+    value = env[name]
+    if isinstance(default, bool):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    if default is None or isinstance(default, int):
+        return int(value)
+    return value
+
+
+def database_settings(uri, env=None):
+    dialect = make_url(uri).get_backend_name()
+    preset = PRESETS.get(dialect, PRESETS['postgresql'])
+    return dialect, {name: env_setting(name, default, env) for name, default in preset.items()}
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool that records how long callers wait for a connection, which is
+    # the number that shows pool exhaustion before it turns into timeouts.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats_lock = threading.Lock()
+        self.checkouts = self.timeouts = 0
+        self.wait_total = self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self.stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self.stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def stats(self):
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            'overflow': max(0, self.overflow()),
+            'max_overflow': self._max_overflow,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_avg_ms': self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+            'wait_max_ms': self.wait_max * 1000,
+        }
+
+
+def engine_options(uri, env=None):
+    dialect, settings = database_settings(uri, env)
+    url = make_url(uri)
+    if dialect == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory SQLite needs its single-connection pool.
+        return {}
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': settings['DB_POOL_SIZE'],
+        'max_overflow': settings['DB_MAX_OVERFLOW'],
+        'pool_timeout': settings['DB_POOL_TIMEOUT'],
+        'pool_recycle': settings['DB_POOL_RECYCLE'],
+        'pool_pre_ping': settings['DB_POOL_PRE_PING'],
+    }
+    if dialect == 'postgresql':
+        options['connect_args'] = {'options': f"-c statement_timeout={settings['DB_STATEMENT_TIMEOUT_MS']}"}
+    elif dialect == 'sqlite':
+        options['connect_args'] = {'timeout': settings['SQLITE_BUSY_TIMEOUT_MS'] / 1000}
+    return options
+
+
+def sqlite_pragmas(uri, env=None):
+    dialect, settings = database_settings(uri, env)
+    if dialect != 'sqlite':
+        return {}
+    return {
+        'journal_mode': settings['SQLITE_JOURNAL_MODE'],
+        'synchronous': settings['SQLITE_SYNCHRONOUS'],
+        'busy_timeout': settings['SQLITE_BUSY_TIMEOUT_MS'],
+        'mmap_size': settings['SQLITE_MMAP_SIZE'],
+    }
+
+
+def install_sqlite_pragmas(engine, pragmas):
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    if isinstance(pool, TimedQueuePool):
+        return pool.stats()
+    return {'pool': type(pool).__name__, 'status': pool.status()}
+
+
+def load_config(env=None):
+    env = os.environ if env is None else env
+    secret_key = env.get('SECRET_KEY')
+    if not secret_key:
+        # Only stable across workers when the app is preloaded before forking.
+        warnings.warn('SECRET_KEY is not set; using a random per-process key')
+        secret_key = os.urandom(32).hex()
+    return {
+        'SQLALCHEMY_DATABASE_URI': env.get('DB_URI', f"sqlite:///{os.path.join(BASE_DIR, 'app.db')}"),
+        'DB_REPLICA_URI': env.get('DB_REPLICA_URI'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SECRET_KEY': secret_key,
+        'JWT_SECRET_KEY': env.get('JWT_SECRET_KEY', secret_key),
+        'JWT_TOKEN_CACHE_SIZE': env_setting('JWT_TOKEN_CACHE_SIZE', 1024, env),
+        'SERVER_WORKERS': env_setting('GUNICORN_WORKERS', 1, env),
+        'BCRYPT_LOG_ROUNDS': env_setting('BCRYPT_LOG_ROUNDS', 12, env),
+        'AUTH_RATE_LIMIT_ENABLED': env_setting('AUTH_RATE_LIMIT_ENABLED', True, env),
+        'RATE_LIMIT_URL': env.get('RATE_LIMIT_URL'),
+        # A burst of 0 turns that bucket off; a rate of 0 never refills it, so
+        # each client gets the burst once per process (or per idle hour when shared).
+        'AUTH_IP_BURST': env_setting('AUTH_IP_BURST', 20, env),
+        'AUTH_IP_PER_MINUTE': env_setting('AUTH_IP_PER_MINUTE', 10, env),
+        'AUTH_USER_BURST': env_setting('AUTH_USER_BURST', 5, env),
+        'AUTH_USER_PER_MINUTE': env_setting('AUTH_USER_PER_MINUTE', 2, env),
+        # Defaults to the cores divided by SERVER_WORKERS, which gunicorn.conf.py
+        # sets from its own worker count.
+        'PASSWORD_POOL_WORKERS': env_setting('PASSWORD_POOL_WORKERS', None, env),
+        'PASSWORD_POOL_MAX_PENDING': env_setting('PASSWORD_POOL_MAX_PENDING', None, env),
+        'CACHE_URL': env.get('CACHE_URL'),
+        'CACHE_TTL': env_setting('CACHE_TTL', 60, env),
+        'CACHE_MAXSIZE': env_setting('CACHE_MAXSIZE', 1024, env),
+        'CATALOG_MAX_AGE': env_setting('CATALOG_MAX_AGE', 0, env),
+        # Defaults to CACHE_MAXSIZE.
+        'PAYLOAD_CACHE_MAXSIZE': env_setting('PAYLOAD_CACHE_MAXSIZE', None, env),
+        'COMPRESS_ENABLED': env_setting('COMPRESS_ENABLED', True, env),
+        'COMPRESS_MIN_SIZE': env_setting('COMPRESS_MIN_SIZE', 1024, env),
+        'BULK_INSERT_BATCH_SIZE': env_setting('BULK_INSERT_BATCH_SIZE', 1000, env),
+        'IMAGE_DIR': env.get('IMAGE_DIR', os.path.join(BASE_DIR, 'media')),
+        'IMAGE_MAX_BYTES': env_setting('IMAGE_MAX_BYTES', 5 * 1024 * 1024, env),
+        'IMAGE_MAX_PIXELS': env_setting('IMAGE_MAX_PIXELS', 40_000_000, env),
+        'IMAGE_MAX_AGE': env_setting('IMAGE_MAX_AGE', 31536000, env),
+        'STREAM_BUFFER_SIZE': env_setting('STREAM_BUFFER_SIZE', 1000, env),
+        'STREAM_QUEUE_SIZE': env_setting('STREAM_QUEUE_SIZE', 64, env),
+        # Keep below GUNICORN_THREADS so streams never take every worker thread.
+        'STREAM_MAX_CLIENTS': env_setting('STREAM_MAX_CLIENTS', 1792, env),
+        'STREAM_HEARTBEAT': env_setting('STREAM_HEARTBEAT', 15, env),
+        'STREAM_EVENTS_URL': env.get('STREAM_EVENTS_URL'),
+        # Seconds a stored Idempotency-Key response is replayed for.
+        'IDEMPOTENCY_TTL': env_setting('IDEMPOTENCY_TTL', 86400, env),
+        'JOB_WORKERS': env_setting('JOB_WORKERS', 2, env),
+        'JOB_QUEUE_URL': env.get('JOB_QUEUE_URL'),
+        'JOB_MAX_ATTEMPTS': env_setting('JOB_MAX_ATTEMPTS', 5, env),
+        'JOB_RETRY_DELAY': float(env.get('JOB_RETRY_DELAY', 1.0)),
+        # Seconds between sweeps for confirmed carts whose sales job was lost; 0 disables.
+        'SALES_SWEEP_INTERVAL': env_setting('SALES_SWEEP_INTERVAL', 300, env),
+        'METRICS_ENABLED': env_setting('METRICS_ENABLED', False, env),
+        'PROFILE_SAMPLE_RATE': float(env.get('PROFILE_SAMPLE_RATE', 0)),
+        'PROFILE_SLOW_MS': env_setting('PROFILE_SLOW_MS', 500, env),
+        'PROFILE_DIR': env.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles')),
+        # Flask-Migrate (and Alembic behind it) is only imported for `flask db`.
+        'ENABLE_MIGRATE': env.get('FLASK_RUN_FROM_CLI') == 'true',
+    }
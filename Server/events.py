@@ -0,0 +1,295 @@
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from sqlalchemy.engine import make_url
+
+from models import Animal
+from serializers import ANIMAL_FIELDS, encode_line
+
+logger = logging.getLogger(__name__)
+
+RESET = b'event: reset\ndata: {}\n\n'
+KEEPALIVE = b': keepalive\n\n'
+
+
+class StreamFull(Exception):
+    pass
+
+
+class Event:
+    __slots__ = ('id', 'kind', 'data', 'message')
+
+    def __init__(self, id, kind, data):
+        self.id = id
+        self.kind = kind
+        self.data = data
+        # Encoded once and shared by every subscriber it is sent to.
+        self.message = f'id: {id}\nevent: {kind}\ndata: '.encode('utf-8') + encode_line(data) + b'\n'
+
+
+def parse_filters(args):
+    filters = {}
+    if args.get('category_id'):
+        filters['category_id'] = int(args['category_id'])
+    if args.get('type'):
+        filters['type'] = args['type']
+    if args.get('max_price'):
+        filters['max_price'] = float(args['max_price'])
+    return filters
+
+
+class Subscriber:
+    # One open stream. The queue is bounded: a client that cannot keep up is
+    # dropped by the publisher instead of making it wait or buffer forever.
+    def __init__(self, filters, maxsize):
+        self.filters = filters
+        self.maxsize = maxsize
+        self.backlog = []
+        self.dropped = False
+        self._queue = deque()
+        self._ready = threading.Condition()
+
+    def matches(self, data):
+        filters = self.filters
+        if 'category_id' in filters and data.get('category_id') != filters['category_id']:
+            return False
+        if 'type' in filters and data.get('type') != filters['type']:
+            return False
+        if 'max_price' in filters and (data.get('price') is None or data['price'] > filters['max_price']):
+            return False
+        return True
+
+    def offer(self, event):
+        with self._ready:
+            if len(self._queue) >= self.maxsize:
+                return False
+            self._queue.append(event)
+            self._ready.notify()
+        return True
+
+    def drop(self):
+        with self._ready:
+            self.dropped = True
+            self._ready.notify()
+
+    def get(self, timeout):
+        with self._ready:
+            if not self._queue and not self.dropped:
+                self._ready.wait(timeout)
+            return self._queue.popleft() if self._queue else None
+
+
+class SQLiteEventLog:
+    # Shared by every worker process using the file: each one tails it and fans
+    # events out to its own subscribers, so event ids are global and a client
+    # can resume on whichever worker it reconnects to.
+    SCHEMA = 'CREATE TABLE IF NOT EXISTS stream_events (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, data TEXT NOT NULL)'
+
+    def __init__(self, path, keep=10000):
+        self.path = path
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def connection(self):
+        # Opened lazily and per process: a sqlite3 handle must not cross a fork.
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode = WAL')
+            self._connection.execute(self.SCHEMA)
+            self._pid = os.getpid()
+        return self._connection
+
+    def append(self, kind, data):
+        with self._lock:
+            connection = self.connection()
+            id = connection.execute('INSERT INTO stream_events (kind, data) VALUES (?, ?)',
+                                    (kind, json.dumps(data, default=str))).lastrowid
+            if id % 1000 == 0:
+                connection.execute('DELETE FROM stream_events WHERE id <= ?', (id - self.keep,))
+
+    def since(self, last_id, limit=1000):
+        with self._lock:
+            rows = self.connection().execute(
+                'SELECT id, kind, data FROM stream_events WHERE id > ? ORDER BY id LIMIT ?', (last_id, limit)).fetchall()
+        return [(id, kind, json.loads(data)) for id, kind, data in rows]
+
+    def tail(self, count):
+        with self._lock:
+            last = self.connection().execute('SELECT coalesce(max(id), 0) FROM stream_events').fetchone()[0]
+        return self.since(max(0, last - count), count)
+
+
+def make_log(url):
+    if not url:
+        return None
+    parsed = make_url(url)
+    if parsed.get_backend_name() != 'sqlite' or not parsed.database:
+        raise ValueError(f'Unsupported event log URL: {url}')
+    return SQLiteEventLog(parsed.database)
+
+
+class EventBroker:
+    # In-process pub/sub for catalog changes. Recent events stay in a ring
+    # buffer so a reconnecting client can resume from Last-Event-ID; one whose
+    # id has already left the buffer gets a reset event and should refetch.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.configure()
+
+    def configure(self, buffer_size=1000, queue_size=64, max_clients=1792, heartbeat=15.0, log=None, poll_interval=0.25):
+        self.buffer = deque(maxlen=buffer_size)
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self.heartbeat = heartbeat
+        self.log = log
+        self.poll_interval = poll_interval
+        self.subscribers = set()
+        # Memory ids start from the clock, so ids from before a restart are
+        # always older than new ones rather than colliding with them.
+        self._ids = itertools.count(int(time.time() * 1000))
+        self._cursor = 0
+        self._relay = None
+        self._relay_pid = None
+        self.published = self.delivered = self.dropped = self.rejected = 0
+
+    def init_app(self, app):
+        self.configure(
+            buffer_size=app.config.get('STREAM_BUFFER_SIZE', 1000),
+            queue_size=app.config.get('STREAM_QUEUE_SIZE', 64),
+            max_clients=app.config.get('STREAM_MAX_CLIENTS', 1792),
+            heartbeat=app.config.get('STREAM_HEARTBEAT', 15),
+            log=make_log(app.config.get('STREAM_EVENTS_URL')),
+        )
+
+    def publish(self, kind, data):
+        if self.log is not None:
+            self.log.append(kind, data)
+            self.start()
+            return
+        self.dispatch(kind, data)
+
+    def dispatch(self, kind, data, id=None):
+        with self._lock:
+            # Numbered under the lock so the buffer stays in id order.
+            event = Event(next(self._ids) if id is None else id, kind, data)
+            self.buffer.append(event)
+            self.published += 1
+            subscribers = list(self.subscribers)
+        delivered = 0
+        for subscriber in subscribers:
+            if not subscriber.matches(event.data):
+                continue
+            if subscriber.offer(event):
+                delivered += 1
+            else:
+                self.unsubscribe(subscriber, dropped=True)
+        with self._lock:
+            self.delivered += delivered
+
+    def subscribe(self, filters, last_event_id=None):
+        self.start()
+        subscriber = Subscriber(filters, self.queue_size)
+        with self._lock:
+            if len(self.subscribers) >= self.max_clients:
+                self.rejected += 1
+                raise StreamFull('Too many open streams')
+            if last_event_id is not None and self.buffer:
+                # An id newer than anything buffered is only expected from a
+                # shared log whose relay here is a poll behind.
+                if last_event_id < self.buffer[0].id - 1 or (self.log is None and last_event_id > self.buffer[-1].id):
+                    subscriber.backlog.append(RESET)
+                subscriber.backlog.extend(event.message for event in self.buffer
+                                          if event.id > last_event_id and subscriber.matches(event.data))
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber, dropped=False):
+        with self._lock:
+            if subscriber not in self.subscribers:
+                return
+            self.subscribers.discard(subscriber)
+            if dropped:
+                self.dropped += 1
+        if dropped:
+            subscriber.drop()
+
+    def start(self):
+        # The relay thread is only needed with a shared log and, like the job
+        # workers, is started on first use in each process.
+        if self.log is None:
+            return
+        with self._lock:
+            if self._relay_pid == os.getpid():
+                return
+            self._relay_pid = os.getpid()
+            self.buffer.clear()
+            self._cursor = 0
+            for id, kind, data in self.log.tail(self.buffer.maxlen):
+                self.buffer.append(Event(id, kind, data))
+                self._cursor = id
+            self._relay = threading.Thread(target=self.relay, name='event-relay', daemon=True)
+            self._relay.start()
+
+    def relay(self):
+        log = self.log
+        while self.log is log:
+            try:
+                for id, kind, data in log.since(self._cursor):
+                    self._cursor = id
+                    self.dispatch(kind, data, id)
+            except Exception:
+                logger.exception('Event relay failed')
+            time.sleep(self.poll_interval)
+
+    def stream(self, subscriber):
+        # Runs outside the request context: an idle stream holds no app
+        # context, session or database connection, only its thread or greenlet.
+        try:
+            yield b'retry: 3000\n\n'
+            for message in subscriber.backlog:
+                yield message
+            subscriber.backlog = []
+            while True:
+                event = subscriber.get(self.heartbeat)
+                if event is not None:
+                    yield event.message
+                elif subscriber.dropped:
+                    # The client reconnects with Last-Event-ID and catches up
+                    # from the ring buffer, if it is still there.
+                    return
+                else:
+                    yield KEEPALIVE
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': len(self.subscribers),
+                'max_clients': self.max_clients,
+                'buffered': len(self.buffer),
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+            }
+
+
+broker = EventBroker()
+
+
+def publish_animals(kind, animal_ids):
+    # Called after the write commits, so subscribers never see a rolled-back change.
+    if not animal_ids:
+        return
+    rows = ANIMAL_FIELDS.query().filter(Animal.id.in_(animal_ids)).order_by(Animal.id).all()
+    for row in ANIMAL_FIELDS.rows(rows):
+        broker.publish(kind, row)
@@ -0,0 +1,36 @@
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'app:create_app()'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Read back by the app (SERVER_WORKERS) to size its per-worker bcrypt pool.
+os.environ['GUNICORN_WORKERS'] = str(workers)
+# Import and build the app once in the master; workers fork from it and share
+# its pages copy-on-write instead of each paying the import cost.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+# Every open /animals/stream connection holds one worker thread for as long as
+# it stays open, so workers get far more threads than CPUs; the pool only
+# creates them as connections arrive. With gevent installed,
+# GUNICORN_WORKER_CLASS=gevent holds them as greenlets instead.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 2048))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 5000))
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the GC's reach, so collections in
+    # the workers do not touch (and un-share) the master's objects.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # The master may have opened database connections while preloading; they
+    # must not be shared with the workers, so drop them without closing. That
+    # includes the read replica engines as well as the primary.
+    from models import db
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from flask import current_app, g, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from jobs import jobs
+from models import db, IdempotencyKey
+from versions import utcnow
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL = 86400
+# Responses are recorded in the same transaction as the change they describe,
+# so a key still in progress after this long belongs to a request that died
+# without committing anything, and a retry may take it over.
+ABANDONED_AFTER = 60
+PRUNE_INTERVAL = 300
+
+_last_prune = 0.0
+
+
+class ClaimLost(Exception):
+    # The key was taken over while this request was still running; its change
+    # must not commit.
+    pass
+
+
+def fingerprint():
+    # JSON bodies are compared by content, so key order and whitespace in a
+    # retried request do not count as a different request.
+    body = request.get_json(silent=True)
+    payload = json.dumps(body, sort_keys=True, separators=(',', ':')).encode('utf-8') if body is not None else request.get_data()
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode('utf-8'))
+    digest.update(payload)
+    return digest.hexdigest()
+
+
+def error(message, status, retry_after=None):
+    response = jsonify({'message': message})
+    if retry_after:
+        response.headers['Retry-After'] = str(retry_after)
+    return response, status
+
+
+def in_progress():
+    return error(f'A request with this {HEADER} is still in progress', 409, retry_after=1)
+
+
+def replay(record):
+    response = current_app.response_class(record.body, status=record.status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def owned(claim):
+    return (IdempotencyKey.user_id == claim['user_id'], IdempotencyKey.key == claim['key'],
+            IdempotencyKey.created_at == claim['claimed_at'])
+
+
+def claim_key(user_id, key, digest):
+    # Returns (claim, None) when this request now owns the key and should run,
+    # or (None, response) with the response to send instead. Only
+    # idempotency_keys is read or written here.
+    ttl = timedelta(seconds=current_app.config.get('IDEMPOTENCY_TTL', DEFAULT_TTL))
+    for _ in range(3):
+        now = utcnow()
+        claim = {'user_id': user_id, 'key': key, 'claimed_at': now, 'recorded': False}
+        record = db.session.get(IdempotencyKey, (user_id, key))
+        if record is None:
+            db.session.add(IdempotencyKey(user_id=user_id, key=key, fingerprint=digest, created_at=now))
+            try:
+                db.session.commit()
+                return claim, None
+            except IntegrityError:
+                # A concurrent duplicate claimed it first; look again.
+                db.session.rollback()
+                continue
+        expired = record.created_at < now - ttl
+        abandoned = record.status_code is None and record.created_at < now - timedelta(seconds=ABANDONED_AFTER)
+        if expired or abandoned:
+            taken = db.session.execute(
+                update(IdempotencyKey)
+                .where(*owned({**claim, 'claimed_at': record.created_at}))
+                .values(fingerprint=digest, status_code=None, body=None, created_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if taken:
+                return claim, None
+            continue
+        if record.fingerprint != digest:
+            return None, error(f'{HEADER} was already used for a different request', 422)
+        if record.status_code is None:
+            return None, in_progress()
+        return None, replay(record)
+    return None, in_progress()
+
+
+def save(claim, response):
+    # Stores the response on the caller's transaction, only while the key is
+    # still this request's and still in progress.
+    return db.session.execute(
+        update(IdempotencyKey).where(*owned(claim), IdempotencyKey.status_code.is_(None))
+        .values(status_code=response.status_code, body=response.get_data(as_text=True))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def record_response(*response):
+    # Idempotent views that change anything call this with their response
+    # before committing, so the change and the stored response commit
+    # together: a retry either replays the response or finds that nothing
+    # happened. Without an Idempotency-Key it only builds the response.
+    response = make_response(*response)
+    claim = g.get('idempotency')
+    if claim is not None:
+        if not save(claim, response):
+            raise ClaimLost()
+        claim['recorded'] = True
+    return response
+
+
+def release(claim):
+    # Frees the key for a retry unless a response was committed under it.
+    db.session.rollback()
+    db.session.execute(delete(IdempotencyKey).where(*owned(claim), IdempotencyKey.status_code.is_(None)))
+    db.session.commit()
+
+
+def schedule_prune():
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune > PRUNE_INTERVAL:
+        _last_prune = now
+        jobs.enqueue('prune_idempotency_keys')
+
+
+@jobs.task('prune_idempotency_keys')
+def prune_idempotency_keys():
+    ttl = timedelta(seconds=current_app.config.get('IDEMPOTENCY_TTL', DEFAULT_TTL))
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < utcnow() - ttl))
+    db.session.commit()
+
+
+def idempotent(view):
+    # For routes behind jwt_required. A request carrying an Idempotency-Key
+    # runs at most once per user and key; retries get the stored response
+    # without the cart tables being touched, and a duplicate that arrives
+    # while the first is still running gets a 409 to retry later. Server
+    # errors are not stored, so the client can retry those for real.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return error(f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters', 400)
+        claim, answer = claim_key(get_jwt_identity()['id'], key, fingerprint())
+        if answer is not None:
+            return answer
+        schedule_prune()
+        g.idempotency = claim
+        try:
+            response = make_response(view(*args, **kwargs))
+        except ClaimLost:
+            db.session.rollback()
+            return in_progress()
+        except BaseException:
+            release(claim)
+            raise
+        if claim['recorded']:
+            return response
+        if response.status_code >= 500:
+            release(claim)
+        else:
+            # Nothing was committed (a 404, a 409 from checkout), so storing
+            # the response afterwards cannot lose a change.
+            save(claim, response)
+            db.session.commit()
+        return response
+    return wrapper
@@ -0,0 +1,144 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+
+from flask import current_app
+
+from jobs import jobs
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_URL_PREFIX = '/images/'
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+# A few kilobytes of compressed pixels can declare a huge canvas, so the size
+# in the header is checked before anything is decoded.
+DEFAULT_MAX_PIXELS = 40_000_000
+THUMBNAIL_SIZES = {'sm': 160, 'md': 480}
+MIMETYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+ORIGINAL_NAME = re.compile(r'^([0-9a-f]{64})\.(jpg|png|gif|webp)$')
+THUMBNAIL_NAME = re.compile(r'^([0-9a-f]{64})-(%s)\.jpg$' % '|'.join(THUMBNAIL_SIZES))
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def sniff(data):
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    raise InvalidImage('Unsupported image type; use JPEG, PNG, GIF or WebP')
+
+
+def original_path(root, digest, ext):
+    return os.path.join(root, digest[:2], f'{digest}.{ext}')
+
+
+def thumbnail_path(root, digest, size):
+    return os.path.join(root, 'thumbs', digest[:2], f'{digest}-{size}.jpg')
+
+
+def write_atomic(path, write):
+    # Readers never see a half-written file: write a sibling temp file, then
+    # rename it into place.
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def check_pixels(image, max_pixels):
+    width, height = image.size
+    if width * height > max_pixels:
+        raise InvalidImage('Image dimensions are too large')
+
+
+def store_image(data, root, max_bytes=DEFAULT_MAX_BYTES, max_pixels=DEFAULT_MAX_PIXELS):
+    # Files are named by the SHA-256 of their bytes, so identical uploads are
+    # stored once and a stored file never changes under its URL.
+    if not data:
+        raise InvalidImage('No image uploaded')
+    if len(data) > max_bytes:
+        raise InvalidImage('Image is too large')
+    ext = sniff(data)
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                check_pixels(image, max_pixels)
+                image.verify()
+        except InvalidImage:
+            raise
+        except Image.DecompressionBombError:
+            raise InvalidImage('Image dimensions are too large')
+        except Exception:
+            raise InvalidImage('Image data is corrupt')
+    digest = hashlib.sha256(data).hexdigest()
+    path = original_path(root, digest, ext)
+    if not os.path.exists(path):
+        write_atomic(path, lambda f: f.write(data))
+    return f'{digest}.{ext}'
+
+
+def find_original(root, digest):
+    for ext in MIMETYPES:
+        path = original_path(root, digest, ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def thumbnail_urls(image_url):
+    if not image_url or not image_url.startswith(IMAGE_URL_PREFIX):
+        return None
+    digest = image_url[len(IMAGE_URL_PREFIX):].split('.', 1)[0]
+    return {size: f'{IMAGE_URL_PREFIX}thumbs/{digest}-{size}.jpg' for size in THUMBNAIL_SIZES}
+
+
+def render_thumbnail(source, target, pixels, max_pixels=DEFAULT_MAX_PIXELS):
+    with Image.open(source) as image:
+        check_pixels(image, max_pixels)
+        # For JPEGs draft() lets the decoder downscale by up to 8x for free.
+        image.draft('RGB', (pixels, pixels))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((pixels, pixels))
+        image = image.convert('RGB')
+        write_atomic(target, lambda f: image.save(f, 'JPEG', quality=80, optimize=True))
+
+
+@jobs.task('make_thumbnails')
+def make_thumbnails(name):
+    if Image is None:
+        return
+    root = current_app.config['IMAGE_DIR']
+    max_pixels = current_app.config.get('IMAGE_MAX_PIXELS', DEFAULT_MAX_PIXELS)
+    digest, ext = ORIGINAL_NAME.match(name).groups()
+    source = original_path(root, digest, ext)
+    for size, pixels in THUMBNAIL_SIZES.items():
+        target = thumbnail_path(root, digest, size)
+        if not os.path.exists(target):
+            try:
+                render_thumbnail(source, target, pixels, max_pixels)
+            except (InvalidImage, Image.DecompressionBombError):
+                # Stored before the limit applied; retrying cannot help, and
+                # the thumbnail URL keeps redirecting to the original.
+                logger.warning('Not rendering thumbnails for oversized image %s', name)
+                return
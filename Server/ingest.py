@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from models import db, Animal, Category, check_animal_image_url, check_animal_price, check_animal_status
+
+DEFAULT_BATCH_SIZE = 1000
+REQUIRED_FIELDS = ('type', 'breed', 'price', 'farmer_id')
+TEXT_FIELDS = ('type', 'breed', 'status', 'description', 'image_url')
+
+
+def parse_upload(request):
+    # Accepts a JSON array body, an NDJSON body, or a CSV body / multipart file.
+    # Yields (row_number, dict) pairs; unparseable NDJSON lines come back as
+    # exceptions so they are reported per row like any other bad input.
+    upload = request.files.get('file')
+    if upload is not None:
+        text = upload.read().decode('utf-8-sig')
+        filename = (upload.filename or '').lower()
+        if filename.endswith('.csv'):
+            mimetype = 'text/csv'
+        elif filename.endswith(('.ndjson', '.jsonl')):
+            mimetype = 'application/x-ndjson'
+        else:
+            mimetype = upload.mimetype
+    else:
+        text = request.get_data(as_text=True)
+        mimetype = request.mimetype
+
+    if mimetype == 'text/csv':
+        for number, row in enumerate(csv.DictReader(io.StringIO(text)), start=1):
+            yield number, row
+    elif mimetype == 'application/x-ndjson':
+        for number, line in enumerate(text.splitlines(), start=1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError as e:
+                    yield number, e
+    else:
+        rows = json.loads(text)
+        if not isinstance(rows, list):
+            raise ValueError('Expected a JSON array of animals')
+        for number, row in enumerate(rows, start=1):
+            yield number, row
+
+
+def as_number(value, convert):
+    # bool is an int to Python but never a sensible price or id, and an id
+    # must not be silently truncated from 2.5 to 2.
+    if isinstance(value, bool) or (convert is int and isinstance(value, float) and not value.is_integer()):
+        raise TypeError(value)
+    return convert(value)
+
+
+def check_text(row, field):
+    # Checked here rather than left to the database, which would fail the
+    # whole batch (or, on SQLite, store whatever it is given).
+    value = row.get(field)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be text')
+    length = Animal.__table__.c[field].type.length
+    if length is not None and len(value) > length:
+        raise ValueError(f'{field} must be at most {length} characters')
+    return value
+
+
+def clean_animal(row, defaults, overrides=None, category_ids=None):
+    # defaults fill in fields a row leaves out; overrides replace whatever the
+    # row says, e.g. the farmer_id of the authenticated uploader. category_ids,
+    # when given, is the set of existing categories a row may refer to.
+    if isinstance(row, Exception):
+        raise ValueError(f'Invalid JSON: {row}')
+    if not isinstance(row, dict):
+        raise ValueError('Expected an object')
+    row = {**defaults, **{k: v for k, v in row.items() if v not in (None, '')}, **(overrides or {})}
+    missing = [field for field in REQUIRED_FIELDS if field not in row]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    try:
+        price = as_number(row['price'], float)
+        farmer_id = as_number(row['farmer_id'], int)
+        category_id = as_number(row['category_id'], int) if 'category_id' in row else None
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('price, farmer_id and category_id must be numeric')
+    if category_ids is not None and category_id is not None and category_id not in category_ids:
+        raise ValueError(f'Unknown category_id {category_id}')
+    text = {field: check_text(row, field) for field in TEXT_FIELDS}
+    return {
+        'type': text['type'],
+        'breed': text['breed'],
+        'price': check_animal_price(price),
+        'status': check_animal_status(text['status'] or 'Available'),
+        'description': text['description'],
+        'image_url': check_animal_image_url(text['image_url']),
+        'farmer_id': farmer_id,
+        'category_id': category_id,
+    }
+
+
+def ingest_animals(rows, defaults=None, batch_size=DEFAULT_BATCH_SIZE, overrides=None):
+    # Valid rows go in as executemany batches on the caller's transaction; the
+    # ORM unit of work (and its per-object flush) is bypassed entirely.
+    defaults = defaults or {}
+    category_ids = set(db.session.scalars(select(Category.id)))
+    insert = Animal.__table__.insert()
+    batch, errors, inserted = [], [], 0
+    for number, row in rows:
+        try:
+            batch.append(clean_animal(row, defaults, overrides, category_ids))
+        except ValueError as e:
+            errors.append({'row': number, 'message': str(e)})
+            continue
+        if len(batch) >= batch_size:
+            db.session.execute(insert, batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert, batch)
+        inserted += len(batch)
+    return inserted, errors
@@ -0,0 +1,356 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+class Job:
+    __slots__ = ('id', 'name', 'payload', 'attempts', 'enqueued_at')
+
+    def __init__(self, id, name, payload, attempts, enqueued_at):
+        self.id = id
+        self.name = name
+        self.payload = payload
+        self.attempts = attempts
+        self.enqueued_at = enqueued_at
+
+
+class MemoryBackend:
+    # Jobs live in a heap ordered by due time and are lost with the process.
+    def __init__(self):
+        self._heap = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def push(self, name, payload, run_at, enqueued_at):
+        with self._lock:
+            heapq.heappush(self._heap, (run_at, next(self._ids), name, payload, 0, enqueued_at))
+
+    def claim(self, now):
+        with self._lock:
+            if not self._heap or self._heap[0][0] > now:
+                return None
+            _, id, name, payload, attempts, enqueued_at = heapq.heappop(self._heap)
+        return Job(id, name, payload, attempts + 1, enqueued_at)
+
+    def complete(self, job):
+        pass
+
+    def retry(self, job, run_at, error):
+        with self._lock:
+            heapq.heappush(self._heap, (run_at, job.id, job.name, job.payload, job.attempts, job.enqueued_at))
+
+    def fail(self, job, error):
+        pass
+
+    def depth(self):
+        return len(self._heap)
+
+    def next_run_at(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+
+class SQLiteBackend:
+    # Survives restarts and is shared by every worker process using the file.
+    # A claimed job carries a lease; if its process dies mid-job, the lease
+    # runs out and another worker picks it up again.
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_at REAL NOT NULL,
+            enqueued_at REAL NOT NULL,
+            locked_until REAL,
+            error TEXT)''',
+        'CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at)',
+    ]
+
+    def __init__(self, path, lease=300):
+        self.path = path
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def connection(self):
+        # Opened lazily and per process: a sqlite3 handle must not cross a fork.
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode = WAL')
+            for statement in self.SCHEMA:
+                self._connection.execute(statement)
+            self._pid = os.getpid()
+        return self._connection
+
+    def execute(self, sql, params=()):
+        with self._lock:
+            return self.connection().execute(sql, params).fetchall()
+
+    def push(self, name, payload, run_at, enqueued_at):
+        self.execute('INSERT INTO jobs (name, payload, run_at, enqueued_at) VALUES (?, ?, ?, ?)',
+                     (name, json.dumps(payload), run_at, enqueued_at))
+
+    def claim(self, now):
+        with self._lock:
+            connection = self.connection()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute(
+                    '''SELECT id, name, payload, attempts, enqueued_at FROM jobs
+                       WHERE (status = 'queued' AND run_at <= ?) OR (status = 'running' AND locked_until < ?)
+                       ORDER BY run_at LIMIT 1''', (now, now)).fetchone()
+                if row is not None:
+                    connection.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ? "
+                                       'WHERE id = ?', (now + self.lease, row[0]))
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        if row is None:
+            return None
+        id, name, payload, attempts, enqueued_at = row
+        return Job(id, name, json.loads(payload), attempts + 1, enqueued_at)
+
+    def complete(self, job):
+        self.execute('DELETE FROM jobs WHERE id = ?', (job.id,))
+
+    def retry(self, job, run_at, error):
+        self.execute("UPDATE jobs SET status = 'queued', run_at = ?, locked_until = NULL, error = ? WHERE id = ?",
+                     (run_at, error, job.id))
+
+    def fail(self, job, error):
+        # Dead jobs stay in the table for inspection.
+        self.execute("UPDATE jobs SET status = 'failed', locked_until = NULL, error = ? WHERE id = ?", (error, job.id))
+
+    def depth(self):
+        return self.execute("SELECT count(*) FROM jobs WHERE status IN ('queued', 'running')")[0][0]
+
+    def next_run_at(self):
+        return self.execute("SELECT min(run_at) FROM jobs WHERE status = 'queued'")[0][0]
+
+
+def make_backend(url):
+    if not url:
+        return MemoryBackend()
+    parsed = make_url(url)
+    if parsed.get_backend_name() != 'sqlite' or not parsed.database:
+        raise ValueError(f'Unsupported job queue URL: {url}')
+    return SQLiteBackend(parsed.database)
+
+
+class JobQueue:
+    # Side effects that need not hold up a response (notifications, summary
+    # refreshes) are enqueued after commit and run on a few worker threads,
+    # each inside an app context. Failures are retried with exponential
+    # backoff and jitter; after max_attempts a job is dropped as failed.
+    # workers=0 runs jobs inline at enqueue time.
+    def __init__(self):
+        self.tasks = {}
+        self.app = None
+        self._threads = []
+        self._names = itertools.count()
+        self._pid = None
+        self._stopping = False
+        self._busy = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Condition()
+        self.configure()
+
+    def configure(self, backend=None, workers=DEFAULT_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                  retry_delay=1.0, retry_max=300.0, poll_interval=1.0):
+        self.backend = backend or MemoryBackend()
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retry_max = retry_max
+        self.poll_interval = poll_interval
+        self.periodic = {}
+        self._due = {}
+        self.enqueued = self.completed = self.retried = self.failed = self.running = 0
+        self.wait_total = self.wait_max = self.run_total = 0.0
+        self.runs = 0
+
+    def init_app(self, app):
+        self.shutdown()
+        self.configure(
+            backend=make_backend(app.config.get('JOB_QUEUE_URL')),
+            workers=app.config.get('JOB_WORKERS', DEFAULT_WORKERS),
+            max_attempts=app.config.get('JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+            retry_delay=app.config.get('JOB_RETRY_DELAY', 1.0),
+        )
+        self.app = app
+        if self.workers:
+            # Jobs persisted by an earlier process and periodic jobs start with
+            # the first request, and a worker thread that died is replaced.
+            app.before_request(self.start)
+
+    def task(self, name):
+        def decorator(fn):
+            self.tasks[name] = fn
+            return fn
+        return decorator
+
+    def every(self, seconds, name, /, **payload):
+        # Enqueued by each process's workers every `seconds`, the first time
+        # one interval after they start. Several processes may run the same
+        # periodic job at once, so it must be safe to repeat.
+        if name not in self.tasks:
+            raise KeyError(f'Unknown job {name!r}')
+        with self._lock:
+            self.periodic[name] = (seconds, payload)
+            self._due[name] = time.time() + seconds
+
+    def enqueue_due(self, now):
+        with self._lock:
+            due = [name for name, at in self._due.items() if at <= now]
+            for name in due:
+                self._due[name] = now + self.periodic[name][0]
+                self.enqueued += 1
+        for name in due:
+            self.backend.push(name, self.periodic[name][1], now, now)
+
+    def enqueue(self, name, /, **payload):
+        if name not in self.tasks:
+            raise KeyError(f'Unknown job {name!r}')
+        now = time.time()
+        with self._lock:
+            self.enqueued += 1
+        if not self.workers:
+            self.execute(Job(None, name, payload, 1, now), inline=True)
+            return
+        self.backend.push(name, payload, now, now)
+        self.start()
+        with self._wake:
+            self._wake.notify()
+
+    def start(self):
+        # Threads are started on first use in each process, so a preloading
+        # gunicorn master never forks with live workers.
+        with self._lock:
+            if self._pid == os.getpid() and len(self._threads) == self.workers \
+                    and all(thread.is_alive() for thread in self._threads):
+                return
+            if self._pid != os.getpid():
+                # Threads and schedules do not survive a fork.
+                self._threads = []
+                self._due = {name: time.time() + seconds for name, (seconds, _) in self.periodic.items()}
+            self._pid = os.getpid()
+            self._stopping = False
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self.work, name=f'job-worker-{next(self._names)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def shutdown(self):
+        with self._lock:
+            self._stopping = True
+            threads, self._threads = self._threads, []
+        with self._wake:
+            self._wake.notify_all()
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=5)
+
+    def work(self):
+        while not self._stopping:
+            # _busy spans claim and execute, so join() never sees a job that is
+            # neither queued nor counted as running.
+            job = None
+            with self._lock:
+                self._busy += 1
+            try:
+                self.enqueue_due(time.time())
+                job = self.backend.claim(time.time())
+                if job is not None:
+                    self.execute(job)
+            except Exception:
+                # A backend error (a locked or full SQLite file) must not kill
+                # the thread; the job's lease or retry brings it back later.
+                logger.exception('Job queue backend failed')
+            finally:
+                with self._lock:
+                    self._busy -= 1
+            if job is not None:
+                continue
+            try:
+                next_run = self.backend.next_run_at()
+            except Exception:
+                logger.exception('Job queue backend failed')
+                next_run = None
+            timeout = self.poll_interval if next_run is None else min(self.poll_interval, max(0.0, next_run - time.time()))
+            with self._wake:
+                self._wake.wait(timeout)
+
+    def execute(self, job, inline=False):
+        started = time.time()
+        with self._lock:
+            self.running += 1
+            self.runs += 1
+            waited = started - job.enqueued_at
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        outcome = 'completed'
+        try:
+            with self.app.app_context():
+                self.tasks[job.name](**job.payload)
+        except Exception as e:
+            logger.exception('Job %s %s failed (attempt %d)', job.name, job.payload, job.attempts)
+            if inline:
+                outcome = 'failed'
+            elif job.attempts >= self.max_attempts:
+                outcome = 'failed'
+                self.backend.fail(job, repr(e))
+            else:
+                outcome = 'retried'
+                delay = min(self.retry_max, self.retry_delay * 2 ** (job.attempts - 1)) * random.uniform(0.5, 1.0)
+                self.backend.retry(job, time.time() + delay, repr(e))
+        else:
+            if not inline:
+                self.backend.complete(job)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.run_total += time.time() - started
+                setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def join(self, timeout=30.0):
+        deadline = time.time() + timeout
+        while self.backend.depth() or self._busy:
+            if time.time() > deadline:
+                raise TimeoutError('Job queue did not drain')
+            time.sleep(0.01)
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'workers': self.workers,
+            'depth': self.backend.depth(),
+            'running': self.running,
+            'enqueued': self.enqueued,
+            'completed': self.completed,
+            'retried': self.retried,
+            'failed': self.failed,
+            'wait_avg_ms': self.wait_total / self.runs * 1000 if self.runs else 0.0,
+            'wait_max_ms': self.wait_max * 1000,
+            'run_avg_ms': self.run_total / self.runs * 1000 if self.runs else 0.0,
+        }
+
+
+jobs = JobQueue()
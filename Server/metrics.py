@@ -0,0 +1,160 @@
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Flipped by init_app. While False, timed() is a bare yield and no request or
+# SQL hooks are registered, so a disabled build pays essentially nothing.
+enabled = False
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=('route', 'method')):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for label_values, (counts, total, count) in sorted(self.series.items()):
+                labels = ','.join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+                for bound, bucket in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{labels}}} {total}')
+                lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+REQUEST_LATENCY = Histogram('farmart_request_duration_seconds', 'Request latency.', LATENCY_BUCKETS,
+                            labels=('route', 'method', 'status'))
+SQL_STATEMENTS = Histogram('farmart_request_sql_statements', 'SQL statements per request.', COUNT_BUCKETS)
+SQL_TIME = Histogram('farmart_request_sql_seconds', 'Time spent in SQL per request.', LATENCY_BUCKETS)
+BCRYPT_TIME = Histogram('farmart_request_bcrypt_seconds', 'Time spent hashing passwords per request.', LATENCY_BUCKETS)
+SERIALIZE_TIME = Histogram('farmart_request_serialize_seconds', 'Time spent serializing per request.', LATENCY_BUCKETS)
+COMPRESS_TIME = Histogram('farmart_request_compress_seconds', 'Time spent compressing per request.', LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram('farmart_response_size_bytes', 'Response body size.', SIZE_BUCKETS)
+HISTOGRAMS = [REQUEST_LATENCY, SQL_STATEMENTS, SQL_TIME, BCRYPT_TIME, SERIALIZE_TIME, COMPRESS_TIME, RESPONSE_SIZE]
+
+@contextmanager
+def timed(kind):
+    if not enabled or not has_request_context():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = g.get('metrics')
+        if timings is not None:
+            timings[kind] = timings.get(kind, 0.0) + time.perf_counter() - start
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context():
+        timings = g.get('metrics')
+        if timings is not None:
+            timings['sql_count'] = timings.get('sql_count', 0) + 1
+            timings['sql'] = timings.get('sql', 0.0) + elapsed
+
+
+def start_request():
+    g.metrics = {'start': time.perf_counter()}
+    profile_rate = g.metrics_config['PROFILE_SAMPLE_RATE']
+    if profile_rate and random.random() < profile_rate:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def finish_request(response):
+    timings = g.pop('metrics', None)
+    if timings is None:
+        return response
+    elapsed = time.perf_counter() - timings['start']
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    labels = (route, request.method)
+    REQUEST_LATENCY.observe(labels + (str(response.status_code),), elapsed)
+    SQL_STATEMENTS.observe(labels, timings.get('sql_count', 0))
+    SQL_TIME.observe(labels, timings.get('sql', 0.0))
+    if 'bcrypt' in timings:
+        BCRYPT_TIME.observe(labels, timings['bcrypt'])
+    if 'serialize' in timings:
+        SERIALIZE_TIME.observe(labels, timings['serialize'])
+    if 'compress' in timings:
+        COMPRESS_TIME.observe(labels, timings['compress'])
+    if not response.is_streamed:
+        RESPONSE_SIZE.observe(labels, response.calculate_content_length() or 0)
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        if elapsed * 1000 >= g.metrics_config['PROFILE_SLOW_MS']:
+            directory = g.metrics_config['PROFILE_DIR']
+            os.makedirs(directory, exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{route.strip('/').replace('/', '_') or 'root'}-{elapsed * 1000:.0f}ms.prof"
+            profiler.dump_stats(os.path.join(directory, name))
+    return response
+
+
+def render(collectors=()):
+    # collectors are callables returning {metric_name: value}, exported as gauges.
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for collect in collectors:
+        for name, value in collect().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app, engines, collectors=()):
+    global enabled
+    enabled = True
+    config = {
+        'PROFILE_SAMPLE_RATE': app.config.get('PROFILE_SAMPLE_RATE', 0.0),
+        'PROFILE_SLOW_MS': app.config.get('PROFILE_SLOW_MS', 500),
+        'PROFILE_DIR': app.config.get('PROFILE_DIR', 'profiles'),
+    }
+
+    @app.before_request
+    def metrics_before_request():
+        g.metrics_config = config
+        start_request()
+
+    app.after_request(finish_request)
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    app.add_url_rule('/metrics', 'metrics',
+                     lambda: app.response_class(render(collectors), mimetype='text/plain; version=0.0.4'))
@@ -0,0 +1,108 @@
+"""add animal search index
+
+Revision ID: e2a4c81f9b57
+Revises: 5d8e1b6c3f20
+Create Date: 2026-10-18 18:47:12.664031
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a4c81f9b57'
+down_revision = '5d8e1b6c3f20'
+branch_labels = None
+depends_on = None
+
+SQLITE_UPGRADE = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS animals_fts USING fts5(
+        type, breed, description, category,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')''',
+    '''CREATE TRIGGER IF NOT EXISTS animals_fts_ai AFTER INSERT ON animals BEGIN
+        INSERT INTO animals_fts (rowid, type, breed, description, category)
+        VALUES (new.id, new.type, new.breed, coalesce(new.description, ''),
+                coalesce((SELECT name FROM categories WHERE id = new.category_id), ''));
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS animals_fts_ad AFTER DELETE ON animals BEGIN
+        DELETE FROM animals_fts WHERE rowid = old.id;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS animals_fts_au AFTER UPDATE OF type, breed, description, category_id ON animals BEGIN
+        DELETE FROM animals_fts WHERE rowid = old.id;
+        INSERT INTO animals_fts (rowid, type, breed, description, category)
+        VALUES (new.id, new.type, new.breed, coalesce(new.description, ''),
+                coalesce((SELECT name FROM categories WHERE id = new.category_id), ''));
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS categories_fts_au AFTER UPDATE OF name ON categories BEGIN
+        UPDATE animals_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM animals WHERE category_id = new.id);
+    END''',
+    '''INSERT INTO animals_fts (rowid, type, breed, description, category)
+    SELECT animals.id, animals.type, animals.breed, coalesce(animals.description, ''), coalesce(categories.name, '')
+    FROM animals LEFT JOIN categories ON categories.id = animals.category_id''',
+]
+
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS animals_fts_ai',
+    'DROP TRIGGER IF EXISTS animals_fts_ad',
+    'DROP TRIGGER IF EXISTS animals_fts_au',
+    'DROP TRIGGER IF EXISTS categories_fts_au',
+    'DROP TABLE IF EXISTS animals_fts',
+]
+
+POSTGRES_UPGRADE = [
+    'ALTER TABLE animals ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    'CREATE INDEX IF NOT EXISTS ix_animals_search_vector ON animals USING gin (search_vector)',
+    '''CREATE OR REPLACE FUNCTION animals_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.type, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.breed, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(
+                (SELECT name FROM categories WHERE id = NEW.category_id), '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql''',
+    'DROP TRIGGER IF EXISTS animals_search_vector_trigger ON animals',
+    '''CREATE TRIGGER animals_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF type, breed, description, category_id ON animals
+        FOR EACH ROW EXECUTE FUNCTION animals_search_vector_update()''',
+    '''CREATE OR REPLACE FUNCTION categories_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE animals SET category_id = category_id WHERE category_id = NEW.id;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql''',
+    'DROP TRIGGER IF EXISTS categories_search_vector_trigger ON categories',
+    '''CREATE TRIGGER categories_search_vector_trigger
+        AFTER UPDATE OF name ON categories
+        FOR EACH ROW EXECUTE FUNCTION categories_search_vector_update()''',
+    'UPDATE animals SET type = type',
+]
+
+POSTGRES_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS categories_search_vector_trigger ON categories',
+    'DROP FUNCTION IF EXISTS categories_search_vector_update()',
+    'DROP TRIGGER IF EXISTS animals_search_vector_trigger ON animals',
+    'DROP FUNCTION IF EXISTS animals_search_vector_update()',
+    'DROP INDEX IF EXISTS ix_animals_search_vector',
+    'ALTER TABLE animals DROP COLUMN IF EXISTS search_vector',
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_UPGRADE, SQLITE_DOWNGRADE),
+    'postgresql': (POSTGRES_UPGRADE, POSTGRES_DOWNGRADE),
+}
+
+
+def upgrade():
+    upgrade_statements, _ = STATEMENTS.get(op.get_bind().dialect.name, ([], []))
+    for statement in upgrade_statements:
+        op.execute(statement)
+
+
+def downgrade():
+    _, downgrade_statements = STATEMENTS.get(op.get_bind().dialect.name, ([], []))
+    for statement in downgrade_statements:
+        op.execute(statement)
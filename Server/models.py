@@ -3,15 +3,41 @@ from sqlalchemy import MetaData
 from sqlalchemy.orm import validates, relationship
 from sqlalchemy_serializer import SerializerMixin
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_bcrypt import Bcrypt
+from passwords import passwords
+from images import thumbnail_urls
+from replicas import RoutingSession
+import math
 import re
 
 metadata = MetaData(naming_convention={
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
 })
 
-db = SQLAlchemy(metadata=metadata)
-bcrypt = Bcrypt()
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
+
+ANIMAL_STATUSES = {'Available', 'Sold Out', 'Pending'}
+
+def check_animal_price(price):
+    try:
+        finite = math.isfinite(price)
+    except TypeError:
+        raise ValueError("Price must be a number.")
+    # float('nan') < 0 is False, so NaN and infinity need their own check.
+    if not finite or price < 0:
+        raise ValueError("Price must be a non-negative number.")
+    return price
+
+def check_animal_status(status):
+    if status not in ANIMAL_STATUSES:
+        raise ValueError("Invalid status for animal.")
+    return status
+
+IMAGE_URL_PATTERN = re.compile(r'^(https?://\S+|/images/[0-9a-f]{64}\.(jpg|png|gif|webp))$')
+
+def check_animal_image_url(image_url):
+    if image_url is not None and (len(image_url) > 255 or not IMAGE_URL_PATTERN.match(image_url)):
+        raise ValueError("Image URL must be an http(s) URL or an uploaded image.")
+    return image_url
 
 class Category(db.Model, SerializerMixin):
     __tablename__ = 'categories'
@@ -42,23 +68,32 @@ class Animal(db.Model, SerializerMixin):
     image_url = db.Column(db.String(255))
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
 
-    @validates(price)
+    __table_args__ = (
+        db.Index('ix_animals_price_id', 'price', 'id'),
+        db.Index('ix_animals_status_price_id', 'status', 'price', 'id'),
+        db.Index('ix_animals_category_id_price_id', 'category_id', 'price', 'id'),
+        db.Index('ix_animals_farmer_id_id', 'farmer_id', 'id'),
+        db.Index('ix_animals_type_breed', 'type', 'breed'),
+    )
+
+    @validates('price')
     def validate_price(self, key, price):
-        if price < 0:
-            raise ValueError("Price must be non-negative.")
-        return price
+        return check_animal_price(price)
 
     @validates('status')
     def validate_status(self, key, status):
-        valid_statuses = {'Available', 'Sold Out', 'Pending'}
-        if status not in valid_statuses:
-            raise ValueError("Invalid status for animal.")
-        return status
+        return check_animal_status(status)
+
+    @validates('image_url')
+    def validate_image_url(self, key, image_url):
+        return check_animal_image_url(image_url)
     
     serialize_rules = ('-farmer_id', '-category_id') 
 
     def serialize(self):
-        return {c: getattr(self, c) for c in self.__table__.columns.keys() if c not in self.serialize_rules}
+        data = {c: getattr(self, c) for c in self.__table__.columns.keys() if c not in self.serialize_rules}
+        data['thumbnails'] = thumbnail_urls(self.image_url)
+        return data
     
     def __repr__(self):
         return f'<Animal {self.type} {self.breed} in category {self.category.name}>'
@@ -99,10 +134,10 @@ class Farmer(db.Model, SerializerMixin):
         return password  
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = passwords.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return passwords.verify(self.password_hash, password)
 
     def __repr__(self):
         return f'<Farmer {self.username} at {self.farm_name}>'
@@ -142,10 +177,10 @@ class User(db.Model):
     serialize_rules = ('-password_hash',)
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = passwords.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return passwords.verify(self.password_hash, password)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -158,8 +193,27 @@ class Cart(db.Model):
     total_price = db.Column(db.Float)
     status = db.Column(db.String(20), default='Pending')
     order_date = db.Column(db.DateTime, onupdate=db.func.now())
+    # Set by the job that adds a confirmed cart to farmer_sales_summary.
+    sales_recorded = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     items = db.relationship('CartItem', backref='cart', lazy=True)
 
+    __table_args__ = (
+        db.Index('uq_carts_user_id_pending', 'user_id', unique=True,
+                 sqlite_where=db.text("status = 'Pending'"),
+                 postgresql_where=db.text("status = 'Pending'")),
+    )
+
+    def serialize(self):
+        items = [item.serialize_with_animal() for item in self.items]
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'status': self.status,
+            'order_date': self.order_date,
+            'items': items,
+            'total_price': sum(item['line_total'] for item in items),
+        }
+
     def __repr__(self):
         return f'<Cart {self.id} by User {self.user_id}>'
 
@@ -171,6 +225,84 @@ class CartItem(db.Model):
     animal_id = db.Column(db.Integer, db.ForeignKey('animals.id'))
     quantity = db.Column(db.Integer, default=1)
     unit_price = db.Column(db.Float)
+    animal = db.relationship('Animal', lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_cart_items_animal_id_cart_id', 'animal_id', 'cart_id'),
+        db.UniqueConstraint('cart_id', 'animal_id', name='uq_cart_items_cart_id_animal_id'),
+    )
+
+    def serialize(self):
+        return {
+            'id': self.id,
+            'cart_id': self.cart_id,
+            'animal_id': self.animal_id,
+            'quantity': self.quantity,
+            'unit_price': self.unit_price,
+            'line_total': (self.quantity or 0) * (self.unit_price or 0),
+        }
+
+    def serialize_with_animal(self):
+        animal = self.animal
+        return {
+            **self.serialize(),
+            'animal': {
+                'id': animal.id,
+                'type': animal.type,
+                'breed': animal.breed,
+                'status': animal.status,
+                'image_url': animal.image_url,
+                'thumbnails': thumbnail_urls(animal.image_url),
+            } if animal else None,
+        }
     
     def __repr__(self):
         return f'<CartItem for Cart {self.cart_id}, Animal {self.animal_id}>'
+
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<TableVersion {self.name} v{self.version}>'
+
+
+class FarmerSalesSummary(db.Model):
+    __tablename__ = 'farmer_sales_summary'
+
+    farmer_id = db.Column(db.Integer, db.ForeignKey('farmers.id'), primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    # Primary key columns cannot be NULL, so uncategorized animals roll up under 0.
+    category_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    # Carts per category: a cart spanning two categories counts once in each.
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<FarmerSalesSummary farmer {self.farmer_id} {self.day} category {self.category_id}>'
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+
+    # Keys are scoped to the user who sent them; no foreign key, so the table
+    # stays a cheap append-and-prune log.
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # NULL while the first request with the key is still running.
+    status_code = db.Column(db.Integer)
+    body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_idempotency_keys_created_at', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key} for User {self.user_id}>'
@@ -0,0 +1,95 @@
+import itertools
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func
+
+from jobs import jobs
+from models import db, Animal, Cart, CartItem
+from pagination import decode_cursor, encode_cursor
+
+
+def farmer_order_filters(query, farmer_id, args):
+    query = query.join(CartItem, CartItem.cart_id == Cart.id) \
+        .join(Animal, Animal.id == CartItem.animal_id) \
+        .filter(Animal.farmer_id == farmer_id)
+    if args.get('status'):
+        query = query.filter(Cart.status == args['status'])
+    if args.get('from'):
+        query = query.filter(Cart.order_date >= datetime.fromisoformat(args['from']))
+    if args.get('to'):
+        query = query.filter(Cart.order_date <= datetime.fromisoformat(args['to']))
+    return query
+
+
+def farmer_order_rows(farmer_id, args, cursor=None, limit=None):
+    # One statement: the page of cart ids is a subquery joined back onto the
+    # farmer's line items, and each order's total is a window sum, so neither
+    # an IN-list of animal ids nor a second round trip is needed.
+    line_total = CartItem.quantity * CartItem.unit_price
+    query = db.session.query(
+        Cart.id.label('cart_id'),
+        Cart.status.label('status'),
+        Cart.order_date.label('order_date'),
+        CartItem.id.label('item_id'),
+        CartItem.animal_id.label('animal_id'),
+        CartItem.quantity.label('quantity'),
+        CartItem.unit_price.label('unit_price'),
+        func.sum(line_total).over(partition_by=Cart.id).label('total'),
+    )
+    query = farmer_order_filters(query, farmer_id, args)
+    if limit is not None:
+        page = farmer_order_filters(db.session.query(Cart.id.label('cart_id')), farmer_id, args)
+        if cursor:
+            page = page.filter(Cart.id > decode_cursor(cursor, 1)[0])
+        page = page.group_by(Cart.id).order_by(Cart.id).limit(limit + 1).subquery()
+        query = query.join(page, page.c.cart_id == Cart.id)
+    return query.order_by(Cart.id, CartItem.id)
+
+
+def group_orders(rows):
+    for cart_id, items in itertools.groupby(rows, key=lambda row: row.cart_id):
+        items = list(items)
+        yield {
+            'cart_id': cart_id,
+            'status': items[0].status,
+            'order_date': items[0].order_date,
+            'total': items[0].total,
+            'items': [{
+                'id': item.item_id,
+                'animal_id': item.animal_id,
+                'quantity': item.quantity,
+                'unit_price': item.unit_price,
+            } for item in items],
+        }
+
+
+def farmer_orders_page(farmer_id, args, cursor, limit):
+    orders = list(group_orders(farmer_order_rows(farmer_id, args, cursor, limit)))
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor([orders[-1]['cart_id']])
+    return orders, next_cursor
+
+
+def send_order_notification(farmer_id, order):
+    # Delivery channel (email, SMS) plugs in here; for now it is logged.
+    current_app.logger.info('New order %s for farmer %s: %d animals, %.2f total',
+                            order['cart_id'], farmer_id, len(order['items']), order['total'])
+
+
+@jobs.task('notify_farmers')
+def notify_farmers(cart_id):
+    rows = db.session.query(Animal.farmer_id, CartItem.animal_id, CartItem.quantity, CartItem.unit_price) \
+        .join(Animal, Animal.id == CartItem.animal_id) \
+        .filter(CartItem.cart_id == cart_id) \
+        .order_by(Animal.farmer_id, CartItem.animal_id).all()
+    for farmer_id, items in itertools.groupby(rows, key=lambda row: row.farmer_id):
+        items = [{'animal_id': item.animal_id, 'quantity': item.quantity, 'unit_price': item.unit_price}
+                 for item in items]
+        send_order_notification(farmer_id, {
+            'cart_id': cart_id,
+            'items': items,
+            'total': sum(item['quantity'] * item['unit_price'] for item in items),
+        })
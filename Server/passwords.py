@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+from metrics import timed
+
+DEFAULT_ROUNDS = 12
+
+
+class PoolOverloaded(Exception):
+    pass
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(hashed, password):
+    return bcrypt.checkpw(password, hashed)
+
+
+def _encode(value):
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+def default_pool_size(server_workers=1):
+    # Every server worker process gets its own pool, so the cores are shared
+    # out between them rather than each worker claiming all of them.
+    return max(1, (os.cpu_count() or 1) // max(1, server_workers))
+
+
+def pool_context():
+    # Pool processes are started from a clean forkserver rather than forked
+    # from a worker that may be running thousands of threads.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return None
+
+
+def hash_rounds(hashed):
+    # Modular crypt format: $2b$<cost>$<salt+digest>
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    # bcrypt is deliberately CPU-bound, so it runs in a process pool rather than
+    # on the request thread. A semaphore caps queued work so a login burst gets
+    # fast 503s instead of starving every worker.
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=None, max_pending=None):
+        self.configure(rounds, workers, max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, rounds=DEFAULT_ROUNDS, workers=None, max_pending=None, server_workers=1):
+        self.rounds = rounds
+        self.workers = default_pool_size(server_workers) if workers is None else workers
+        self.max_pending = max_pending if max_pending is not None else self.workers * 4
+        self._pending = threading.BoundedSemaphore(self.max_pending) if self.workers else None
+
+    def init_app(self, app):
+        self.configure(
+            rounds=app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_ROUNDS),
+            workers=app.config.get('PASSWORD_POOL_WORKERS'),
+            max_pending=app.config.get('PASSWORD_POOL_MAX_PENDING'),
+            server_workers=app.config.get('SERVER_WORKERS', 1),
+        )
+        self.shutdown()
+
+    def executor(self):
+        # Created on first use so a preloading parent never forks live workers.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context())
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def run(self, fn, *args):
+        with timed('bcrypt'):
+            return self.submit(fn, *args)
+
+    def submit(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        pending = self._pending
+        if not pending.acquire(blocking=False):
+            raise PoolOverloaded('Password hashing queue is full')
+        try:
+            future = self.executor().submit(fn, *args)
+        except BaseException:
+            pending.release()
+            raise
+        future.add_done_callback(lambda _: pending.release())
+        return future.result()
+
+    def hash(self, password):
+        return self.run(_hash, _encode(password), self.rounds)
+
+    def verify(self, hashed, password):
+        if not hashed:
+            return False
+        return self.run(_check, _encode(hashed), _encode(password))
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
+
+
+passwords = PasswordHasher()
@@ -0,0 +1,181 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import jsonify, request
+from sqlalchemy.engine import make_url
+
+# burst: tokens a full bucket holds; rate: tokens added back per second.
+Limit = namedtuple('Limit', 'burst rate')
+# Retry-After for a bucket that never refills (rate 0).
+MAX_RETRY_AFTER = 3600
+
+
+def consume(states, limits, now):
+    # Refills each bucket for the time since it was last touched, then takes a
+    # token from every bucket or from none. Returns the new states and, per
+    # bucket, how long until it holds a token again (0 if it has one now).
+    refilled = []
+    for state, limit in zip(states, limits):
+        tokens, updated = state or (limit.burst, now)
+        refilled.append(min(limit.burst, tokens + (now - updated) * limit.rate))
+    waits = [0.0 if tokens >= 1 else (1 - tokens) / limit.rate if limit.rate else math.inf
+             for tokens, limit in zip(refilled, limits)]
+    if not any(waits):
+        refilled = [tokens - 1 for tokens in refilled]
+    return [(tokens, now) for tokens in refilled], waits
+
+
+class MemoryBuckets:
+    # Per process: with several gunicorn workers each one allows the full rate.
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, keys, limits, now):
+        with self._lock:
+            states, waits = consume([self._data.get(key) for key in keys], limits, now)
+            for key, state in zip(keys, states):
+                self._data[key] = state
+                self._data.move_to_end(key)
+            # Evicting a bucket only forgets attempts old enough to be at the
+            # back of the line, which at worst refills it early.
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return waits
+
+    def size(self):
+        return len(self._data)
+
+
+class SQLiteBuckets:
+    # Shared by every worker process using the file, so the limit holds for the
+    # whole server rather than per worker.
+    SCHEMA = 'CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, idle=3600):
+        self.path = path
+        self.idle = idle
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._calls = 0
+
+    def connection(self):
+        # Opened lazily and per process: a sqlite3 handle must not cross a fork.
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode = WAL')
+            self._connection.execute('PRAGMA synchronous = NORMAL')
+            self._connection.execute(self.SCHEMA)
+            self._pid = os.getpid()
+        return self._connection
+
+    def take(self, keys, limits, now):
+        with self._lock:
+            connection = self.connection()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                rows = dict((key, (tokens, updated)) for key, tokens, updated in connection.execute(
+                    f"SELECT key, tokens, updated FROM rate_buckets WHERE key IN ({', '.join('?' * len(keys))})", keys))
+                states, waits = consume([rows.get(key) for key in keys], limits, now)
+                connection.executemany('INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                                       [(key, *state) for key, state in zip(keys, states)])
+                self._calls += 1
+                if self._calls % self.PRUNE_EVERY == 0:
+                    connection.execute('DELETE FROM rate_buckets WHERE updated < ?', (now - self.idle,))
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        return waits
+
+    def size(self):
+        with self._lock:
+            return self.connection().execute('SELECT count(*) FROM rate_buckets').fetchone()[0]
+
+
+def make_buckets(url):
+    if not url:
+        return MemoryBuckets()
+    parsed = make_url(url)
+    if parsed.get_backend_name() != 'sqlite' or not parsed.database:
+        raise ValueError(f'Unsupported rate limit URL: {url}')
+    return SQLiteBuckets(parsed.database)
+
+
+class RateLimiter:
+    # Token buckets per client IP and per username, checked before a login or
+    # registration touches the database or bcrypt. A request needs a token
+    # from both, so neither a burst from one address nor a slow spray against
+    # one account across many addresses gets through.
+    def __init__(self):
+        self.configure()
+
+    def configure(self, buckets=None, enabled=True, ip=Limit(20, 10 / 60), user=Limit(5, 2 / 60)):
+        self.buckets = buckets or MemoryBuckets()
+        self.enabled = enabled
+        self.limits = {'ip': ip, 'user': user}
+        self.allowed = 0
+        self.limited = {'ip': 0, 'user': 0}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        config = app.config
+        self.configure(
+            buckets=make_buckets(config.get('RATE_LIMIT_URL')),
+            enabled=config.get('AUTH_RATE_LIMIT_ENABLED', True),
+            ip=Limit(config.get('AUTH_IP_BURST', 20), config.get('AUTH_IP_PER_MINUTE', 10) / 60),
+            user=Limit(config.get('AUTH_USER_BURST', 5), config.get('AUTH_USER_PER_MINUTE', 2) / 60),
+        )
+
+    def check(self, ip, username=None):
+        if not self.enabled:
+            return 0.0
+        scopes = [('ip', ip)]
+        if isinstance(username, str) and username:
+            scopes.append(('user', username.strip().lower()[:64]))
+        scopes = [(scope, value) for scope, value in scopes if self.limits[scope].burst > 0]
+        if not scopes:
+            return 0.0
+        waits = self.buckets.take([f'{scope}:{value}' for scope, value in scopes],
+                                  [self.limits[scope] for scope, _ in scopes], time.time())
+        wait = max(waits)
+        with self._lock:
+            if wait:
+                # Counted against the bucket that keeps the client waiting longest.
+                self.limited[scopes[waits.index(wait)][0]] += 1
+            else:
+                self.allowed += 1
+        return wait
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'buckets': self.buckets.size(),
+            'allowed': self.allowed,
+            'limited_ip': self.limited['ip'],
+            'limited_user': self.limited['user'],
+        }
+
+
+limiter = RateLimiter()
+
+
+def rate_limited(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        data = request.get_json(silent=True) or {}
+        wait = limiter.check(request.remote_addr, data.get('username') if isinstance(data, dict) else None)
+        if wait:
+            response = jsonify({'message': 'Too many attempts, please retry later'})
+            response.headers['Retry-After'] = str(math.ceil(min(wait, MAX_RETRY_AFTER)))
+            return response, 429
+        return view(*args, **kwargs)
+    return wrapper
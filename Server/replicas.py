@@ -0,0 +1,94 @@
+import itertools
+import threading
+from functools import wraps
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+REPLICA_PREFIX = 'replica_'
+PRIMARY = 'primary'
+
+
+def replica_binds(uris):
+    # DB_REPLICA_URI may list several replicas separated by commas.
+    uris = [uri.strip() for uri in (uris or '').split(',') if uri.strip()]
+    return {f'{REPLICA_PREFIX}{i}': uri for i, uri in enumerate(uris)}
+
+
+def is_plain_read(clause):
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+class RoutingSession(Session):
+    # A request marked with use_replica sends its SELECTs to one replica until
+    # the session writes anything; from then on every statement, reads
+    # included, goes to the primary so the request sees its own writes.
+    # Locking reads, raw SQL and explicit connections always use the primary.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica and bind is None and not self.info.get('wrote') and not self._flushing and is_plain_read(clause):
+            return self._db.engines[replica]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def mark_flushed(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def mark_bulk_write(state):
+    if not state.is_select:
+        state.session.info['wrote'] = True
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.keys = []
+        self.queries = {PRIMARY: 0}
+        self._cycle = itertools.cycle(())
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.keys = sorted(key for key in app.config.get('SQLALCHEMY_BINDS', {}) if key.startswith(REPLICA_PREFIX))
+        self._cycle = itertools.cycle(self.keys)
+        self.queries = {PRIMARY: 0, **{key: 0 for key in self.keys}}
+        with app.app_context():
+            engines = app.extensions['sqlalchemy'].engines
+            for key in (None, *self.keys):
+                event.listen(engines[key], 'before_cursor_execute', self.counter(key or PRIMARY))
+
+    def counter(self, name):
+        def before_cursor_execute(*args):
+            with self._lock:
+                self.queries[name] += 1
+        return before_cursor_execute
+
+    def next_replica(self):
+        with self._lock:
+            return next(self._cycle, None)
+
+    def stats(self):
+        with self._lock:
+            return {'replicas': len(self.keys), **{f'queries_{name}': count for name, count in self.queries.items()}}
+
+
+replicas = ReplicaRouter()
+
+
+def read_from_replica():
+    # Round-robin per request, so all of one request's reads see one snapshot.
+    db = current_app.extensions['sqlalchemy']
+    replica = replicas.next_replica()
+    if replica in db.engines:
+        db.session.info.setdefault('replica', replica)
+
+
+def use_replica(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        read_from_replica()
+        return view(*args, **kwargs)
+    return wrapper
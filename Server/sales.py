@@ -0,0 +1,152 @@
+from datetime import date
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, select, update
+
+from carts import lock_for_write, upsert
+from jobs import jobs
+from models import db, Animal, Cart, CartItem, FarmerSalesSummary
+
+UNCATEGORIZED = 0
+SUMMARY_COLUMNS = ['farmer_id', 'day', 'category_id', 'revenue', 'units', 'orders']
+
+
+def sales_rows(*criteria):
+    # The one definition of the summary, shared by the per-checkout job,
+    # the backfill and the consistency check so they cannot drift apart.
+    # Animals without a farmer have no one to report to, and farmer_id is part
+    # of the summary's key, so their lines are left out.
+    day = func.date(Cart.order_date)
+    category_id = func.coalesce(Animal.category_id, UNCATEGORIZED)
+    return select(
+        Animal.farmer_id,
+        day.label('day'),
+        category_id.label('category_id'),
+        func.sum(CartItem.quantity * CartItem.unit_price).label('revenue'),
+        func.sum(CartItem.quantity).label('units'),
+        func.count(func.distinct(Cart.id)).label('orders'),
+    ).select_from(CartItem) \
+        .join(Cart, Cart.id == CartItem.cart_id) \
+        .join(Animal, Animal.id == CartItem.animal_id) \
+        .where(Cart.status == 'Confirmed', Cart.order_date.isnot(None), Animal.farmer_id.isnot(None), *criteria) \
+        .group_by(Animal.farmer_id, day, category_id)
+
+
+@jobs.task('record_sales')
+def record_sales(cart_id):
+    # Runs after checkout, off the request path. Claiming the cart's
+    # sales_recorded flag and adding its lines to the summary commit together,
+    # so a retried or duplicated job counts the cart exactly once.
+    claimed = db.session.execute(
+        update(Cart).where(Cart.id == cart_id, Cart.status == 'Confirmed', Cart.sales_recorded.is_(False))
+        # order_date is named explicitly so its onupdate does not move the sale to today.
+        .values(sales_recorded=True, order_date=Cart.order_date)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if claimed:
+        table = FarmerSalesSummary.__table__
+        insert = upsert(table).from_select(SUMMARY_COLUMNS, sales_rows(Cart.id == cart_id))
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=[table.c.farmer_id, table.c.day, table.c.category_id],
+            set_={name: table.c[name] + insert.excluded[name] for name in ('revenue', 'units', 'orders')},
+        ))
+    db.session.commit()
+
+
+@jobs.task('record_missing_sales')
+def record_missing_sales(limit=1000):
+    # Periodic sweep for confirmed carts whose record_sales job was lost.
+    # record_sales claims each cart itself, so racing a queued job is harmless.
+    cart_ids = db.session.scalars(
+        select(Cart.id).where(Cart.status == 'Confirmed', Cart.sales_recorded.is_(False)).order_by(Cart.id).limit(limit)
+    ).all()
+    for cart_id in cart_ids:
+        record_sales(cart_id)
+    return len(cart_ids)
+
+
+def rebuild_summary():
+    lock_for_write()
+    table = FarmerSalesSummary.__table__
+    db.session.execute(table.delete())
+    count = db.session.execute(table.insert().from_select(SUMMARY_COLUMNS, sales_rows())).rowcount
+    db.session.execute(
+        update(Cart).where(Cart.status == 'Confirmed').values(sales_recorded=True, order_date=Cart.order_date)
+        .execution_options(synchronize_session=False)
+    )
+    return count
+
+
+def check_summary(tolerance=0.01):
+    def keyed(rows):
+        return {(row.farmer_id, str(row.day), row.category_id): (row.revenue, row.units, row.orders) for row in rows}
+
+    expected = keyed(db.session.execute(sales_rows()))
+    actual = keyed(db.session.query(*(FarmerSalesSummary.__table__.c[name] for name in SUMMARY_COLUMNS)))
+    mismatches = []
+    for key in sorted(expected.keys() | actual.keys()):
+        want, got = expected.get(key), actual.get(key)
+        if want is None or got is None or abs(want[0] - got[0]) > tolerance or want[1:] != got[1:]:
+            mismatches.append({'farmer_id': key[0], 'day': key[1], 'category_id': key[2],
+                               'expected': want, 'actual': got})
+    return mismatches
+
+
+def farmer_sales(farmer_id, args):
+    # Reads only the farmer's summary rows: cost grows with days sold, not with
+    # the number of cart lines behind them.
+    group = args.get('group', 'day')
+    if group not in ('day', 'category'):
+        raise ValueError('group must be day or category')
+    key = FarmerSalesSummary.day if group == 'day' else FarmerSalesSummary.category_id
+    query = db.session.query(
+        key,
+        func.sum(FarmerSalesSummary.revenue),
+        func.sum(FarmerSalesSummary.units),
+        func.sum(FarmerSalesSummary.orders),
+    ).filter(FarmerSalesSummary.farmer_id == farmer_id)
+    if args.get('from'):
+        query = query.filter(FarmerSalesSummary.day >= date.fromisoformat(args['from']))
+    if args.get('to'):
+        query = query.filter(FarmerSalesSummary.day <= date.fromisoformat(args['to']))
+    if args.get('category_id'):
+        query = query.filter(FarmerSalesSummary.category_id == int(args['category_id']))
+    rows = [{group: value.isoformat() if isinstance(value, date) else value,
+             'revenue': revenue, 'units': units, 'orders': orders}
+            for value, revenue, units, orders in query.group_by(key).order_by(key)]
+
+    pending_orders = db.session.query(func.count(func.distinct(CartItem.cart_id))) \
+        .join(Cart, Cart.id == CartItem.cart_id) \
+        .join(Animal, Animal.id == CartItem.animal_id) \
+        .filter(Animal.farmer_id == farmer_id, Cart.status == 'Pending').scalar()
+    return {
+        group + 's': rows,
+        'totals': {
+            'revenue': sum(row['revenue'] for row in rows),
+            'units': sum(row['units'] for row in rows),
+        },
+        'pending_orders': pending_orders,
+    }
+
+
+sales_cli = AppGroup('sales', help='Maintain the farmer sales summary.')
+
+
+@sales_cli.command('backfill')
+def backfill_command():
+    """Rebuild the summary from every confirmed cart."""
+    count = rebuild_summary()
+    db.session.commit()
+    click.echo(f'Rebuilt {count} summary rows')
+
+
+@sales_cli.command('check')
+def check_command():
+    """Compare the summary with a full recomputation."""
+    mismatches = check_summary()
+    for mismatch in mismatches:
+        click.echo(mismatch)
+    if mismatches:
+        raise click.ClickException(f'{len(mismatches)} summary rows differ from the cart data')
+    click.echo('Summary matches the cart data')
@@ -0,0 +1,128 @@
+import re
+
+from sqlalchemy import column, event, func, literal_column, or_, table, text
+
+from models import db, Animal, Category
+
+# Search index DDL. Triggers rather than ORM events keep the index in sync, so
+# bulk inserts through Core (see ingest.py) are indexed too. The migration
+# carries a frozen copy of the same statements.
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS animals_fts USING fts5(
+        type, breed, description, category,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS animals_fts_ai AFTER INSERT ON animals BEGIN
+        INSERT INTO animals_fts (rowid, type, breed, description, category)
+        VALUES (new.id, new.type, new.breed, coalesce(new.description, ''),
+                coalesce((SELECT name FROM categories WHERE id = new.category_id), ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS animals_fts_ad AFTER DELETE ON animals BEGIN
+        DELETE FROM animals_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS animals_fts_au AFTER UPDATE OF type, breed, description, category_id ON animals BEGIN
+        DELETE FROM animals_fts WHERE rowid = old.id;
+        INSERT INTO animals_fts (rowid, type, breed, description, category)
+        VALUES (new.id, new.type, new.breed, coalesce(new.description, ''),
+                coalesce((SELECT name FROM categories WHERE id = new.category_id), ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS categories_fts_au AFTER UPDATE OF name ON categories BEGIN
+        UPDATE animals_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM animals WHERE category_id = new.id);
+    END""",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS categories_fts_au',
+    'DROP TABLE IF EXISTS animals_fts',
+]
+
+POSTGRES_DDL = [
+    'ALTER TABLE animals ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    'CREATE INDEX IF NOT EXISTS ix_animals_search_vector ON animals USING gin (search_vector)',
+    """CREATE OR REPLACE FUNCTION animals_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.type, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.breed, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(
+                (SELECT name FROM categories WHERE id = NEW.category_id), '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS animals_search_vector_trigger ON animals',
+    """CREATE TRIGGER animals_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF type, breed, description, category_id ON animals
+        FOR EACH ROW EXECUTE FUNCTION animals_search_vector_update()""",
+    """CREATE OR REPLACE FUNCTION categories_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE animals SET category_id = category_id WHERE category_id = NEW.id;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS categories_search_vector_trigger ON categories',
+    """CREATE TRIGGER categories_search_vector_trigger
+        AFTER UPDATE OF name ON categories
+        FOR EACH ROW EXECUTE FUNCTION categories_search_vector_update()""",
+]
+
+animals_fts = table('animals_fts', column('rowid'), column('animals_fts'))
+search_vector = literal_column('animals.search_vector')
+
+
+@event.listens_for(db.metadata, 'after_create')
+def install_search_index(target, connection, **kw):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def drop_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        for statement in SQLITE_DROP:
+            connection.execute(text(statement))
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())[:8]
+
+
+def fts_search(query, terms):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        # Every term is a quoted prefix query, implicitly ANDed. Column weights
+        # favour type/breed over category over free-text description.
+        match = ' '.join(f'"{term}"*' for term in terms)
+        rank = func.bm25(literal_column('animals_fts'), 10.0, 5.0, 1.0, 3.0)
+        return query.join(animals_fts, animals_fts.c.rowid == Animal.id) \
+            .filter(animals_fts.c.animals_fts.op('MATCH')(match)) \
+            .order_by(rank, Animal.id)
+    if dialect == 'postgresql':
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+        return query.filter(search_vector.op('@@')(tsquery)) \
+            .order_by(func.ts_rank(search_vector, tsquery).desc(), Animal.id)
+    return like_search(query, terms)
+
+
+def like_search(query, terms):
+    # Unindexed fallback: every term must appear somewhere in the row.
+    query = query.outerjoin(Category, Category.id == Animal.category_id)
+    for term in terms:
+        pattern = f'%{term}%'
+        query = query.filter(or_(Animal.type.ilike(pattern), Animal.breed.ilike(pattern),
+                                 Animal.description.ilike(pattern), Category.name.ilike(pattern)))
+    return query.order_by(Animal.id)
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Keeps autogenerate from dropping the hand-written search index objects.
+    if type_ == 'table' and name.startswith('animals_fts'):
+        return False
+    if name in ('search_vector', 'ix_animals_search_vector'):
+        return False
+    return True
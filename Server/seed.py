@@ -1,5 +1,6 @@
 from app import db, app
 from models import Animal, Category
+from versions import bump_version
 
 def seed_data():
     with app.app_context():
@@ -21,6 +22,9 @@ def seed_data():
             Category(name='Small Mammals')
         ]
         db.session.add_all(categories)
+        # Seeding is a write like any other: without a version bump, ETags and
+        # caches keep serving the catalog as it was before.
+        bump_version('animals', 'categories')
         db.session.commit()
 
         print('Creating animals...')
@@ -128,6 +132,7 @@ def seed_data():
         ]
 
         db.session.add_all(animals)
+        bump_version('animals')
         db.session.commit()
 
         print('Successfully created animals and categories')
@@ -0,0 +1,97 @@
+import datetime
+import json
+
+from flask import current_app, jsonify, stream_with_context
+
+from images import thumbnail_urls
+from metrics import timed
+from models import db, Animal, Category
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 1000
+
+
+class FieldPlan:
+    # Column list and output keys are resolved once per model, so serializing a
+    # row is a single zip over a plain tuple instead of a getattr per column on
+    # a fully hydrated ORM instance.
+    # computed maps extra output keys to functions of the row dict.
+    def __init__(self, model, exclude=(), computed=None):
+        self.model = model
+        self.columns = tuple(c for c in model.__table__.columns if c.key not in exclude)
+        self.keys = tuple(c.key for c in self.columns)
+        self.computed = tuple((computed or {}).items())
+
+    def query(self):
+        return db.session.query(*self.columns)
+
+    def row(self, row):
+        data = dict(zip(self.keys, row))
+        for key, compute in self.computed:
+            data[key] = compute(data)
+        return data
+
+    def rows(self, rows):
+        if self.computed:
+            return [self.row(row) for row in rows]
+        keys = self.keys
+        return [dict(zip(keys, row)) for row in rows]
+
+
+ANIMAL_FIELDS = FieldPlan(Animal, computed={'thumbnails': lambda row: thumbnail_urls(row['image_url'])})
+CATEGORY_FIELDS = FieldPlan(Category)
+
+
+def dumps(payload):
+    if orjson is not None:
+        # Same rule as Flask's provider: compact unless set otherwise or debugging.
+        compact = current_app.json.compact
+        pretty = compact is False or (compact is None and current_app.debug)
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(payload, option=option)
+    return current_app.json.dumps(payload).encode('utf-8')
+
+
+def json_response(payload):
+    with timed('serialize'):
+        if orjson is None:
+            return jsonify(payload)
+        return current_app.response_class(dumps(payload), mimetype='application/json')
+
+
+def wants_stream(request):
+    if request.args.get('stream') == '1':
+        return True
+    accept = request.accept_mimetypes
+    return accept[NDJSON_MIMETYPE] > accept['application/json']
+
+
+def iso_default(value):
+    # Dates the way orjson writes them, so a line reads the same with or
+    # without it installed.
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_line(payload):
+    if orjson is not None:
+        return orjson.dumps(payload) + b'\n'
+    return json.dumps(payload, separators=(',', ':'), default=iso_default).encode('utf-8') + b'\n'
+
+
+def stream_rows(plan, query):
+    # yield_per turns on stream_results, which is a named server-side cursor on
+    # psycopg2 and plain incremental fetching on SQLite, so only one batch of
+    # rows is ever held in memory.
+    for row in query.yield_per(STREAM_BATCH_SIZE):
+        yield encode_line(plan.row(row))
+
+
+def ndjson_response(lines):
+    return current_app.response_class(stream_with_context(lines), mimetype=NDJSON_MIMETYPE)
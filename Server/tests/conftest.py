@@ -0,0 +1,116 @@
+import contextvars
+import os
+import random
+from contextlib import contextmanager
+
+import pytest
+
+os.environ.setdefault('SECRET_KEY', 'test')
+
+from flask.testing import FlaskClient
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import create_app
+from models import db, Animal, Category
+
+
+class IsolatedClient(FlaskClient):
+    # Each request runs in a fresh context, so it gets its own app context, g
+    # and session as in production, rather than sharing the test's.
+    def open(self, *args, **kwargs):
+        return contextvars.Context().run(super().open, *args, **kwargs)
+
+
+@pytest.fixture(scope='module')
+def app_config(tmp_path_factory):
+    # A module may override this fixture to run its tests against an app
+    # configured differently. The database is a file so that concurrent
+    # requests get connections of their own.
+    path = tmp_path_factory.mktemp('db') / 'test.db'
+    return {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'IMAGE_DIR': str(tmp_path_factory.mktemp('media')),
+        'BCRYPT_LOG_ROUNDS': 4,
+        'PASSWORD_POOL_WORKERS': 0,
+        'AUTH_RATE_LIMIT_ENABLED': False,
+        # Caches are keyed on table versions, which restart at zero with every
+        # fresh schema, so one test could otherwise read another's pages.
+        'CACHE_MAXSIZE': 0,
+        'PAYLOAD_CACHE_MAXSIZE': 0,
+        # Jobs run inline, so their effects are visible when a request returns.
+        'JOB_WORKERS': 0,
+    }
+
+
+@pytest.fixture(scope='module')
+def app(app_config):
+    # One app per module: create_app configures module-level singletons (jobs,
+    # cache, broker, replicas), so only one app can be live at a time.
+    app = create_app(app_config)
+    app.test_client_class = IsolatedClient
+    return app
+
+
+@pytest.fixture
+def database(app):
+    with app.app_context():
+        # Primary only: replicas get their copy from the primary, and db keeps
+        # the bind keys of every app a module has created.
+        db.drop_all(bind_key=None)
+        db.create_all(bind_key=None)
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app, database):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_header(app):
+    def header(user_id, role='user'):
+        with app.app_context():
+            token = create_access_token(identity={'id': user_id, 'role': role, 'username': f'{role}{user_id}'})
+        return {'Authorization': f'Bearer {token}'}
+    return header
+
+
+@pytest.fixture
+def seed_animals(database):
+    def seed(count, farmers=5, status='Available'):
+        rng = random.Random(count)
+        db.session.execute(Category.__table__.insert(), [{'name': f'category-{i}'} for i in range(1, 4)])
+        db.session.execute(Animal.__table__.insert(), [{
+            'type': rng.choice(['goat', 'cow', 'sheep']),
+            'breed': f'breed-{i}',
+            'price': round(rng.uniform(500, 5000), 2),
+            'status': status,
+            'description': 'test animal',
+            'farmer_id': rng.randint(1, farmers),
+            'category_id': rng.randint(1, 3),
+        } for i in range(count)])
+        db.session.commit()
+        return dict(db.session.query(Animal.id, Animal.price).all())
+    return seed
+
+
+@pytest.fixture
+def statements(database):
+    # Usage: `with statements() as sql:` records every SQL statement run on
+    # the primary engine inside the block, from any thread.
+    @contextmanager
+    def record():
+        sql = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            sql.append(statement)
+
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield sql
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return record
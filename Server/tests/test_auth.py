@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from flask_jwt_extended import create_access_token
+
+
+def token(app, user_id, **kwargs):
+    with app.app_context():
+        return create_access_token(identity={'id': user_id, 'role': 'user', 'username': f'user{user_id}'}, **kwargs)
+
+
+def test_repeated_token_is_served_from_the_cache(app, client):
+    # Fails if flask-jwt-extended stops routing decodes through the
+    # _decode_jwt_from_config hook that CachingJWTManager overrides.
+    tokens = app.extensions['flask-jwt-extended'].tokens
+    headers = {'Authorization': f'Bearer {token(app, 1)}'}
+    hits, misses = tokens.hits, tokens.misses
+    assert client.get('/cart', headers=headers).status_code == 404
+    assert (tokens.hits, tokens.misses) == (hits, misses + 1)
+    assert client.get('/cart', headers=headers).status_code == 404
+    assert (tokens.hits, tokens.misses) == (hits + 1, misses + 1)
+
+
+def test_cached_token_expires_with_its_exp(app, client):
+    headers = {'Authorization': f'Bearer {token(app, 1, expires_delta=timedelta(seconds=1))}'}
+    assert client.get('/cart', headers=headers).status_code == 404
+    time.sleep(1.1)
+    assert client.get('/cart', headers=headers).status_code == 401
+
+
+def test_tampered_token_is_rejected(app, client):
+    good = token(app, 1)
+    assert client.get('/cart', headers={'Authorization': f'Bearer {good}'}).status_code == 404
+    tampered = good[:-2] + ('AA' if good[-2:] != 'AA' else 'BB')
+    assert client.get('/cart', headers={'Authorization': f'Bearer {tampered}'}).status_code == 422
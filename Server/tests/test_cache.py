@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from cache import LRUCache, MISSING, QueryCache, RedisCache, cache
+from compression import payloads
+from models import db, Animal
+
+
+class FakeRedis:
+    # The part of the redis-py client RedisCache uses, kept in a dict.
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value.encode('utf-8'), time.monotonic() + ex if ex else None)
+
+    def incr(self, key):
+        value = int(self.get(key) or 0) + 1
+        self.data[key] = (str(value).encode('utf-8'), None)
+        return value
+
+
+@pytest.fixture(params=['lru', 'redis'])
+def backend(request, monkeypatch):
+    backend = LRUCache(maxsize=100) if request.param == 'lru' else RedisCache(FakeRedis())
+    monkeypatch.setattr(cache, 'backend', backend)
+    # Finished bodies would be served before the query cache is asked.
+    monkeypatch.setattr(payloads, 'backend', LRUCache(maxsize=0))
+    return backend
+
+
+def test_backends_store_and_version(backend):
+    queries = QueryCache(backend)
+    calls = []
+
+    def load():
+        calls.append(1)
+        return [{'id': 1, 'price': 10.5}]
+
+    assert queries.get_or_set('animals', {'limit': 5}, load) == [{'id': 1, 'price': 10.5}]
+    assert queries.get_or_set('animals', {'limit': 5}, load) == [{'id': 1, 'price': 10.5}]
+    assert len(calls) == 1 and backend.hits == 1
+    queries.invalidate('animals')
+    queries.get_or_set('animals', {'limit': 5}, load)
+    assert len(calls) == 2
+    # Other namespaces and table versions are keyed apart.
+    assert backend.get(queries.key('categories', {'limit': 5})) is MISSING
+    assert backend.get(queries.key('animals', {'limit': 5}, version=3)) is MISSING
+
+
+def test_lru_versions_stay_bounded(client, auth_header, seed_animals, backend):
+    if not isinstance(backend, LRUCache):
+        pytest.skip('only the in-process backend keeps versions in memory')
+    seed_animals(30, farmers=1)
+    headers = auth_header(1, role='farmer')
+    for animal_id in range(1, 31):
+        client.get(f'/animals/{animal_id}')
+        assert client.patch(f'/farmer/animals/{animal_id}', json={'breed': 'boer'}, headers=headers).status_code == 200
+    assert set(backend._versions) <= {'animals', 'animal', 'categories'}
+
+
+def test_writes_invalidate_cached_reads(client, auth_header, seed_animals, backend):
+    seed_animals(3, farmers=1)
+    farmer = auth_header(1, role='farmer')
+
+    def listing():
+        return {row['id']: row for row in client.get('/animals?limit=50').json}
+
+    assert len(listing()) == 3 and client.get('/animals/1').json['breed'] == 'breed-0'
+    hits = backend.hits
+    assert len(listing()) == 3 and client.get('/animals/1').json['breed'] == 'breed-0'
+    assert backend.hits == hits + 2
+
+    # add_animal
+    assert client.post('/farmer/animals', json={'type': 'goat', 'breed': 'boer', 'price': 10, 'description': 'new',
+                                                'farmer_id': 1}, headers=farmer).status_code == 201
+    assert len(listing()) == 4 and client.get('/animals/4').json['breed'] == 'boer'
+
+    # update_animal
+    assert client.patch('/farmer/animals/1', json={'breed': 'saanen'}, headers=farmer).status_code == 200
+    assert listing()[1]['breed'] == 'saanen' and client.get('/animals/1').json['breed'] == 'saanen'
+
+    # checkout
+    buyer = auth_header(2)
+    client.post('/cart', json={'animal_id': 2}, headers=buyer)
+    assert client.post('/cart/checkout', headers=buyer).status_code == 200
+    assert listing()[2]['status'] == 'Sold Out' and client.get('/animals/2').json['status'] == 'Sold Out'
+
+    # add_category
+    names = [row['name'] for row in client.get('/animals/categories').json]
+    assert client.post('/categories', json={'name': 'poultry'}, headers=farmer).status_code == 201
+    assert [row['name'] for row in client.get('/animals/categories').json] == names + ['poultry']
+    assert db.session.get(Animal, 1).breed == 'saanen'
@@ -0,0 +1,62 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from models import Cart, CartItem
+
+THREADS = 6
+ADDS_PER_THREAD = 20
+
+
+@pytest.mark.parametrize('lines', [1, 10, 30])
+def test_cart_view_is_one_query(client, auth_header, seed_animals, statements, lines):
+    # N+1 regression check: GET /cart stays one SELECT however many lines the
+    # cart has.
+    seed_animals(lines)
+    headers = auth_header(1)
+    for animal_id in range(1, lines + 1):
+        assert client.post('/cart', json={'animal_id': animal_id, 'quantity': 2}, headers=headers).status_code == 201
+    with statements() as sql:
+        response = client.get('/cart', headers=headers)
+    assert response.status_code == 200
+    body = response.json
+    assert len(body['items']) == lines
+    assert abs(body['total_price'] - sum(item['line_total'] for item in body['items'])) < 0.01
+    assert len(sql) == 1, sql
+
+
+def test_concurrent_adds_keep_one_cart_and_consistent_totals(app, client, auth_header, seed_animals):
+    # Stress test: threads add to the same users' carts at once. There must be
+    # one pending cart per user, with no lost updates to quantities or totals.
+    prices = seed_animals(10)
+    headers = {user_id: auth_header(user_id) for user_id in (1, 2)}
+    expected = {user_id: {'quantity': 0, 'total': 0.0} for user_id in headers}
+    lock = threading.Lock()
+    barrier = threading.Barrier(THREADS)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        barrier.wait()
+        for _ in range(ADDS_PER_THREAD):
+            user_id = rng.choice(list(headers))
+            animal_id, quantity = rng.randint(1, 10), rng.randint(1, 3)
+            response = client.post('/cart', json={'animal_id': animal_id, 'quantity': quantity}, headers=headers[user_id])
+            assert response.status_code == 201, response.json
+            with lock:
+                expected[user_id]['quantity'] += quantity
+                expected[user_id]['total'] += prices[animal_id] * quantity
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(worker, range(THREADS)))
+
+    for user_id, want in expected.items():
+        carts = Cart.query.filter_by(user_id=user_id, status='Pending').all()
+        assert len(carts) == 1, f'user {user_id} has {len(carts)} pending carts'
+        lines = CartItem.query.filter_by(cart_id=carts[0].id).all()
+        assert len({line.animal_id for line in lines}) == len(lines)
+        assert sum(line.quantity for line in lines) == want['quantity']
+        assert abs(sum(line.quantity * line.unit_price for line in lines) - carts[0].total_price) < 0.01
+        assert abs(carts[0].total_price - want['total']) < 0.01
@@ -0,0 +1,50 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from carts import add_item
+from models import db, Animal, Cart, CartItem
+from sales import check_summary
+
+THREADS = 6
+
+
+def test_concurrent_checkouts_never_sell_an_animal_twice(app, database, auth_header, seed_animals):
+    # Stress test: shoppers whose carts overlap check out at once. Each animal
+    # goes to at most one of them, every loser gets a clean 409, and the
+    # sales summary matches the confirmed carts.
+    animals, users = 30, 40
+    seed_animals(animals)
+    rng = random.Random(users)
+    for user_id in range(1, users + 1):
+        for animal_id in rng.sample(range(1, animals + 1), 3):
+            add_item(user_id, animal_id, 1)
+    db.session.commit()
+    headers = [auth_header(user_id) for user_id in range(1, users + 1)]
+
+    def worker(chunk):
+        client = app.test_client()
+        return [client.post('/cart/checkout', headers=user_headers).status_code for user_headers in chunk]
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        statuses = [status for chunk in pool.map(worker, [headers[i::THREADS] for i in range(THREADS)]) for status in chunk]
+
+    sold_per_animal = db.session.query(CartItem.animal_id, db.func.count()) \
+        .join(Cart, Cart.id == CartItem.cart_id).filter(Cart.status == 'Confirmed') \
+        .group_by(CartItem.animal_id).all()
+    assert set(statuses) <= {200, 409}, sorted(set(statuses))
+    assert statuses.count(200) == Cart.query.filter_by(status='Confirmed').count() > 0
+    assert all(count == 1 for _, count in sold_per_animal), sold_per_animal
+    assert Animal.query.filter_by(status='Sold Out').count() == len(sold_per_animal)
+    assert not check_summary()
+
+
+def test_checkout_conflict_names_the_unavailable_animals(client, auth_header, seed_animals):
+    seed_animals(3)
+    first, second = auth_header(1), auth_header(2)
+    for headers in (first, second):
+        assert client.post('/cart', json={'animal_id': 2}, headers=headers).status_code == 201
+    assert client.post('/cart/checkout', headers=first).status_code == 200
+    response = client.post('/cart/checkout', headers=second)
+    assert response.status_code == 409
+    assert response.json['unavailable'] == [2]
+    assert Cart.query.filter_by(user_id=2).one().status == 'Pending'
@@ -0,0 +1,72 @@
+import gzip
+
+import pytest
+
+import compression
+from cache import LRUCache
+from compression import LEVELS, payloads
+from models import db, Animal
+
+
+def decode(response):
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'br':
+        return compression.brotli.decompress(response.data)
+    if encoding == 'gzip':
+        return gzip.decompress(response.data)
+    return response.data
+
+
+@pytest.fixture
+def cached_payloads(monkeypatch):
+    backend = LRUCache(maxsize=100, ttl=60)
+    monkeypatch.setattr(payloads, 'backend', backend)
+    return backend
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('gzip', 'gzip'),
+    ('br', 'br'),
+    ('gzip, br', 'br'),
+    ('br;q=0, gzip', 'gzip'),
+    ('identity', None),
+    (None, None),
+])
+def test_negotiation(client, seed_animals, accept, expected):
+    if expected == 'br' and compression.brotli is None:
+        pytest.skip('brotli is not installed')
+    seed_animals(50)
+    identity = client.get('/animals?limit=50').data
+    response = client.get('/animals?limit=50', headers={'Accept-Encoding': accept} if accept else {})
+    assert response.headers.get('Content-Encoding') == expected
+    assert 'Accept-Encoding' in response.vary
+    assert decode(response) == identity
+
+
+def test_small_bodies_are_not_compressed(client, seed_animals):
+    seed_animals(50)
+    small = client.get('/animals?limit=1', headers={'Accept-Encoding': 'gzip'})
+    assert len(small.data) < 1024 and 'Content-Encoding' not in small.headers
+    large = client.get('/animals?limit=50', headers={'Accept-Encoding': 'gzip'})
+    assert large.headers['Content-Encoding'] == 'gzip'
+
+
+def test_cached_bodies_use_request_path_levels(client, seed_animals, cached_payloads):
+    seed_animals(50)
+    identity = client.get('/animals?limit=50').data
+    response = client.get('/animals?limit=50', headers={'Accept-Encoding': 'gzip'})
+    assert response.data == gzip.compress(identity, compresslevel=LEVELS['gzip'], mtime=0)
+
+
+def test_writes_invalidate_cached_bodies(client, auth_header, seed_animals, cached_payloads):
+    seed_animals(50)
+    headers = {'Accept-Encoding': 'gzip'}
+    first = client.get('/animals?limit=50', headers=headers)
+    assert client.get('/animals?limit=50', headers=headers).data == first.data
+    assert cached_payloads.hits == 1
+
+    farmer_id = db.session.get(Animal, 1).farmer_id
+    response = client.patch('/farmer/animals/1', json={'breed': 'boer'}, headers=auth_header(farmer_id, role='farmer'))
+    assert response.status_code == 200
+    after = client.get('/animals?limit=50', headers=headers)
+    assert b'"boer"' in decode(after) and b'"boer"' not in decode(first)
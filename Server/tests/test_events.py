@@ -0,0 +1,33 @@
+import pytest
+
+from events import broker
+from models import db, Animal
+
+
+@pytest.fixture
+def subscriber():
+    subscriber = broker.subscribe({})
+    yield subscriber
+    broker.unsubscribe(subscriber)
+
+
+def test_animal_update_publishes_updated(client, auth_header, seed_animals, subscriber):
+    seed_animals(3)
+    animal = db.session.get(Animal, 1)
+    headers = auth_header(animal.farmer_id, role='farmer')
+    response = client.patch('/farmer/animals/1', json={'price': 1234.5, 'breed': 'boer'}, headers=headers)
+    assert response.status_code == 200
+    event = subscriber.get(timeout=1)
+    assert event.kind == 'updated'
+    assert (event.data['id'], event.data['price'], event.data['breed']) == (1, 1234.5, 'boer')
+    assert subscriber.get(timeout=0) is None
+
+
+def test_rejected_update_publishes_nothing(client, auth_header, seed_animals, subscriber):
+    seed_animals(3)
+    animal = db.session.get(Animal, 1)
+    headers = auth_header(animal.farmer_id, role='farmer')
+    assert client.patch('/farmer/animals/1', json={'price': -1}, headers=headers).status_code == 400
+    other = auth_header(animal.farmer_id + 1, role='farmer')
+    assert client.patch('/farmer/animals/1', json={'price': 1}, headers=other).status_code == 404
+    assert subscriber.get(timeout=0) is None
@@ -0,0 +1,157 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import app as routes
+from idempotency import ABANDONED_AFTER, prune_idempotency_keys
+from models import db, Cart, CartItem, IdempotencyKey
+from versions import utcnow
+
+THREADS = 8
+
+
+def send_duplicates(app, method, url, headers, json=None):
+    # Fires the same request from every thread at once, then retries each 409
+    # the way a client honouring Retry-After would, until all have an answer.
+    barrier = threading.Barrier(THREADS)
+
+    def send(_):
+        client = app.test_client()
+        barrier.wait()
+        response = client.open(url, method=method, json=json, headers=headers)
+        while response.status_code == 409 and 'Retry-After' in response.headers:
+            response = client.open(url, method=method, json=json, headers=headers)
+        return response.status_code, response.headers.get('Idempotent-Replayed') == 'true', response.get_data()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return list(pool.map(send, range(THREADS)))
+
+
+def cart_quantity(user_id):
+    return db.session.query(db.func.coalesce(db.func.sum(CartItem.quantity), 0)) \
+        .join(Cart, Cart.id == CartItem.cart_id).filter(Cart.user_id == user_id).scalar()
+
+
+def test_concurrent_duplicate_adds_run_once(app, database, auth_header, seed_animals):
+    seed_animals(3)
+    results = send_duplicates(app, 'POST', '/cart', {**auth_header(1), 'Idempotency-Key': 'add-1'},
+                              json={'animal_id': 1, 'quantity': 2})
+    assert {status for status, _, _ in results} == {201}
+    assert sum(not replayed for _, replayed, _ in results) == 1
+    assert len({body for _, _, body in results}) == 1
+    assert cart_quantity(1) == 2
+
+
+def test_concurrent_duplicate_checkouts_confirm_one_order(app, database, client, auth_header, seed_animals):
+    seed_animals(3)
+    headers = auth_header(1)
+    client.post('/cart', json={'animal_id': 1}, headers=headers)
+    results = send_duplicates(app, 'POST', '/cart/checkout', {**headers, 'Idempotency-Key': 'checkout-1'})
+    assert {status for status, _, _ in results} == {200}
+    assert sum(not replayed for _, replayed, _ in results) == 1
+    assert Cart.query.filter_by(user_id=1, status='Confirmed').count() == 1
+
+
+def test_replay_touches_only_the_key_table(client, auth_header, seed_animals, statements):
+    seed_animals(3)
+    headers = {**auth_header(1), 'Idempotency-Key': 'add-1'}
+    first = client.post('/cart', json={'animal_id': 1, 'quantity': 2}, headers=headers)
+    with statements() as sql:
+        # Same content in a different key order is the same request.
+        again = client.post('/cart', json={'quantity': 2, 'animal_id': 1}, headers=headers)
+    assert again.status_code == 201 and again.headers['Idempotent-Replayed'] == 'true'
+    assert again.get_data() == first.get_data()
+    assert len(sql) == 1 and 'idempotency_keys' in sql[0] and 'cart' not in sql[0].replace('idempotency_keys', '')
+    assert cart_quantity(1) == 2
+
+
+def test_key_misuse(client, auth_header, seed_animals):
+    seed_animals(3)
+    headers = auth_header(1)
+    assert client.post('/cart', json={'animal_id': 1}, headers={**headers, 'Idempotency-Key': 'k'}).status_code == 201
+    assert client.post('/cart', json={'animal_id': 2}, headers={**headers, 'Idempotency-Key': 'k'}).status_code == 422
+    assert client.post('/cart', json={'animal_id': 2}, headers={**headers, 'Idempotency-Key': ''}).status_code == 400
+    # Keys are per user: another user's 'k' is a new request.
+    response = client.post('/cart', json={'animal_id': 2}, headers={**auth_header(2), 'Idempotency-Key': 'k'})
+    assert response.status_code == 201 and 'Idempotent-Replayed' not in response.headers
+
+
+def test_retried_delete_replays_its_response(client, auth_header, seed_animals):
+    seed_animals(3)
+    headers = auth_header(1)
+    client.post('/cart', json={'animal_id': 1}, headers=headers)
+    url = f'/cart/item/{CartItem.query.one().id}'
+    first = client.delete(url, headers={**headers, 'Idempotency-Key': 'remove-1'})
+    second = client.delete(url, headers={**headers, 'Idempotency-Key': 'remove-1'})
+    assert first.status_code == second.status_code == 200 and second.headers['Idempotent-Replayed'] == 'true'
+    assert client.delete(url, headers=headers).status_code == 404
+
+
+def test_failures_before_commit_free_the_key(client, auth_header, seed_animals):
+    seed_animals(3)
+    headers = {**auth_header(1), 'Idempotency-Key': 'add-missing'}
+    # A 404 commits nothing and is stored like any other answer.
+    assert client.post('/cart', json={'animal_id': 99}, headers=headers).status_code == 404
+    assert client.post('/cart', json={'animal_id': 99}, headers=headers).headers['Idempotent-Replayed'] == 'true'
+
+
+def test_crash_after_commit_does_not_apply_twice(app, client, auth_header, seed_animals, monkeypatch):
+    # The response is committed together with the checkout, so a request that
+    # dies right after its commit leaves a replayable key behind rather than
+    # one a retry could take over and run again.
+    seed_animals(3)
+    headers = auth_header(1)
+    client.post('/cart', json={'animal_id': 1}, headers=headers)
+
+    def crash(*args, **kwargs):
+        raise RuntimeError('worker died')
+
+    monkeypatch.setattr(routes, 'publish_animals', crash)
+    app.testing = False
+    try:
+        assert client.post('/cart/checkout', headers={**headers, 'Idempotency-Key': 'c'}).status_code == 500
+    finally:
+        app.testing = True
+    monkeypatch.undo()
+    IdempotencyKey.query.update({'created_at': utcnow() - timedelta(seconds=ABANDONED_AFTER + 1)})
+    db.session.commit()
+    retry = client.post('/cart/checkout', headers={**headers, 'Idempotency-Key': 'c'})
+    assert retry.status_code == 200 and retry.headers['Idempotent-Replayed'] == 'true'
+    assert Cart.query.filter_by(user_id=1, status='Confirmed').count() == 1
+
+
+def test_taken_over_request_does_not_commit(client, auth_header, seed_animals, monkeypatch):
+    # A request so slow that a retry took its key over must not commit its
+    # change as well.
+    seed_animals(3)
+    headers = {**auth_header(1), 'Idempotency-Key': 'slow'}
+    add_item = routes.add_item
+
+    def slow_add_item(*args):
+        with db.engine.begin() as connection:
+            connection.execute(IdempotencyKey.__table__.update().values(created_at=utcnow()))
+        return add_item(*args)
+
+    monkeypatch.setattr(routes, 'add_item', slow_add_item)
+    response = client.post('/cart', json={'animal_id': 1}, headers=headers)
+    assert response.status_code == 409
+    assert cart_quantity(1) == 0
+
+
+def test_expired_and_abandoned_keys_run_again(client, auth_header, seed_animals, app):
+    seed_animals(3)
+    headers = auth_header(1)
+    client.post('/cart', json={'animal_id': 1}, headers={**headers, 'Idempotency-Key': 'old'})
+    IdempotencyKey.query.update({'created_at': utcnow() - timedelta(seconds=app.config['IDEMPOTENCY_TTL'] + 1)})
+    db.session.add(IdempotencyKey(user_id=1, key='stuck', fingerprint='',
+                                  created_at=utcnow() - timedelta(seconds=ABANDONED_AFTER + 1)))
+    db.session.commit()
+    for key, animal_id in (('old', 1), ('stuck', 2)):
+        response = client.post('/cart', json={'animal_id': animal_id}, headers={**headers, 'Idempotency-Key': key})
+        assert response.status_code == 201 and 'Idempotent-Replayed' not in response.headers
+    assert cart_quantity(1) == 3
+
+    IdempotencyKey.query.update({'created_at': utcnow() - timedelta(days=30)})
+    db.session.commit()
+    prune_idempotency_keys()
+    assert IdempotencyKey.query.count() == 0
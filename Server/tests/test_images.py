@@ -0,0 +1,101 @@
+import io
+import os
+
+import pytest
+
+from images import THUMBNAIL_SIZES, make_thumbnails, store_image
+from models import db, Animal
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def photo(width=1200, height=800, seed=40):
+    image = Image.effect_noise((width, height), seed).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def media(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMAGE_DIR', str(tmp_path))
+
+
+@pytest.fixture
+def farmer(auth_header, seed_animals):
+    # Every animal belongs to farmer 1.
+    seed_animals(3, farmers=1)
+    return auth_header(1, role='farmer')
+
+
+def upload(client, headers, data, animal_id=1):
+    return client.post(f'/farmer/animals/{animal_id}/image', data={'image': (io.BytesIO(data), 'photo.jpg')},
+                       headers=headers)
+
+
+def test_upload_stores_the_original_and_renders_thumbnails(client, farmer):
+    data = photo()
+    response = upload(client, farmer, data)
+    assert response.status_code == 201
+    body = response.json
+    assert db.session.get(Animal, 1).image_url == body['image_url']
+    assert client.get(body['image_url']).get_data() == data
+
+    # Jobs run inline under test, so the thumbnails exist by now.
+    for size, pixels in THUMBNAIL_SIZES.items():
+        thumbnail = client.get(body['thumbnails'][size])
+        assert thumbnail.status_code == 200 and thumbnail.mimetype == 'image/jpeg'
+        assert 'immutable' in thumbnail.headers['Cache-Control']
+        with Image.open(io.BytesIO(thumbnail.get_data())) as image:
+            assert max(image.size) == pixels
+    assert client.get('/animals/1').json['thumbnails'] == body['thumbnails']
+
+
+def test_identical_uploads_are_stored_once(app, client, farmer):
+    data = photo()
+    first = upload(client, farmer, data, animal_id=1).json
+    second = upload(client, farmer, data, animal_id=2).json
+    assert first == second
+    originals = [name for _, _, names in os.walk(app.config['IMAGE_DIR']) for name in names
+                 if not name.startswith('.') and '-' not in name]
+    assert len(originals) == 1
+
+
+def test_missing_thumbnail_redirects_to_the_original(app, client):
+    with app.app_context():
+        name = store_image(photo(), app.config['IMAGE_DIR'])
+    response = client.get(f"/images/thumbs/{name.split('.')[0]}-md.jpg")
+    assert response.status_code == 302 and response.headers['Location'] == f'/images/{name}'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    with app.app_context():
+        make_thumbnails(name)
+    assert client.get(f"/images/thumbs/{name.split('.')[0]}-md.jpg").status_code == 200
+
+
+def test_range_and_conditional_requests(client, farmer):
+    body = upload(client, farmer, photo()).json
+    ranged = client.get(body['image_url'], headers={'Range': 'bytes=0-1023'})
+    assert ranged.status_code == 206 and len(ranged.get_data()) == 1024
+    card = client.get(body['thumbnails']['md'])
+    revalidated = client.get(body['thumbnails']['md'], headers={'If-None-Match': card.headers['ETag']})
+    assert revalidated.status_code == 304 and not revalidated.get_data()
+
+
+def test_bad_uploads_are_rejected(app, client, farmer, auth_header, monkeypatch):
+    assert upload(client, farmer, b'not an image at all').status_code == 400
+    assert upload(client, farmer, photo()[:200]).status_code == 400
+    assert upload(client, auth_header(2, role='farmer'), photo()).status_code == 404
+    assert upload(client, {}, photo()).status_code == 401
+    monkeypatch.setitem(app.config, 'IMAGE_MAX_PIXELS', 1000 * 1000)
+    response = upload(client, farmer, photo(1200, 1000))
+    assert response.status_code == 400 and 'dimensions' in response.json['message']
+    assert db.session.get(Animal, 1).image_url is None
+
+
+def test_oversized_stored_image_is_skipped_by_the_job(app, monkeypatch):
+    with app.app_context():
+        name = store_image(photo(), app.config['IMAGE_DIR'])
+        monkeypatch.setitem(app.config, 'IMAGE_MAX_PIXELS', 100)
+        make_thumbnails(name)
+    digest = name.split('.')[0]
+    assert not os.path.exists(os.path.join(app.config['IMAGE_DIR'], 'thumbs', digest[:2], f'{digest}-sm.jpg'))
@@ -0,0 +1,86 @@
+import io
+import json
+
+import pytest
+
+from models import db, Animal, Category
+
+URL = '/farmer/animals/bulk'
+
+
+@pytest.fixture
+def farmer(auth_header, database):
+    db.session.execute(Category.__table__.insert(), [{'name': f'category-{i}'} for i in range(1, 4)])
+    db.session.commit()
+    return auth_header(7, role='farmer')
+
+
+def animals():
+    return db.session.query(Animal.type, Animal.breed, Animal.price, Animal.farmer_id, Animal.category_id) \
+        .order_by(Animal.id).all()
+
+
+def test_json_array(client, farmer):
+    rows = [{'type': 'goat', 'breed': 'boer', 'price': 120, 'category_id': 1, 'farmer_id': 99},
+            {'type': 'cow', 'breed': 'jersey', 'price': '950.5'}]
+    response = client.post(URL, json=rows, headers=farmer)
+    assert response.status_code == 201 and response.json == {'inserted': 2, 'errors': []}
+    # farmer_id always comes from the token.
+    assert animals() == [('goat', 'boer', 120, 7, 1), ('cow', 'jersey', 950.5, 7, None)]
+
+
+def test_ndjson_with_partial_errors(client, farmer):
+    body = '\n'.join([
+        json.dumps({'type': 'goat', 'breed': 'boer', 'price': 120}),
+        '{not json',
+        '',
+        json.dumps({'type': 'sheep', 'breed': 'dorper', 'price': -1}),
+        json.dumps({'type': 'sheep', 'breed': 'merino', 'price': 300}),
+    ])
+    response = client.post(URL, data=body, content_type='application/x-ndjson', headers=farmer)
+    assert response.status_code == 201
+    assert response.json['inserted'] == 2
+    assert [error['row'] for error in response.json['errors']] == [2, 4]
+    assert [row.breed for row in animals()] == ['boer', 'merino']
+
+
+@pytest.mark.parametrize('as_file', [False, True])
+def test_csv(client, farmer, as_file):
+    body = 'type,breed,price,category_id,status\ngoat,boer,120,2,\ncow,jersey,abc,,\nsheep,dorper,80,,Pending\n'
+    if as_file:
+        response = client.post(URL, data={'file': (io.BytesIO(body.encode()), 'animals.csv')}, headers=farmer)
+    else:
+        response = client.post(URL, data=body, content_type='text/csv', headers=farmer)
+    assert response.status_code == 201
+    assert response.json == {'inserted': 2, 'errors': [
+        {'row': 2, 'message': 'price, farmer_id and category_id must be numeric'}]}
+    assert animals() == [('goat', 'boer', 120, 7, 2), ('sheep', 'dorper', 80, 7, None)]
+
+
+@pytest.mark.parametrize('row, message', [
+    ({'type': 'goat', 'price': 1}, 'Missing fields: breed'),
+    ({'type': 'goat', 'breed': 'boer', 'price': 1, 'description': {'nested': True}}, 'description must be text'),
+    ({'type': ['goat'], 'breed': 'boer', 'price': 1}, 'type must be text'),
+    ({'type': 'goat', 'breed': 'b' * 51, 'price': 1}, 'breed must be at most 50 characters'),
+    ({'type': 'goat', 'breed': 'boer', 'price': 1, 'status': {}}, 'status must be text'),
+    ({'type': 'goat', 'breed': 'boer', 'price': 1, 'status': 'Lost'}, 'Invalid status for animal.'),
+    ({'type': 'goat', 'breed': 'boer', 'price': 1, 'category_id': 99}, 'Unknown category_id 99'),
+    ({'type': 'goat', 'breed': 'boer', 'price': 1, 'category_id': 1.5}, 'price, farmer_id and category_id must be numeric'),
+    ({'type': 'goat', 'breed': 'boer', 'price': True}, 'price, farmer_id and category_id must be numeric'),
+    ({'type': 'goat', 'breed': 'boer', 'price': 'nan'}, 'Price must be a non-negative number.'),
+    ({'type': 'goat', 'breed': 'boer', 'price': 1, 'image_url': 5}, 'image_url must be text'),
+    ('goat', 'Expected an object'),
+])
+def test_bad_rows_are_reported_per_row(client, farmer, row, message):
+    good = {'type': 'cow', 'breed': 'jersey', 'price': 950}
+    response = client.post(URL, json=[good, row], headers=farmer)
+    assert response.status_code == 201
+    assert response.json == {'inserted': 1, 'errors': [{'row': 2, 'message': message}]}
+
+
+def test_rejected_uploads(client, farmer, auth_header):
+    assert client.post(URL, json=[{'type': 'goat'}], headers=farmer).status_code == 400
+    assert client.post(URL, json={'type': 'goat'}, headers=farmer).status_code == 400
+    assert client.post(URL, json=[]).status_code == 401
+    assert client.post(URL, json=[], headers=auth_header(1)).status_code == 403
+    assert animals() == []
@@ -0,0 +1,83 @@
+import threading
+
+from jobs import JobQueue, MemoryBackend
+from models import db, Cart, CartItem, FarmerSalesSummary
+from sales import check_summary, record_missing_sales
+
+
+class FlakyBackend(MemoryBackend):
+    # Raises from claim, like a locked SQLite queue file, the first few times.
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def claim(self, now):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('database is locked')
+        return super().claim(now)
+
+
+def make_queue(app, backend):
+    queue = JobQueue()
+    queue.configure(backend=backend, workers=1, poll_interval=0.01)
+    queue.app = app
+    return queue
+
+
+def test_worker_survives_backend_errors(app):
+    queue = make_queue(app, FlakyBackend(failures=3))
+    done = threading.Event()
+    queue.task('ping')(done.set)
+    try:
+        queue.enqueue('ping')
+        assert done.wait(5)
+        assert all(thread.is_alive() for thread in queue._threads)
+    finally:
+        queue.shutdown()
+
+
+def test_start_replaces_dead_workers(app):
+    queue = make_queue(app, MemoryBackend())
+    done = threading.Event()
+    queue.task('ping')(done.set)
+    try:
+        queue.start()
+        dead = threading.Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        queue._threads = [dead]
+        queue.enqueue('ping')
+        assert done.wait(5)
+        assert queue._threads[0] is not dead and queue._threads[0].is_alive()
+    finally:
+        queue.shutdown()
+
+
+def test_periodic_jobs_run_on_schedule(app):
+    queue = make_queue(app, MemoryBackend())
+    runs = threading.Semaphore(0)
+    queue.task('tick')(runs.release)
+    queue.every(0.05, 'tick')
+    try:
+        queue.start()
+        assert runs.acquire(timeout=5) and runs.acquire(timeout=5)
+    finally:
+        queue.shutdown()
+
+
+def test_sweep_records_carts_whose_job_was_lost(client, auth_header, seed_animals):
+    seed_animals(3)
+    headers = auth_header(1)
+    client.post('/cart', json={'animal_id': 1, 'quantity': 2}, headers=headers)
+    assert client.post('/cart/checkout', headers=headers).status_code == 200
+    # As if the process stopped with record_sales still queued in memory.
+    db.session.execute(db.update(Cart).values(sales_recorded=False, order_date=Cart.order_date))
+    db.session.execute(db.delete(FarmerSalesSummary))
+    db.session.commit()
+    assert check_summary()
+
+    assert record_missing_sales() == 1
+    assert check_summary() == []
+    assert record_missing_sales() == 0
+    assert CartItem.query.count() == 1
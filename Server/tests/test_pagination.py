@@ -0,0 +1,36 @@
+import base64
+import json
+
+import pytest
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+def raw_cursor(text):
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def test_round_trip():
+    assert decode_cursor(encode_cursor([42]), 1) == [42]
+    assert decode_cursor(encode_cursor([10.5, 42]), 2) == [10.5, 42]
+    assert decode_cursor(encode_cursor([10, 42]), 2) == [10, 42]
+
+
+@pytest.mark.parametrize('values, size', [
+    ([[]], 1),
+    ([1.5], 1),
+    ([True], 1),
+    (['7'], 1),
+    ([None, 3], 2),
+    ([{}, 3], 2),
+    ([1, 2], 1),
+])
+def test_rejects_wrong_shapes_and_types(values, size):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(raw_cursor(json.dumps(values)), size)
+
+
+@pytest.mark.parametrize('text', ['[NaN, 3]', '[Infinity, 3]', 'not json', '{"id": 3}'])
+def test_rejects_malformed(text):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(raw_cursor(text), 2)
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passwords import PasswordHasher, hash_rounds
+
+# Test password
+password = "password123"
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(rounds=4, workers=0)
+    hashed_password = hasher.hash(password)
+
+    assert hasher.verify(hashed_password, password)
+    assert not hasher.verify(hashed_password, "wrong-password")
+    assert hash_rounds(hashed_password) == 4
+    assert not hasher.needs_rehash(hashed_password)
+    assert PasswordHasher(rounds=5, workers=0).needs_rehash(hashed_password)
+
+
+def bench_logins(pool_sizes, logins=64, rounds=10, clients=32):
+    # Simulates a login burst: `clients` request threads each verifying a
+    # password against a hash of the configured cost.
+    hashed_password = PasswordHasher(rounds=rounds, workers=0).hash(password)
+    print(f"bcrypt cost {rounds}, {logins} logins from {clients} concurrent clients")
+    print(f"{'pool size':>10} {'logins/sec':>12}")
+    for size in pool_sizes:
+        hasher = PasswordHasher(rounds=rounds, workers=size, max_pending=logins)
+        hasher.verify(hashed_password, password)  # warm the pool
+        with ThreadPoolExecutor(max_workers=clients) as threads:
+            start = time.perf_counter()
+            results = list(threads.map(lambda _: hasher.verify(hashed_password, password), range(logins)))
+            elapsed = time.perf_counter() - start
+        hasher.shutdown()
+        assert all(results)
+        label = 'inline' if size == 0 else size
+        print(f"{label:>10} {logins / elapsed:>12.1f}")
+
+
+if __name__ == '__main__':
+    cores = os.cpu_count() or 1
+    sizes = [int(arg) for arg in sys.argv[1:]] or sorted({0, 1, 2, max(1, cores // 2), cores})
+    bench_logins(sizes)
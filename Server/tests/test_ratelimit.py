@@ -0,0 +1,77 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ratelimit import MAX_RETRY_AFTER, Limit, MemoryBuckets, RateLimiter, SQLiteBuckets, consume, limiter, make_buckets
+
+
+@pytest.fixture
+def limits(app):
+    # The suite runs with the limiter off; this turns it on for one test.
+    yield limiter.configure
+    limiter.init_app(app)
+
+
+def login(client, username='nobody', ip='10.0.0.1', path='/login'):
+    return client.post(path, json={'username': username, 'password': 'Wrong1234'}, environ_base={'REMOTE_ADDR': ip})
+
+
+def test_refill_and_waits():
+    limit = Limit(burst=2, rate=0.5)
+    states, waits = consume([None], [limit], now=100.0)
+    assert states == [(1.0, 100.0)] and waits == [0.0]
+    states, waits = consume(states, [limit], now=100.0)
+    states, waits = consume(states, [limit], now=100.0)
+    # Empty: one token comes back after 1 / rate seconds.
+    assert states == [(0.0, 100.0)] and waits == [2.0]
+    states, waits = consume(states, [limit], now=102.0)
+    assert waits == [0.0]
+    # A bucket with no refill stays empty.
+    assert consume([(0.0, 0.0)], [Limit(2, 0)], now=1e9)[1] == [math.inf]
+
+
+def test_ip_bucket_answers_429_with_retry_after(client, limits):
+    limits(ip=Limit(3, 1 / 60), user=Limit(0, 0))
+    assert [login(client).status_code for _ in range(3)] == [401] * 3
+    response = login(client)
+    assert response.status_code == 429
+    assert 59 <= int(response.headers['Retry-After']) <= 60
+    # Registration shares the address's bucket; other addresses have their own.
+    assert login(client, path='/register').status_code == 429
+    assert login(client, ip='10.0.0.2').status_code == 401
+    assert limiter.stats()['limited_ip'] == 2
+
+
+def test_user_bucket_stops_spraying_across_addresses(client, limits):
+    limits(ip=Limit(20, 10 / 60), user=Limit(5, 2 / 60))
+    statuses = [login(client, 'User200 ', ip=f'10.1.0.{n}').status_code for n in range(20)]
+    assert statuses == [401] * 5 + [429] * 15
+    assert login(client, 'user201', ip='10.1.0.99').status_code == 401
+
+
+def test_zero_rate_means_no_refill(app, client, limits, monkeypatch):
+    monkeypatch.setitem(app.config, 'AUTH_RATE_LIMIT_ENABLED', True)
+    monkeypatch.setitem(app.config, 'AUTH_IP_BURST', 2)
+    monkeypatch.setitem(app.config, 'AUTH_IP_PER_MINUTE', 0)
+    limiter.init_app(app)
+    assert [login(client).status_code for _ in range(2)] == [401, 401]
+    response = login(client)
+    assert response.status_code == 429 and response.headers['Retry-After'] == str(MAX_RETRY_AFTER)
+
+
+def test_shared_sqlite_buckets_enforce_one_limit(tmp_path):
+    path = str(tmp_path / 'buckets.db')
+    assert isinstance(make_buckets(f'sqlite:///{path}'), SQLiteBuckets)
+    assert isinstance(make_buckets(None), MemoryBuckets)
+    with pytest.raises(ValueError):
+        make_buckets('postgresql://localhost/limits')
+
+    # Two workers, as if in separate processes, sharing one bucket file.
+    workers = [RateLimiter() for _ in range(2)]
+    for worker in workers:
+        worker.configure(buckets=SQLiteBuckets(path), ip=Limit(20, 0.001))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        waits = list(pool.map(lambda n: workers[n % 2].check('10.2.0.1'), range(200)))
+    assert sum(1 for wait in waits if not wait) == 20
+    assert workers[0].buckets.size() == 1
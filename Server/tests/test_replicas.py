@@ -0,0 +1,122 @@
+import contextvars
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from models import db, Animal
+from replicas import read_from_replica, replicas
+
+REPLICAS = 2
+
+
+@pytest.fixture(scope='module')
+def app_config(app_config, tmp_path_factory):
+    directory = tmp_path_factory.mktemp('replicas')
+    uris = [f'sqlite:///{directory}/replica_{i}.db' for i in range(REPLICAS)]
+    return {**app_config, 'DB_REPLICA_URI': ','.join(uris)}
+
+
+@pytest.fixture
+def replicate(app, database):
+    # Stands in for replication: copies the primary's pages over each replica.
+    # Until it is called again the replicas lag behind the primary.
+    def copy():
+        with sqlite3.connect(db.engine.url.database) as primary:
+            for key in replicas.keys:
+                replica = sqlite3.connect(db.engines[key].url.database)
+                try:
+                    primary.backup(replica)
+                finally:
+                    replica.close()
+    copy()
+    return copy
+
+
+def in_request(app, check):
+    # A request of its own, apart from the test's session, which has written.
+    def run():
+        with app.test_request_context():
+            read_from_replica()
+            check()
+            db.session.rollback()
+    contextvars.Context().run(run)
+
+
+def counts():
+    return dict(replicas.queries)
+
+
+def used(before):
+    return {name for name, count in replicas.queries.items() if count > before[name]}
+
+
+def test_catalog_reads_go_to_the_replicas_in_turn(client, seed_animals, replicate):
+    seed_animals(5)
+    replicate()
+    seen = set()
+    for _ in range(REPLICAS):
+        before = counts()
+        response = client.get('/animals?limit=50')
+        assert response.status_code == 200 and len(response.json) == 5
+        assert len(used(before)) == 1 and 'primary' not in used(before)
+        seen |= used(before)
+    assert seen == set(replicas.keys)
+    assert replicas.stats()['replicas'] == REPLICAS
+    assert all(f'queries_{name}' in replicas.stats() for name in ('primary', *replicas.keys))
+
+
+def test_writes_go_to_the_primary_and_replicas_lag(client, auth_header, seed_animals, replicate):
+    seed_animals(5, farmers=1)
+    replicate()
+    before = counts()
+    response = client.post('/farmer/animals', json={'type': 'goat', 'breed': 'lagging', 'price': 10,
+                                                    'description': 'new', 'farmer_id': 1},
+                           headers=auth_header(1, role='farmer'))
+    assert response.status_code == 201
+    assert used(before) == {'primary'}
+    # Not on the replicas until the next copy.
+    assert client.get('/animals?breed=lagging').json == []
+    replicate()
+    assert [row['breed'] for row in client.get('/animals?breed=lagging').json] == ['lagging']
+
+
+def test_reads_after_a_write_stay_on_the_primary(app, seed_animals, replicate):
+    seed_animals(5)
+    replicate()
+
+    def check():
+        before = counts()
+        assert Animal.query.filter_by(breed='read-after-write').count() == 0
+        assert 'primary' not in used(before)
+        db.session.add(Animal(type='goat', breed='read-after-write', price=10, farmer_id=1))
+        db.session.flush()
+        before = counts()
+        assert Animal.query.filter_by(breed='read-after-write').count() == 1
+        assert used(before) == {'primary'}
+    in_request(app, check)
+
+
+def test_locking_reads_and_bulk_writes_use_the_primary(app, seed_animals, replicate):
+    seed_animals(5)
+    replicate()
+
+    def locking_read():
+        before = counts()
+        Animal.query.filter_by(id=1).with_for_update().first()
+        assert used(before) == {'primary'}
+
+    def bulk_write():
+        Animal.query.filter_by(id=1).update({'breed': 'bulk'})
+        before = counts()
+        assert Animal.query.filter_by(breed='bulk').count() == 1
+        assert used(before) == {'primary'}
+
+    in_request(app, locking_read)
+    in_request(app, bulk_write)
+
+
+def test_replicas_are_read_only(app, replicate):
+    with app.app_context(), db.engines[replicas.keys[0]].connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql("INSERT INTO categories (name) VALUES ('nope')")
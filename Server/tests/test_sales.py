@@ -0,0 +1,38 @@
+from models import db, Animal, Cart, FarmerSalesSummary
+from sales import check_summary, rebuild_summary, record_sales
+
+
+def checkout(client, headers, *animal_ids):
+    for animal_id in animal_ids:
+        assert client.post('/cart', json={'animal_id': animal_id}, headers=headers).status_code == 201
+    assert client.post('/cart/checkout', headers=headers).status_code == 200
+    return Cart.query.filter_by(status='Confirmed').order_by(Cart.id.desc()).first()
+
+
+def test_checkout_updates_the_farmer_summary(client, auth_header, seed_animals):
+    prices = seed_animals(3, farmers=1)
+    cart = checkout(client, auth_header(1), 1, 2)
+    assert cart.sales_recorded
+    response = client.get('/farmer/sales', headers=auth_header(1, role='farmer'))
+    assert response.status_code == 200
+    assert abs(response.json['totals']['revenue'] - prices[1] - prices[2]) < 0.01
+    assert response.json['totals']['units'] == 2
+    assert check_summary() == []
+
+
+def test_animals_without_a_farmer_are_left_out(client, auth_header, seed_animals):
+    prices = seed_animals(3, farmers=1)
+    db.session.get(Animal, 2).farmer_id = None
+    db.session.commit()
+    cart = checkout(client, auth_header(1), 1, 2)
+
+    # The job ran and claimed the cart instead of failing on the NULL farmer.
+    assert db.session.get(Cart, cart.id).sales_recorded
+    summary = FarmerSalesSummary.query.one()
+    assert (summary.farmer_id, summary.units) == (1, 1) and abs(summary.revenue - prices[1]) < 0.01
+    assert check_summary() == []
+
+    record_sales(cart.id)
+    rebuild_summary()
+    db.session.commit()
+    assert FarmerSalesSummary.query.count() == 1 and check_summary() == []
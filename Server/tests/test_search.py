@@ -0,0 +1,72 @@
+import pytest
+
+from models import db, Animal, Category
+from search import like_search, search_terms
+
+ANIMALS = [
+    # id 1: the term only in the free-text description
+    {'type': 'cow', 'breed': 'Friesian', 'description': 'calm, grazes beside the boer goats'},
+    # id 2: the term in the breed
+    {'type': 'goat', 'breed': 'Boer', 'description': 'meat breed'},
+    # id 3: no match
+    {'type': 'sheep', 'breed': 'Dorper', 'description': 'hardy'},
+    # id 4: accented, matched without the accent
+    {'type': 'goat', 'breed': 'Angora', 'description': 'mohair, née in Türkiye'},
+]
+
+
+@pytest.fixture
+def catalog(database):
+    db.session.add_all([Category(name='dairy'), Category(name='meat')])
+    db.session.flush()
+    for i, fields in enumerate(ANIMALS):
+        db.session.add(Animal(price=100 + i, farmer_id=1, category_id=1 if fields['type'] == 'cow' else 2, **fields))
+    db.session.commit()
+
+
+def search(client, q, **args):
+    response = client.get('/animals/search', query_string={'q': q, **args})
+    assert response.status_code == 200
+    return [row['id'] for row in response.json]
+
+
+def test_type_and_breed_outrank_description(client, catalog):
+    assert search(client, 'boer') == [2, 1]
+    assert search(client, 'boer goat') == [2, 1]
+
+
+def test_prefixes_diacritics_and_categories(client, catalog):
+    assert search(client, 'fries') == [1]
+    assert search(client, 'turkiye') == [4]
+    assert search(client, 'dairy') == [1]
+    assert search(client, 'BOER', type='cow') == [1]
+    assert search(client, 'unicorn') == []
+
+
+def test_index_follows_writes(client, catalog):
+    animal = db.session.get(Animal, 3)
+    animal.breed = 'Merino'
+    db.session.commit()
+    assert search(client, 'dorper') == [] and search(client, 'merino') == [3]
+    db.session.get(Category, 2).name = 'fibre'
+    db.session.commit()
+    assert sorted(search(client, 'fibre')) == [2, 3, 4]
+    db.session.delete(db.session.get(Animal, 2))
+    db.session.commit()
+    assert search(client, 'boer') == [1]
+
+
+def test_query_validation(client, catalog):
+    assert client.get('/animals/search?q=%20%21').status_code == 400
+    assert client.get('/animals/search?q=goat&min_price=cheap').status_code == 400
+    assert search_terms('Boer, goats; and   more!') == ['boer', 'goats', 'and', 'more']
+
+
+def test_like_search_fallback(catalog):
+    def ids(*terms):
+        return [animal.id for animal in like_search(Animal.query, list(terms)).all()]
+
+    assert ids('boer') == [1, 2]
+    assert ids('boer', 'meat') == [2]
+    assert ids('dairy') == [1]
+    assert ids('unicorn') == []
@@ -0,0 +1,24 @@
+import datetime
+import uuid
+
+import pytest
+
+import serializers
+from serializers import encode_line
+
+PAYLOAD = {
+    'created_at': datetime.datetime(2024, 5, 1, 9, 30, 15, 250000),
+    'paid_at': datetime.datetime(2024, 5, 1, 9, 30, tzinfo=datetime.timezone.utc),
+    'born': datetime.date(2023, 11, 2),
+    'token': uuid.UUID(int=7),
+    'price': 120.5,
+    'tags': ['goat', None],
+}
+
+
+def test_fallback_lines_match_orjson(monkeypatch):
+    pytest.importorskip('orjson')
+    expected = encode_line(PAYLOAD)
+    monkeypatch.setattr(serializers, 'orjson', None)
+    assert encode_line(PAYLOAD) == expected
+    assert b'"2024-05-01T09:30:15.250000"' in expected
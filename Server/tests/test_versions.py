@@ -0,0 +1,73 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+from models import db, TableVersion
+from versions import bump_version, versions_cli
+
+THREADS = 8
+
+
+def version(name):
+    db.session.expire_all()
+    row = db.session.get(TableVersion, name)
+    return row.version if row else 0
+
+
+def test_concurrent_first_bumps_do_not_collide(app, database):
+    # create_all() leaves table_versions empty, so every thread races to
+    # create the row.
+    barrier = threading.Barrier(THREADS)
+
+    def bump(_):
+        with app.app_context():
+            barrier.wait()
+            bump_version('animals')
+            db.session.commit()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(bump, range(THREADS)))
+    assert version('animals') == THREADS
+
+
+def test_checkout_bumps_after_its_own_commit(client, auth_header, seed_animals):
+    seed_animals(3)
+    headers = auth_header(1)
+    client.post('/cart', json={'animal_id': 1}, headers=headers)
+    before = version('animals')
+    log = []
+    engine = db.engine
+
+    def statement(conn, cursor, sql, *args):
+        log.append(sql.split()[0] + (' table_versions' if 'table_versions' in sql else ''))
+
+    def commit(conn):
+        log.append('COMMIT')
+
+    event.listen(engine, 'before_cursor_execute', statement)
+    event.listen(engine, 'commit', commit)
+    try:
+        assert client.post('/cart/checkout', headers=headers).status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', statement)
+        event.remove(engine, 'commit', commit)
+    assert version('animals') == before + 1
+    bump = next(i for i, entry in enumerate(log) if entry.endswith('table_versions'))
+    # The checkout's writes committed before the version row was touched.
+    assert 'COMMIT' in log[:bump] and 'UPDATE' in log[:log.index('COMMIT')]
+
+
+def test_etag_follows_the_version(client, auth_header, seed_animals):
+    seed_animals(3, farmers=1)
+    etag = client.get('/animals').headers['ETag']
+    assert client.get('/animals', headers={'If-None-Match': etag}).status_code == 304
+    client.patch('/farmer/animals/1', json={'breed': 'boer'}, headers=auth_header(1, role='farmer'))
+    assert client.get('/animals', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_bump_command(app, database):
+    result = app.test_cli_runner().invoke(versions_cli, ['bump', 'categories'])
+    assert result.exit_code == 0 and 'Bumped categories' in result.output
+    app.test_cli_runner().invoke(versions_cli, ['bump'])
+    assert (version('animals'), version('categories')) == (1, 2)
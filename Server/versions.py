@@ -0,0 +1,101 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+import click
+from flask import current_app, g, make_response, request
+from flask.cli import AppGroup
+
+from carts import upsert
+from compression import negotiate
+from models import db, TableVersion
+
+VERSIONED_TABLES = ('animals', 'categories')
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def bump_version(*names):
+    # Runs inside the writer's transaction, so the version only moves if the
+    # write itself commits. ETags, QueryCache and PayloadCache all key on these
+    # versions, so every writer to animals or categories must bump them,
+    # including scripts such as seed.py; after a manual SQL change, run
+    # `flask versions bump`, or clients keep getting 304s and cached pages for
+    # the old data. An upsert, so concurrent first writes on a database
+    # without the migration's seed rows do not collide. The row stays locked
+    # until commit, so hot paths (checkout) bump in a short transaction of
+    # their own after committing the write.
+    table = TableVersion.__table__
+    now = utcnow()
+    for name in names:
+        insert = upsert(table).values(name=name, version=1, updated_at=now)
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={'version': table.c.version + 1, 'updated_at': now},
+        ))
+
+
+def current_version(name):
+    # Memoized per request: the conditional check and the cache key share it.
+    versions = g.setdefault('table_versions', {})
+    if name not in versions:
+        row = db.session.query(TableVersion.version, TableVersion.updated_at) \
+            .filter(TableVersion.name == name).first()
+        versions[name] = tuple(row) if row else (0, None)
+    return versions[name]
+
+
+def make_etag(name, version):
+    # Each encoding is a different representation and needs its own tag.
+    variant = f"{request.query_string.decode('latin-1')}|{request.headers.get('Accept', '')}|{negotiate()}"
+    digest = hashlib.blake2b(variant.encode('utf-8'), digest_size=8).hexdigest()
+    return f'{name}-{version}-{digest}'
+
+
+def conditional(name):
+    # Answers If-None-Match / If-Modified-Since from the table's version row
+    # alone, before the view queries or serializes anything.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version, updated_at = current_version(name)
+            etag = make_etag(name, version)
+            last_modified = updated_at.replace(tzinfo=timezone.utc, microsecond=0) if updated_at else None
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = bool(since and last_modified and last_modified <= since)
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.vary.add('Accept-Encoding')
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config.get('CATALOG_MAX_AGE', 0)
+            response.cache_control.must_revalidate = True
+            return response
+        return wrapper
+    return decorator
+
+
+versions_cli = AppGroup('versions', help='Manage catalog table versions.')
+
+
+@versions_cli.command('bump')
+@click.argument('names', nargs=-1, type=click.Choice(VERSIONED_TABLES))
+def bump_command(names):
+    """Invalidate ETags and caches after an out-of-band write."""
+    names = names or VERSIONED_TABLES
+    bump_version(*names)
+    db.session.commit()
+    click.echo(f"Bumped {', '.join(names)}")